@@ -106,10 +106,12 @@ import re
 import operator
 
 from collections import namedtuple, Counter, OrderedDict
+from collections.abc import MutableMapping
 from operator import ne, gt, lt
 from typing import Tuple  # noqa
 
-from .message import Position, warn, error
+from .message import MessageLogger, Position, warn, error
+from .utils import create_worker_pool
 
 
 # GTK-Doc comment block parts
@@ -1387,6 +1389,107 @@ _ParseFieldsResult = namedtuple(
      'description'])
 
 
+#: Below this number of comment blocks, starting worker processes to parse them costs more
+#: time than it saves.
+_PARALLEL_MIN_COMMENTS = 200
+
+
+class _MessageRecorder(MessageLogger):
+    '''
+    Message logger used in the worker processes of
+    :meth:`GtkDocCommentBlockParser.parse_comment_blocks`, which records the messages
+    so they can be logged by the main process instead.
+    '''
+
+    def __init__(self):
+        MessageLogger.__init__(self)
+        self.messages = []
+
+    def log(self, log_type, text, positions=None, prefix=None, marker_pos=None, marker_line=None):
+        self.messages.append((log_type, text, positions, prefix, marker_pos, marker_line))
+
+    def take_messages(self):
+        messages = self.messages
+        self.messages = []
+        return messages
+
+
+def _parse_comment_blocks_shard(comments):
+    '''
+    Parse a list of ``(comment, filename, lineno)`` tuples in a worker process, returning
+    a ``(comment_block, parse_error, messages)`` tuple for each of them.
+    '''
+
+    recorder = _MessageRecorder()
+    MessageLogger._instance = recorder
+    parser = GtkDocCommentBlockParser()
+    results = []
+    for (comment_block, parse_error, filename, lineno) in \
+            parser._parse_comment_blocks_serial(comments):
+        results.append((comment_block, parse_error, recorder.take_messages()))
+    return results
+
+
+class GtkDocCommentBlockIndex(MutableMapping):
+    '''
+    Mapping of identifier names to :class:`GtkDocCommentBlock` objects, as returned by
+    :meth:`GtkDocCommentBlockParser.index_comment_blocks`. A comment block is parsed
+    the first time its identifier is looked up. As with
+    :meth:`GtkDocCommentBlockParser.parse_comment_blocks`, the last comment block
+    documenting an identifier wins, as long as it can be parsed.
+    '''
+
+    def __init__(self, parser):
+        self._parser = parser
+        # identifier name -> list of GtkDocCommentBlock objects or not yet parsed
+        # (comment, filename, lineno) tuples, in source order
+        self._candidates = OrderedDict()
+
+    def add_comment(self, name, comment, filename, lineno):
+        self._candidates.setdefault(name, []).append((comment, filename, lineno))
+
+    def __getitem__(self, name):
+        candidates = self._candidates[name]
+        for i in reversed(range(len(candidates))):
+            candidate = candidates[i]
+            if isinstance(candidate, tuple):
+                comment, filename, lineno = candidate
+                try:
+                    candidate = self._parser.parse_comment_block(comment, filename, lineno)
+                except Exception as e:
+                    self._parser._report_parse_error(str(e), filename, lineno)
+                    candidate = None
+                candidates[i] = candidate
+            if candidate is not None:
+                return candidate
+        # None of them can be parsed, so the identifier is not documented
+        del self._candidates[name]
+        raise KeyError(name)
+
+    def __setitem__(self, name, comment_block):
+        self._candidates.setdefault(name, []).append(comment_block)
+
+    def __delitem__(self, name):
+        del self._candidates[name]
+
+    def __iter__(self):
+        # Parses the comment blocks, to leave out the identifiers none of whose
+        # comment blocks can be parsed
+        for name in list(self._candidates):
+            if name in self:
+                yield name
+
+    def __len__(self):
+        return sum(1 for name in self)
+
+    def names(self):
+        '''
+        Returns the identifier names without parsing their comment blocks, so including
+        the ones none of whose comment blocks can be parsed.
+        '''
+        return list(self._candidates)
+
+
 class GtkDocCommentBlockParser(object):
     '''
     Parse GTK-Doc comment blocks into a parse tree built out of :class:`GtkDocCommentBlock`,
@@ -1414,24 +1517,50 @@ class GtkDocCommentBlockParser(object):
            http://git.gnome.org/browse/gtk-doc/tree/gtkdoc-mkdb.in#n3722
     '''
 
-    def parse_comment_blocks(self, comments):
+    def create_worker_pool(self, comments, jobs):
+        '''
+        Start the worker processes :meth:`parse_comment_blocks` parses @comments with.
+
+        Processes are forked, which is not safe once other threads run, so this allows
+        starting them first.
+
+        :param comments: a sequence of ``(comment, filename, lineno)`` tuples
+        :param jobs: number of processes to parse the comment blocks with
+        :returns: a pool of worker processes, or ``None`` if the comment blocks are
+                  parsed in this process
+        '''
+
+        if jobs > 1 and len(comments) >= _PARALLEL_MIN_COMMENTS:
+            return create_worker_pool(jobs)
+        return None
+
+    def parse_comment_blocks(self, comments, jobs=1, pool=None):
         '''
         Parse multiple GTK-Doc comment blocks.
 
         :param comments: an iterable of ``(comment, filename, lineno)`` tuples
+        :param jobs: number of processes to parse the comment blocks with. The result and
+                     the emitted messages do not depend on it.
+        :param pool: the worker processes returned by :meth:`create_worker_pool` for
+                     @comments and @jobs, which are terminated once done, or ``None`` to
+                     start them here
         :returns: a dictionary mapping identifier names to :class:`GtkDocCommentBlock` objects
         '''
 
         comment_blocks = {}
 
-        for (comment, filename, lineno) in comments:
-            try:
-                comment_block = self.parse_comment_block(comment, filename, lineno)
-            except Exception as e:
-                error('unrecoverable parse error, please file a GObject-Introspection bug'
-                      'report including the complete comment block at the indicated location. %s' %
-                      str(e),
-                      Position(filename, lineno))
+        if jobs > 1:
+            comments = list(comments)
+        if pool is None:
+            pool = self.create_worker_pool(comments, jobs)
+        if pool is not None:
+            results = self._parse_comment_blocks_parallel(comments, jobs, pool)
+        else:
+            results = self._parse_comment_blocks_serial(comments)
+
+        for (comment_block, parse_error, filename, lineno) in results:
+            if parse_error is not None:
+                self._report_parse_error(parse_error, filename, lineno)
                 continue
 
             if comment_block is not None:
@@ -1451,6 +1580,119 @@ class GtkDocCommentBlockParser(object):
 
         return comment_blocks
 
+    def index_comment_blocks(self, comments):
+        '''
+        Index multiple GTK-Doc comment blocks, only parsing them once they are looked up.
+
+        The comment blocks whose identifier is alone on their first line are only matched
+        against the identifier patterns here, the other ones are parsed right away. The
+        comment blocks which are never looked up are never parsed, so the messages they
+        would emit are not, nor is the warning about multiple comment blocks documenting
+        the same identifier.
+
+        :param comments: an iterable of ``(comment, filename, lineno)`` tuples
+        :returns: a :class:`GtkDocCommentBlockIndex` mapping identifier names to
+                  :class:`GtkDocCommentBlock` objects
+        '''
+
+        index = GtkDocCommentBlockIndex(self)
+
+        for (comment, filename, lineno) in comments:
+            identifier_name = self._get_identifier_name(comment)
+            if identifier_name is not None:
+                index.add_comment(identifier_name, comment, filename, lineno)
+                continue
+
+            for (comment_block, parse_error, filename, lineno) in \
+                    self._parse_comment_blocks_serial([(comment, filename, lineno)]):
+                if parse_error is not None:
+                    self._report_parse_error(parse_error, filename, lineno)
+                elif comment_block is not None:
+                    index[comment_block.name] = comment_block
+
+        return index
+
+    def _get_identifier_name(self, comment):
+        '''
+        Find the identifier of a GTK-Doc comment block without parsing it, when it is
+        certain to be the one :meth:`parse_comment_block` finds: when the identifier is
+        alone on the first line and is not a section.
+
+        :param comment: string representing the GTK-Doc comment block including it's
+                        start ("``/**``") and end ("``*/``") tokens.
+        :returns: the identifier name, or ``None``
+        '''
+
+        if comment is None:
+            return None
+
+        comment_lines = LINE_BREAK_RE.split(comment)
+        if len(comment_lines) < 2 or not COMMENT_BLOCK_END_RE.match(comment_lines[-1]):
+            return None
+
+        result = COMMENT_BLOCK_START_RE.match(comment_lines[0])
+        if not result:
+            return None
+        if result.group('comment'):
+            line = result.group('comment')
+        elif len(comment_lines) > 2:
+            line = comment_lines[1]
+        else:
+            # The identifier would be on the line of the end token
+            return None
+
+        result = COMMENT_ASTERISK_RE.match(line)
+        if result:
+            line = line[result.end(0):]
+
+        result, identifier_name, _, identifier_fields, _ = self._match_identifier(line)
+        if not result or identifier_fields or identifier_name.startswith('SECTION:'):
+            return None
+        return identifier_name
+
+    def _report_parse_error(self, parse_error, filename, lineno):
+        error('unrecoverable parse error, please file a GObject-Introspection bug'
+              'report including the complete comment block at the indicated location. %s' %
+              parse_error,
+              Position(filename, lineno))
+
+    def _parse_comment_blocks_serial(self, comments):
+        '''
+        Parse comment blocks one after the other, yielding
+        ``(comment_block, parse_error, filename, lineno)`` tuples.
+        '''
+
+        for (comment, filename, lineno) in comments:
+            try:
+                comment_block = self.parse_comment_block(comment, filename, lineno)
+            except Exception as e:
+                yield (None, str(e), filename, lineno)
+            else:
+                yield (comment_block, None, filename, lineno)
+
+    def _parse_comment_blocks_parallel(self, comments, jobs, pool):
+        '''
+        Parse comment blocks in @pool of @jobs processes, yielding the same tuples
+        as :meth:`_parse_comment_blocks_serial` in the same order. The messages emitted
+        by the workers are recorded and logged again here, just before the tuple of the
+        comment block they were emitted for. @pool is terminated once they are parsed.
+        '''
+
+        # Several shards per process, so a shard with many long comment blocks does not
+        # keep the other processes waiting.
+        size = -(-len(comments) // (jobs * 4))
+        shards = [comments[i:i + size] for i in range(0, len(comments), size)]
+        with pool:
+            shard_results = pool.map(_parse_comment_blocks_shard, shards)
+
+        logger = MessageLogger.get()
+        for shard, results in zip(shards, shard_results):
+            for (comment, filename, lineno), (comment_block, parse_error, messages) in \
+                    zip(shard, results):
+                for msg in messages:
+                    logger.log(*msg)
+                yield (comment_block, parse_error, filename, lineno)
+
     def parse_comment_block(self, comment, filename, lineno):
         '''
         Parse a single GTK-Doc comment block.
@@ -1566,57 +1808,8 @@ class GtkDocCommentBlockParser(object):
             # Check for GTK-Doc comment block identifier.
             ####################################################################
             if comment_block is None:
-                result = SECTION_RE.match(line)
-
-                if result:
-                    identifier_name = 'SECTION:%s' % (result.group('section_name'), )
-                    identifier_delimiter = None
-                    identifier_fields = None
-                    identifier_fields_start = None
-                else:
-                    result = PROPERTY_RE.match(line)
-
-                    if result:
-                        identifier_name = '%s:%s' % (result.group('class_name'),
-                                                     result.group('property_name'))
-                        identifier_delimiter = result.group('delimiter')
-                        identifier_fields = result.group('fields')
-                        identifier_fields_start = result.start('fields')
-                    else:
-                        result = SIGNAL_RE.match(line)
-
-                        if result:
-                            identifier_name = '%s::%s' % (result.group('class_name'),
-                                                          result.group('signal_name'))
-                            identifier_delimiter = result.group('delimiter')
-                            identifier_fields = result.group('fields')
-                            identifier_fields_start = result.start('fields')
-                        else:
-                            result = ACTION_RE.match(line)
-
-                            if result:
-                                identifier_name = 'ACTION:%s:%s' % (result.group('class_name'),
-                                                                        result.group('action_name'))
-                                identifier_delimiter = None
-                                identifier_fields = None
-                                identifier_fields_start = None
-                            else:
-                                result = FIELD_RE.match(line)
-
-                                if result:
-                                    identifier_name = '%s.%s' % (result.group('class_name'),
-                                                                  result.group('field_name'))
-                                    identifier_delimiter = result.group('delimiter')
-                                    identifier_fields = result.group('fields')
-                                    identifier_fields_start = result.start('fields')
-                                else:
-                                    result = SYMBOL_RE.match(line)
-
-                                    if result:
-                                        identifier_name = '%s' % (result.group('symbol_name'), )
-                                        identifier_delimiter = result.group('delimiter')
-                                        identifier_fields = result.group('fields')
-                                        identifier_fields_start = result.start('fields')
+                (result, identifier_name, identifier_delimiter, identifier_fields,
+                 identifier_fields_start) = self._match_identifier(line)
 
                 if result:
                     in_part = PART_IDENTIFIER
@@ -1950,6 +2143,50 @@ class GtkDocCommentBlockParser(object):
         else:
             return None
 
+    def _match_identifier(self, line):
+        '''
+        Match a line of a comment block against the identifier patterns.
+
+        :param line: line of the comment block, without its leading ``*``
+        :returns: a ``(result, name, delimiter, fields, fields_start)`` tuple, where
+                  ``result`` is ``None`` if the line does not hold an identifier
+        '''
+
+        result = SECTION_RE.match(line)
+        if result:
+            return (result, 'SECTION:%s' % (result.group('section_name'), ), None, None, None)
+
+        result = PROPERTY_RE.match(line)
+        if result:
+            return (result,
+                    '%s:%s' % (result.group('class_name'), result.group('property_name')),
+                    result.group('delimiter'), result.group('fields'), result.start('fields'))
+
+        result = SIGNAL_RE.match(line)
+        if result:
+            return (result,
+                    '%s::%s' % (result.group('class_name'), result.group('signal_name')),
+                    result.group('delimiter'), result.group('fields'), result.start('fields'))
+
+        result = ACTION_RE.match(line)
+        if result:
+            return (result,
+                    'ACTION:%s:%s' % (result.group('class_name'), result.group('action_name')),
+                    None, None, None)
+
+        result = FIELD_RE.match(line)
+        if result:
+            return (result,
+                    '%s.%s' % (result.group('class_name'), result.group('field_name')),
+                    result.group('delimiter'), result.group('fields'), result.start('fields'))
+
+        result = SYMBOL_RE.match(line)
+        if result:
+            return (result, '%s' % (result.group('symbol_name'), ),
+                    result.group('delimiter'), result.group('fields'), result.start('fields'))
+
+        return (None, None, None, None, None)
+
     def _clean_description_field(self, part):
         '''
         Remove extraneous leading and trailing whitespace from description fields.
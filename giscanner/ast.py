@@ -23,6 +23,7 @@ import copy
 import operator
 from itertools import chain
 from collections import OrderedDict
+from typing import Dict  # noqa
 
 from .sourcescanner import CTYPE_TYPEDEF, CSYMBOL_TYPE_TYPEDEF
 from .message import Position, warn
@@ -40,6 +41,11 @@ class Type(object):
     from a C type string, or a gtype_name (from g_type_name()).
     """
 
+    # Types, parameters, fields and members are by far the most numerous
+    # objects of the AST, so they use slots instead of a __dict__.
+    __slots__ = ('ctype', 'gtype_name', 'origin_symbol', 'target_fundamental',
+                 'target_giname', 'target_foreign', 'is_const', 'complete_ctype')
+
     def __init__(self,
                  ctype=None,
                  gtype_name=None,
@@ -143,9 +149,13 @@ in contrast to the other create_type() functions."""
         return self._compare(other, operator.le)
 
     def __eq__(self, other):
+        if self is other:
+            return True
         return self._compare(other, operator.eq)
 
     def __ne__(self, other):
+        if self is other:
+            return False
         return self._compare(other, operator.ne)
 
     def __hash__(self):
@@ -172,6 +182,11 @@ in contrast to the other create_type() functions."""
                     ctype=self.ctype,
                     is_const=self.is_const)
 
+    def unshared(self):
+        """Returns the type itself, or a copy of it which may be modified
+if it is a shared instance created by get_shared_type()."""
+        return self
+
     def __str__(self):
         if self.target_fundamental:
             return self.target_fundamental
@@ -194,10 +209,55 @@ in contrast to the other create_type() functions."""
 
 
 class TypeUnknown(Type):
+    __slots__ = ()
+
     def __init__(self):
         Type.__init__(self, _target_unknown=True)
 
 
+class _SharedType(Type):
+    """An immutable fundamental type shared by all its users, see
+get_shared_type()."""
+    __slots__ = ()
+
+    def __init__(self, target_fundamental, ctype, is_const, complete_ctype):
+        typeval = Type(target_fundamental=target_fundamental, ctype=ctype,
+                       is_const=is_const, complete_ctype=complete_ctype)
+        for name in Type.__slots__:
+            object.__setattr__(self, name, getattr(typeval, name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%r is shared, use unshared() to modify it" % (self, ))
+
+    def __reduce__(self):
+        # Share the instances again when unpickling
+        return (get_shared_type, (self.target_fundamental, self.ctype,
+                                  self.is_const, self.complete_ctype))
+
+    def __repr__(self):
+        return 'Type' + Type.__repr__(self)[len('_SharedType'):]
+
+    def unshared(self):
+        return Type(target_fundamental=self.target_fundamental, ctype=self.ctype,
+                    is_const=self.is_const, complete_ctype=self.complete_ctype)
+
+
+_shared_types = {}  # type: Dict[tuple, _SharedType]
+
+
+def get_shared_type(target_fundamental, ctype=None, is_const=False, complete_ctype=None):
+    """Returns an immutable Type referencing a fundamental type.  The same
+instance is returned for equal arguments, so that the countless
+occurrences of basic types like gint or gchar* in a namespace don't each
+need their own object.  Use Type.unshared() to get a copy to modify."""
+    key = (target_fundamental, ctype, is_const, complete_ctype)
+    typeval = _shared_types.get(key)
+    if typeval is None:
+        typeval = _SharedType(target_fundamental, ctype, is_const, complete_ctype)
+        _shared_types[key] = typeval
+    return typeval
+
+
 # Fundamental types, two special ones
 TYPE_NONE = Type(target_fundamental='none', ctype='void')
 TYPE_ANY = Type(target_fundamental='gpointer', ctype='gpointer')
@@ -457,7 +517,7 @@ fully-qualified GIName like 'Foo.Bar', returns a Type targeting it .
 Otherwise a Type targeting name qualififed with the namespace name is
 returned."""
         if name in type_names:
-            return Type(target_fundamental=name, ctype=ctype)
+            return get_shared_type(name, ctype)
         if '.' in name:
             target = name
         else:
@@ -553,11 +613,137 @@ functions via get_by_symbol()."""
     def get_by_symbol(self, symbol):
         return self.symbols.get(symbol)
 
+    def get_by_gtype_name(self, gtype_name):
+        return self.type_names.get(gtype_name)
+
     def walk(self, callback):
         for node in self.values():
             node.walk(callback, [])
 
 
+# Placeholder for the nodes of a LazyNamespace which were not created yet
+_PENDING = object()
+
+
+class LazyNamespace(Namespace):
+    """A Namespace whose nodes are only created when they are first looked
+up.  This is used for included namespaces, of which a scan typically only
+references a small part.
+
+Subclasses register the name of every node with _add_pending(), together
+with a load key identifying the group of nodes it is created with, and
+map the keys of the ctypes, type_names and symbols tables to load keys
+in self._index.  _load() creates the nodes of a load key and adds them
+with append().  Subclasses which can only provide the names once some
+work has been done can set self._index_loaded to False and implement
+_load_index(), which is called on the first lookup."""
+
+    def __init__(self, name, version, identifier_prefixes=None, symbol_prefixes=None):
+        Namespace.__init__(self, name, version,
+                           identifier_prefixes=identifier_prefixes,
+                           symbol_prefixes=symbol_prefixes)
+        self._pending = {}       # Maps from GIName -> load key
+        self._pending_keys = {}  # Maps from load key -> [GIName]
+        self._index = {'ctypes': {}, 'type_names': {}, 'symbols': {}}
+        self._index_loaded = True
+        self._loading = False
+
+    def _load_index(self):
+        pass
+
+    def _load(self, load_key):
+        raise NotImplementedError
+
+    def _check_index(self):
+        if not self._index_loaded:
+            self._index_loaded = True
+            self._load_index()
+
+    def _add_pending(self, name, load_key):
+        self.names[name] = _PENDING
+        self._pending[name] = load_key
+        self._pending_keys.setdefault(load_key, []).append(name)
+
+    def _materialize(self, load_key):
+        names = self._pending_keys.pop(load_key)
+        self._loading = True
+        try:
+            self._load(load_key)
+        finally:
+            self._loading = False
+        # Drop the names the load key failed to create
+        for name in names:
+            if name in self._pending:
+                del self._pending[name]
+                del self.names[name]
+
+    def _materialize_all(self):
+        self._check_index()
+        while self._pending_keys:
+            self._materialize(next(iter(self._pending_keys)))
+
+    def _lookup(self, table, key):
+        self._check_index()
+        value = getattr(self, table).get(key)
+        if value is None:
+            load_key = self._index[table].get(key)
+            if load_key is not None and load_key in self._pending_keys:
+                self._materialize(load_key)
+                value = getattr(self, table).get(key)
+        return value
+
+    def get_created_count(self):
+        """Returns the number of nodes which were created so far."""
+        self._check_index()
+        return len(self.names) - len(self._pending)
+
+    def append(self, node, replace=False):
+        self._check_index()
+        load_key = self._pending.get(node.name)
+        if load_key is not None:
+            if self._loading:
+                # Creating a pending node, keep its position in the namespace
+                del self._pending[node.name]
+                self.track(node)
+                self.names[node.name] = node
+                return
+            self._materialize(load_key)
+        Namespace.append(self, node, replace=replace)
+
+    def remove(self, node):
+        self._check_index()
+        Namespace.remove(self, node)
+
+    def __iter__(self):
+        self._check_index()
+        return Namespace.__iter__(self)
+
+    def items(self):
+        self._materialize_all()
+        return Namespace.items(self)
+
+    def values(self):
+        self._materialize_all()
+        return Namespace.values(self)
+
+    def get(self, name):
+        self._check_index()
+        node = self.names.get(name)
+        if node is _PENDING:
+            self._materialize(self._pending[name])
+            node = self.names.get(name)
+        return node
+
+    def get_by_ctype(self, ctype):
+        return self._lookup('ctypes', ctype)
+
+    def get_by_symbol(self, symbol):
+        return self._lookup('symbols', symbol)
+
+    def get_by_gtype_name(self, gtype_name):
+        return self._lookup('type_names', gtype_name)
+
+
 class Include(object):
 
     def __init__(self, name, version):
@@ -599,6 +785,10 @@ class Include(object):
 class Annotated(object):
     """An object which has a few generic metadata
 properties."""
+    __slots__ = ('version', 'version_doc', 'skip', 'introspectable', 'attributes',
+                 'stability', 'stability_doc', 'deprecated', 'deprecated_doc',
+                 'doc', 'doc_position')
+
     def __init__(self):
         self.version = None
         self.version_doc = None
@@ -856,6 +1046,7 @@ class VFunction(Callable):
 
 
 class Varargs(Type):
+    __slots__ = ()
 
     def __init__(self):
         Type.__init__(self, '<varargs>', target_fundamental='<varargs>')
@@ -867,6 +1058,9 @@ class Array(Type):
     GLIB_BYTEARRAY = 'GLib.ByteArray'
     GLIB_PTRARRAY = 'GLib.PtrArray'
 
+    __slots__ = ('array_type', 'element_type', 'zeroterminated',
+                 'length_param_name', 'size')
+
     def __init__(self, array_type, element_type, **kwargs):
         Type.__init__(self, target_fundamental='<array>',
                       **kwargs)
@@ -892,6 +1086,7 @@ class Array(Type):
 
 
 class List(Type):
+    __slots__ = ('name', 'element_type')
 
     def __init__(self, name, element_type, **kwargs):
         Type.__init__(self, target_fundamental='<list>',
@@ -905,6 +1100,7 @@ class List(Type):
 
 
 class Map(Type):
+    __slots__ = ('key_type', 'value_type')
 
     def __init__(self, key_type, value_type, **kwargs):
         Type.__init__(self, target_fundamental='<map>', **kwargs)
@@ -927,6 +1123,8 @@ class Alias(Node):
 
 class TypeContainer(Annotated):
     """A fundamental base class for Return and Parameter."""
+    __slots__ = ('type', 'nullable', 'not_nullable', 'direction', 'transfer',
+                 'caller_allocates')
 
     def __init__(self, typenode, nullable, not_nullable, transfer, direction):
         Annotated.__init__(self)
@@ -944,6 +1142,8 @@ class TypeContainer(Annotated):
 
 class Parameter(TypeContainer):
     """An argument to a function."""
+    __slots__ = ('argname', 'optional', 'parent', 'scope', 'closure_name',
+                 'destroy_name')
 
     def __init__(self, argname, typenode, direction=None,
                  transfer=None, nullable=False, optional=False,
@@ -973,6 +1173,7 @@ class Parameter(TypeContainer):
 
 class Return(TypeContainer):
     """A return value from a function."""
+    __slots__ = ('parent', )
 
     def __init__(self, rtype, nullable=False, not_nullable=False,
                  transfer=None):
@@ -1026,6 +1227,7 @@ class Bitfield(Node, Registered):
 
 
 class Member(Annotated):
+    __slots__ = ('name', 'value', 'symbol', 'nick', 'dump_name', 'parent', 'namespace')
 
     def __init__(self, name, value, symbol, nick=None, dump_name=None):
         Annotated.__init__(self)
@@ -1119,6 +1321,8 @@ class Compound(Node, Registered):
 
 
 class Field(Annotated):
+    __slots__ = ('name', 'type', 'readable', 'writable', 'bits', 'anonymous_node',
+                 'private', 'namespace', 'parent')
 
     def __init__(self, name, typenode, readable, writable, bits=None,
                  anonymous_node=None):
@@ -22,7 +22,6 @@ import errno
 import glob
 import hashlib
 import os
-import shutil
 import sys
 import tempfile
 import pickle
@@ -32,24 +31,69 @@ import giscanner
 from . import utils
 
 
-_CACHE_VERSION_FILENAME = '.cache-version'
+# Default upper bound for the total size of the cache directory, can be
+# overridden with GI_SCANNER_CACHE_MAX_SIZE (in bytes).
+_DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+_TMP_PREFIX = '.tmp-'
+
+_versionhash = None
 
 
 def _get_versionhash():
+    global _versionhash
+    if _versionhash is not None:
+        return _versionhash
+
     toplevel = os.path.dirname(giscanner.__file__)
     sources = glob.glob(os.path.join(toplevel, '*.py'))
     sources.append(sys.argv[0])
     # Using mtimes is a bit (5x) faster than hashing the file contents
     mtimes = (str(os.stat(source).st_mtime) for source in sources)
     # ASCII encoding is sufficient since we are only dealing with numbers.
-    return hashlib.sha1(''.join(mtimes).encode('ascii')).hexdigest()
+    _versionhash = hashlib.sha1(''.join(mtimes).encode('ascii')).hexdigest()
+    return _versionhash
+
+
+def _get_max_size():
+    value = os.environ.get('GI_SCANNER_CACHE_MAX_SIZE')
+    if value is None:
+        return _DEFAULT_MAX_SIZE
+    try:
+        return int(value)
+    except ValueError:
+        return _DEFAULT_MAX_SIZE
 
 
 class CacheStore(object):
+    """A cache of pickled objects derived from files, such as parsed
+    include GIRs.
+
+    Entries are keyed by the content of the source file together with
+    the version of the scanner, so a stale entry can never be returned
+    and an updated scanner simply stops seeing the entries of older
+    versions instead of having to wipe them.  Entries are written
+    atomically, which makes it safe to share the cache between many
+    scanner processes running at the same time.  The least recently used
+    entries are evicted once the cache grows beyond its maximum size.
 
-    def __init__(self):
+    By default the data is pickled, @dump and @load can be used to
+    provide a different serialization.
+    """
+
+    def __init__(self, max_size=None, dump=pickle.dump, load=pickle.load):
         self._directory = self._get_cachedir()
-        self._check_cache_version()
+        self._max_size = _get_max_size() if max_size is None else max_size
+        self._dump = dump
+        self._load = load
+        self._keys = {}  # <(filename, variant) -> (st_mtime_ns, st_size, key)>
+        # The total size of the entries, from the last scan of the
+        # directory plus what was stored since, or None before the scan
+        self._size = None
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
 
     def _get_cachedir(self):
         if 'GI_SCANNER_DISABLE_CACHE' in os.environ:
@@ -58,60 +102,56 @@ class CacheStore(object):
             cachedir = utils.get_user_cache_dir('g-ir-scanner')
             return cachedir
 
-    def _check_cache_version(self):
-        if self._directory is None:
-            return
+    def get_stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'evictions': self.evictions,
+        }
 
-        current_hash = _get_versionhash()
-        version = os.path.join(self._directory, _CACHE_VERSION_FILENAME)
+    def _get_key(self, filename, variant):
         try:
-            with open(version, 'r', encoding='utf-8') as version_file:
-                cache_hash = version_file.read()
-        except (IOError, OSError) as e:
-            # File does not exist
-            if e.errno == errno.ENOENT:
-                cache_hash = 0
-            else:
-                raise
-
-        if current_hash == cache_hash:
-            return
-
-        self._clean()
+            st = os.stat(filename)
+        except OSError:
+            return None
 
-        tmp_fd, tmp_filename = tempfile.mkstemp(prefix='g-ir-scanner-cache-version-')
-        try:
-            with os.fdopen(tmp_fd, 'w', encoding='utf-8') as tmp_file:
-                tmp_file.write(current_hash)
+        cached = self._keys.get((filename, variant))
+        if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+            return cached[2]
 
-            # On Unix, this would just be os.rename() but Windows
-            # doesn't allow that.
-            shutil.move(tmp_filename, version)
-        except (IOError, OSError) as e:
-            # Permission denied
-            if e.errno == errno.EACCES:
-                return
-            else:
-                raise
+        digest = hashlib.sha1(_get_versionhash().encode('ascii'))
+        digest.update(variant.encode('utf-8'))
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        key = digest.hexdigest()
+        self._keys[(filename, variant)] = (st.st_mtime_ns, st.st_size, key)
+        return key
 
-    def _get_filename(self, filename):
+    def _get_filename(self, filename, variant=''):
         # If we couldn't create the directory we're probably
         # on a read only home directory where we just disable
         # the cache all together.
         if self._directory is None:
             return
-        # Assume UTF-8 encoding for the filenames. This doesn't matter so much
-        # as long as the results of this method always produce the same hash.
-        hexdigest = hashlib.sha1(filename.encode('utf-8')).hexdigest()
-        return os.path.join(self._directory, hexdigest)
+        key = self._get_key(filename, variant)
+        if key is None:
+            return
+        return os.path.join(self._directory, key)
 
-    def _cache_is_valid(self, store_filename, filename):
-        try:
-            store_mtime = os.stat(store_filename).st_mtime
-        except FileNotFoundError:
-            return False
+    def _get_key_filename(self, key):
+        if self._directory is None:
+            return
+        digest = hashlib.sha1(_get_versionhash().encode('ascii'))
+        digest.update(b'key:')
+        digest.update(key.encode('utf-8'))
+        return os.path.join(self._directory, digest.hexdigest())
 
-        return store_mtime >= os.stat(filename).st_mtime
+    def get_digest(self, filename):
+        """Returns the SHA-1 digest of the content of @filename as a
+        hex string, or None if it cannot be read."""
+        return self._get_key(filename, 'digest')
 
     def _remove_filename(self, filename):
         try:
@@ -123,24 +163,74 @@ class CacheStore(object):
             else:
                 raise
 
-    def _clean(self):
-        for filename in os.listdir(self._directory):
-            if filename == _CACHE_VERSION_FILENAME:
+    def _touch(self, store_filename):
+        # The modification time of an entry is its last use, which is
+        # what eviction sorts on.
+        try:
+            os.utime(store_filename, None)
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Scans the cache directory and removes the least recently used
+        entries while it is too large."""
+        entries = []
+        total = 0
+        try:
+            names = os.listdir(self._directory)
+        except OSError:
+            return
+        for name in names:
+            if name.startswith(_TMP_PREFIX):
                 continue
-            self._remove_filename(os.path.join(self._directory, filename))
+            path = os.path.join(self._directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                # Removed by a concurrent process
+                continue
+            entries.append((st.st_mtime, path, st.st_size))
+            total += st.st_size
+
+        if total > self._max_size:
+            entries.sort()
+            for mtime, path, size in entries:
+                if total <= self._max_size:
+                    break
+                self._remove_filename(path)
+                self.evictions += 1
+                total -= size
+        self._size = total
 
-    def store(self, filename, data):
-        store_filename = self._get_filename(filename)
+    def store(self, filename, data, variant=''):
+        """Store @data derived from @filename. @variant distinguishes
+        different kinds of data derived from the same file."""
+        self._store_entry(self._get_filename(filename, variant), data)
+
+    def store_key(self, key, data):
+        """Store @data under the string @key, for data derived from more
+        than one file.  The caller is responsible for making @key cover
+        everything the data depends on, see get_digest()."""
+        self._store_entry(self._get_key_filename(key), data)
+
+    def _store_entry(self, store_filename, data):
         if store_filename is None:
             return
 
-        if self._cache_is_valid(store_filename, filename):
+        if os.path.exists(store_filename):
+            # Another process got here first; entries are immutable so
+            # there is nothing to do.
             return None
 
-        tmp_fd, tmp_filename = tempfile.mkstemp(prefix='g-ir-scanner-cache-')
+        try:
+            tmp_fd, tmp_filename = tempfile.mkstemp(prefix=_TMP_PREFIX,
+                                                    dir=self._directory)
+        except (IOError, OSError):
+            return
+
         try:
             with os.fdopen(tmp_fd, 'wb') as tmp_file:
-                pickle.dump(data, tmp_file)
+                self._dump(data, tmp_file)
         except (IOError, OSError) as e:
             # No space left on device
             if e.errno == errno.ENOSPC:
@@ -150,33 +240,54 @@ class CacheStore(object):
                 raise
 
         try:
-            shutil.move(tmp_filename, store_filename)
+            size = os.stat(tmp_filename).st_size
+            # Atomic on all platforms, concurrent readers either see the
+            # complete entry or no entry at all.
+            os.replace(tmp_filename, store_filename)
         except (IOError, OSError) as e:
-            # Permission denied
-            if e.errno == errno.EACCES:
-                self._remove_filename(tmp_filename)
-            else:
+            self._remove_filename(tmp_filename)
+            # Permission denied, or on Windows the target being open in
+            # another process
+            if e.errno != errno.EACCES:
                 raise
+            return
+
+        self.stores += 1
+        # The directory is only scanned again once the entries stored
+        # since the last scan could make it too large.  Concurrent
+        # processes storing meanwhile are caught up with then.
+        if self._size is not None:
+            self._size += size
+        if self._size is None or self._size > self._max_size:
+            self._evict()
 
-    def load(self, filename):
-        store_filename = self._get_filename(filename)
+    def load(self, filename, variant=''):
+        return self._load_entry(self._get_filename(filename, variant))
+
+    def load_key(self, key):
+        return self._load_entry(self._get_key_filename(key))
+
+    def _load_entry(self, store_filename):
         if store_filename is None:
             return
         try:
             fd = open(store_filename, 'rb')
         except (IOError, OSError) as e:
             if e.errno == errno.ENOENT:
+                self.misses += 1
                 return None
             else:
                 raise
 
         with fd:
-            if not self._cache_is_valid(store_filename, filename):
-                return None
             try:
-                data = pickle.load(fd)
+                data = self._load(fd)
             except Exception:
                 # Broken cache entry, remove it
                 self._remove_filename(store_filename)
-                data = None
-            return data
+                self.misses += 1
+                return None
+
+        self._touch(store_filename)
+        self.hits += 1
+        return data
@@ -342,7 +342,8 @@ class CCompiler(object):
                                  include_dirs=include_dirs,
                                  extra_postargs=extra_postargs)
 
-    def compile(self, pkg_config_cflags, cpp_includes, source, init_sections):
+    def compile(self, pkg_config_cflags, cpp_includes, source, init_sections,
+                depfile=None):
         extra_postargs = []
         includes = []
         (include_paths, macros, extra_args) = \
@@ -374,6 +375,9 @@ class CCompiler(object):
 
         includes.extend(include_paths)
         extra_postargs.extend(extra_args)
+        if depfile is not None:
+            # Lists the files the object was compiled from, in make syntax
+            extra_postargs.extend(['-MD', '-MF', depfile])
 
         tmp = None
 
@@ -1359,7 +1359,11 @@ class DocWriter(object):
         namespace = self._transformer.namespace
 
         # A bit of a hack...maybe this should be an official API
-        node._chain = list(chain)
+        if isinstance(node, ast.Field):
+            # Fields have no instance dict, but they do have a parent
+            node.parent = chain[-1]
+        else:
+            node._chain = list(chain)
 
         page_kind = get_node_kind(node)
         template_name = '%s/%s.tmpl' % (self._language, page_kind)
@@ -19,16 +19,26 @@
 # Boston, MA 02111-1307, USA.
 #
 
+import concurrent.futures
+import hashlib
 import os
+import re
 import sys
 import shlex
 import subprocess
 import tempfile
 
+from distutils.errors import DistutilsExecError
+
+from .cachestore import CacheStore
 from .gdumpparser import IntrospectionBinary
 from . import pkgconfig, utils
 from .ccompiler import CCompiler
 
+# The words of a make depfile, and their escaped characters
+_DEPFILE_WORD_RE = re.compile(r'(?:\\.|[^\s\\])+')
+_DEPFILE_ESCAPE_RE = re.compile(r'\\(.)')
+
 # bugzilla.gnome.org/558436
 # Compile a binary program which is then linked to a library
 # we want to introspect, in order to call its get_type functions.
@@ -72,6 +82,32 @@ main(int argc, char **argv)
 }
 """
 
+# File names a library linked with -l<name> can have
+_LIBRARY_FILENAMES = ['lib%s.so', 'lib%s.dylib', 'lib%s.a', 'lib%s.dll.a', '%s.dll']
+
+
+def find_library(library, library_paths):
+    """Returns the file a library passed with --library is linked from,
+    looking it up in @library_paths, or None if it can't be found."""
+    if library.endswith('.la'):
+        # The .la file stays the same when the library is rebuilt, look
+        # at the uninstalled library libtool put next to it
+        if not os.path.isfile(library):
+            return None
+        dlname = utils.extract_libtool_shlib(library)
+        if dlname is None:
+            return None
+        filename = os.path.join(os.path.dirname(library), '.libs', os.path.basename(dlname))
+        return filename if os.path.isfile(filename) else None
+    if os.path.isfile(library):
+        return library
+    for library_path in library_paths:
+        for tmpl in _LIBRARY_FILENAMES:
+            filename = os.path.join(library_path, tmpl % (library, ))
+            if os.path.isfile(filename):
+                return filename
+    return None
+
 
 class CompilerError(Exception):
     pass
@@ -85,7 +121,7 @@ class DumpCompiler(object):
 
     _compiler = None
 
-    def __init__(self, options, get_type_functions, error_quark_functions):
+    def __init__(self, options, get_type_functions, error_quark_functions, output=None):
         self._options = options
         self._get_type_functions = get_type_functions
         self._error_quark_functions = error_quark_functions
@@ -93,9 +129,30 @@ class DumpCompiler(object):
         # Acquire the compiler (and linker) commands via the CCompiler class in ccompiler.py
         self._compiler = CCompiler()
 
+        # The compiler and linker write to the terminal, or to a
+        # _CapturedOutput when the binary is built in the background
+        self._output = output
+        if output is not None:
+            self._compiler.compiler.spawn = self._spawn
+
         self._uninst_srcdir = os.environ.get('UNINSTALLED_INTROSPECTION_SRCDIR')
         self._packages = ['gio-2.0', 'gmodule-2.0']
         self._packages.extend(options.packages)
+        self._cflags = None
+
+        # With --incremental, compiled objects and linked binaries are
+        # cached, unless libtool is used, as it produces a wrapper script
+        # pointing into the temporary directory instead of the binary, or
+        # the init sections make the object depend on the headers of the
+        # library.  The compiler has to write a make depfile.
+        if (not (hasattr(options, 'incremental') and options.incremental)
+                or self._compiler.check_is_msvc()
+                or utils.get_libtool_command(options) is not None
+                or os.environ.get('MSYSTEM')
+                or options.init_sections):
+            self._cachestore = None
+        else:
+            self._cachestore = CacheStore()
 
     # Public API
 
@@ -160,39 +217,73 @@ class DumpCompiler(object):
 
         bin_path = self._generate_tempfile(tmpdir, ext)
 
+        compile_key = self._get_compile_key(c_path)
+        if compile_key is None:
+            introspection_obj = self._compile_or_exit(tmpdir, c_path)
+            self._link_or_exit(tmpdir, self._get_link_args(bin_path, introspection_obj),
+                               introspection_obj)
+            return IntrospectionBinary([bin_path], tmpdir)
+
+        # The object file the compiler writes, as the link arguments
+        # are needed to look up the binary first
+        introspection_obj = [os.path.splitext(c_path)[0]
+                             + self._compiler.compiler.obj_extension]
+        link_args = self._get_link_args(bin_path, introspection_obj)
+        link_key = self._get_link_key(compile_key, link_args, tmpdir)
+        if link_key is not None and self._load_cached(link_key, bin_path) is not None:
+            return IntrospectionBinary([bin_path], tmpdir)
+
+        dependencies = self._load_cached(compile_key, introspection_obj[0])
+        if dependencies is None:
+            depfile = self._generate_tempfile(tmpdir, '.d')
+            introspection_obj = self._compile_or_exit(tmpdir, c_path, depfile)
+            dependencies = self._get_dependencies(depfile, tmpdir)
+            if dependencies is not None:
+                self._store_cached(compile_key, introspection_obj[0], dependencies)
+        self._link_or_exit(tmpdir, link_args, introspection_obj)
+        if link_key is not None and dependencies is not None:
+            self._store_cached(link_key, bin_path, dependencies)
+        return IntrospectionBinary([bin_path], tmpdir)
+
+    # Private API
+
+    def _generate_tempfile(self, tmpdir, suffix=''):
+        tmpl = '%s-%s%s' % (self._options.namespace_name,
+                            self._options.namespace_version, suffix)
+        return os.path.join(tmpdir, tmpl)
+
+    def _compile_or_exit(self, tmpdir, c_path, depfile=None):
         try:
-            introspection_obj = self._compile(c_path)
+            return self._compile(c_path, depfile=depfile)
         except CompilerError as e:
             if not utils.have_debug_flag('save-temps'):
                 utils.rmtree(tmpdir)
             raise SystemExit('compilation of temporary binary failed:' + str(e))
 
+    def _link_or_exit(self, tmpdir, args, sources):
         try:
-            self._link(bin_path, introspection_obj)
+            self._link(args, sources)
         except LinkerError as e:
             if not utils.have_debug_flag('save-temps'):
                 utils.rmtree(tmpdir)
             raise SystemExit('linking of temporary binary failed: ' + str(e))
 
-        return IntrospectionBinary([bin_path], tmpdir)
-
-    # Private API
-
-    def _generate_tempfile(self, tmpdir, suffix=''):
-        tmpl = '%s-%s%s' % (self._options.namespace_name,
-                            self._options.namespace_version, suffix)
-        return os.path.join(tmpdir, tmpl)
+    def _get_cflags(self):
+        if self._cflags is None:
+            cflags = pkgconfig.cflags(self._packages,
+                                      msvc_syntax=self._compiler.check_is_msvc())
+            cflags.extend(self._options.cflags)
+            self._cflags = cflags
+        return self._cflags
 
-    def _compile(self, *sources):
-        cflags = pkgconfig.cflags(self._packages,
-                                  msvc_syntax=self._compiler.check_is_msvc())
-        cflags.extend(self._options.cflags)
-        return self._compiler.compile(cflags,
+    def _compile(self, *sources, depfile=None):
+        return self._compiler.compile(self._get_cflags(),
                                       self._options.cpp_includes,
                                       sources,
-                                      self._options.init_sections)
+                                      self._options.init_sections,
+                                      depfile=depfile)
 
-    def _link(self, output, sources):
+    def _get_link_args(self, output, sources):
         args = []
         libtool = utils.get_libtool_command(self._options)
         if libtool:
@@ -230,11 +321,6 @@ class DumpCompiler(object):
         # Make sure to list the library to be introspected first since it's
         # likely to be uninstalled yet and we want the uninstalled RPATHs have
         # priority (or we might run with installed library that is older)
-        for source in sources:
-            if not os.path.exists(source):
-                raise CompilerError(
-                    "Could not find object file: %s" % (source, ))
-
         args.extend(sources)
 
         pkg_config_libs = pkgconfig.libs(self._packages,
@@ -266,13 +352,20 @@ class DumpCompiler(object):
                 if ldflag != '-Wl,--as-needed':
                     args.append(ldflag)
 
+        return args
+
+    def _link(self, args, sources):
+        for source in sources:
+            if not os.path.exists(source):
+                raise CompilerError(
+                    "Could not find object file: %s" % (source, ))
+
         dll_dirs = utils.dll_dirs()
         dll_dirs.add_dll_dirs(self._packages)
 
         if not self._options.quiet:
-            print("g-ir-scanner: link: %s" % (
+            self._print("g-ir-scanner: link: %s" % (
                 subprocess.list2cmdline(args), ))
-            sys.stdout.flush()
 
         msys = os.environ.get('MSYSTEM', None)
         if msys and not self._compiler.check_is_msvc():
@@ -289,7 +382,7 @@ class DumpCompiler(object):
             shell = utils.which(shell)
             args = [shell, tf_name.replace('\\', '/')]
         try:
-            subprocess.check_call(args)
+            self._run(args)
         except subprocess.CalledProcessError as e:
             raise LinkerError(e)
         finally:
@@ -297,8 +390,261 @@ class DumpCompiler(object):
                 os.remove(tf_name)
             dll_dirs.cleanup_dll_dirs()
 
+    def _print(self, text):
+        if self._output is None:
+            print(text)
+            sys.stdout.flush()
+        else:
+            self._output.write('stdout', text + '\n')
+
+    def _run(self, args):
+        """Runs the command @args, raising subprocess.CalledProcessError if
+it fails."""
+        if self._output is None:
+            subprocess.check_call(args)
+            return
+        proc = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True, errors='replace')
+        self._output.write('stdout', proc.stdout)
+        self._output.write('stderr', proc.stderr)
+        proc.check_returncode()
+
+    def _spawn(self, cmd, **kwargs):
+        # Replaces the spawn() method of the distutils compiler
+        try:
+            self._run(cmd)
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise DistutilsExecError("command %r failed: %s" % (cmd[0], e))
+
+    # Cache of the compiled objects and linked binaries
+
+    def _get_program_identity(self, program):
+        path = utils.which(program)
+        if path is None:
+            return None
+        st = os.stat(path)
+        return '%s:%d:%d' % (os.path.realpath(path), st.st_mtime_ns, st.st_size)
+
+    def _get_compile_key(self, c_path):
+        """Returns the cache key of the object compiled from @c_path, or
+None if it isn't to be cached.  The headers the source includes aren't
+known before compiling it, they are checked when loading the object."""
+        if self._cachestore is None:
+            return None
+
+        # The compiler may be run through wrappers like ccache, all the
+        # programs up to the first option are part of it
+        compiler = self._compiler.compiler.compiler
+        identities = []
+        for program in compiler:
+            if program.startswith('-'):
+                break
+            identity = self._get_program_identity(program)
+            if identity is None:
+                return None
+            identities.append(identity)
+
+        digest = hashlib.sha1()
+        with open(c_path, 'rb') as f:
+            digest.update(f.read())
+        for item in (['object', os.getcwd()] + identities + compiler + self._get_cflags()
+                     + self._options.cpp_includes
+                     + [os.environ.get(var, '') for var in ('CFLAGS', 'CPPFLAGS')]):
+            digest.update(b'\0' + item.encode('utf-8'))
+        return 'dump-' + digest.hexdigest()
+
+    def _get_link_key(self, compile_key, args, tmpdir):
+        """Returns the cache key of the binary linked from the object with
+@compile_key, or None if it isn't to be cached.  Besides the link command,
+the key covers the content of the libraries being introspected, so that
+rebuilding them invalidates the binary."""
+        identity = self._get_program_identity(args[0])
+        if identity is None:
+            return None
+
+        library_paths = [arg[2:] for arg in args if arg.startswith('-L')]
+        digests = []
+        for library in self._options.libraries + self._options.extra_libraries:
+            filename = find_library(library, library_paths)
+            digest = None if filename is None else self._cachestore.get_digest(filename)
+            if digest is not None:
+                digests.append(digest)
+            elif library in self._options.libraries:
+                # Most likely installed in a system directory, where it
+                # could be replaced behind our back
+                return None
+
+        digest = hashlib.sha1()
+        # The output and the object are in the temporary directory, and
+        # relative library paths depend on the current one
+        for item in ([compile_key, identity, os.getcwd()] + digests
+                     + [arg.replace(tmpdir, '') for arg in args]):
+            digest.update(b'\0' + item.encode('utf-8'))
+        return 'dump-' + digest.hexdigest()
+
+    def _get_dependencies(self, depfile, tmpdir):
+        """Returns the (filename, digest) pairs of the files the compiler
+listed in @depfile, except the generated ones in @tmpdir, or None if
+they can't be tracked."""
+        try:
+            with open(depfile, encoding='utf-8') as f:
+                content = f.read()
+        except (OSError, UnicodeError):
+            return None
+        # A make rule, whose prerequisites may span escaped newlines and
+        # have their spaces escaped
+        prerequisites = content.replace('\\\n', ' ').partition(': ')[2]
+        dependencies = []
+        for word in _DEPFILE_WORD_RE.findall(prerequisites):
+            filename = os.path.abspath(_DEPFILE_ESCAPE_RE.sub(r'\1', word))
+            if filename.startswith(tmpdir + os.sep):
+                continue
+            digest = self._cachestore.get_digest(filename)
+            if digest is None:
+                return None
+            dependencies.append((filename, digest))
+        return dependencies
+
+    def _load_cached(self, key, filename):
+        """Writes the file stored under @key to @filename and returns the
+dependencies it was stored with, or returns None if there is no such
+file or any of its dependencies changed."""
+        entry = self._cachestore.load_key(key)
+        if entry is None:
+            return None
+        mode, data, dependencies = entry
+        for dependency, digest in dependencies:
+            if self._cachestore.get_digest(dependency) != digest:
+                return None
+        with open(filename, 'wb') as f:
+            f.write(data)
+        os.chmod(filename, mode)
+        return dependencies
+
+    def _store_cached(self, key, filename, dependencies):
+        with open(filename, 'rb') as f:
+            data = f.read()
+        self._cachestore.store_key(key, (os.stat(filename).st_mode & 0o777, data,
+                                         dependencies))
+
 
 def compile_introspection_binary(options, get_type_functions,
                                  error_quark_functions):
     dc = DumpCompiler(options, get_type_functions, error_quark_functions)
     return dc.run()
+
+
+class _CapturedOutput(object):
+    """The output of the commands run to build the introspection binary in
+    the background, written out later so that it doesn't mix with the
+    messages of the main thread."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, name, text):
+        """Adds @text, written to the sys.stdout or sys.stderr @name."""
+        if text:
+            self._chunks.append((name, text))
+
+    def flush(self):
+        chunks, self._chunks = self._chunks, []
+        for name, text in chunks:
+            stream = getattr(sys, name)
+            stream.write(text)
+            stream.flush()
+
+
+class _BinaryFuture(object):
+    """Wraps the concurrent.futures.Future building the introspection
+    binary, its result() first writes out the output of the build."""
+
+    def __init__(self, future, output):
+        self._future = future
+        self._output = output
+
+    def result(self):
+        try:
+            return self._future.result()
+        finally:
+            self._output.flush()
+
+
+def start_compile_introspection_binary(options, get_type_functions,
+                                       error_quark_functions):
+    """Like compile_introspection_binary(), but compiles and links the
+    binary in a background thread, so that the caller can do other work
+    meanwhile.  Returns a future, whose result() is the
+    IntrospectionBinary or raises the error the build failed with.  The
+    output of the compiler and linker is held back until then."""
+    output = _CapturedOutput()
+    dc = DumpCompiler(options, get_type_functions, error_quark_functions, output=output)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(dc.run)
+    executor.shutdown(wait=False)
+    return _BinaryFuture(future, output)
+
+
+class DumpCache(object):
+    """A cache of the output of the introspection binary, together with
+    the shared libraries resolved from it.
+
+    The output only depends on the libraries being introspected and on
+    the functions the binary calls, so a scan of an unchanged library
+    doesn't need to build and run the binary at all.  Libraries which
+    aren't in the current directory or in the --library-path directories
+    can't be tracked, nothing is cached for them.  Neither is anything
+    cached when the libraries these load can't be found, as a change to
+    any of them could change the output too."""
+
+    def __init__(self, options, get_type_functions, error_quark_functions):
+        self._cachestore = CacheStore()
+        self._key = self._get_key(options, get_type_functions, error_quark_functions)
+        self._entry = None
+
+    def _get_key(self, options, get_type_functions, error_quark_functions):
+        # A program given with --program could do anything
+        if options.program:
+            return None
+
+        library_paths = ['.'] + options.library_paths
+        digest = hashlib.sha1(b'gdump')
+        for library in options.libraries + options.extra_libraries:
+            filename = find_library(library, library_paths)
+            library_digest = None if filename is None else self._cachestore.get_digest(filename)
+            if library_digest is not None:
+                digest.update(b'\0' + library_digest.encode('ascii'))
+            elif library in options.libraries:
+                return None
+        for item in (options.libraries + options.init_sections
+                     + ['get-type'] + get_type_functions
+                     + ['error-quark'] + error_quark_functions):
+            digest.update(b'\0' + item.encode('utf-8'))
+        return 'gdump-' + digest.hexdigest()
+
+    def load(self):
+        """Returns the (shlibs, dump XML) pair stored for the libraries,
+        or None.  The entry is only used while the shared libraries the
+        binary loaded are unchanged."""
+        if self._entry is None and self._key is not None:
+            entry = self._cachestore.load_key(self._key)
+            if entry is not None:
+                shlibs, xml, dependencies = entry
+                for filename, digest in dependencies:
+                    if self._cachestore.get_digest(filename) != digest:
+                        return None
+                self._entry = (shlibs, xml)
+        return self._entry
+
+    def store(self, shlibs, xml, dependencies):
+        """Stores the output of the binary, @dependencies being the paths
+        of the shared libraries it loaded, or None if they are unknown."""
+        if self._key is None or dependencies is None:
+            return
+        digests = []
+        for filename in dependencies:
+            digest = self._cachestore.get_digest(filename)
+            if digest is None:
+                return
+            digests.append((filename, digest))
+        self._cachestore.store_key(self._key, (shlibs, xml, digests))
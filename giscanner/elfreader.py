@@ -0,0 +1,145 @@
+# -*- Mode: Python -*-
+# GObject-Introspection - a framework for introspecting GObject libraries
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+#
+
+"""Reads the dynamic section of ELF executables and shared libraries,
+which lists the shared libraries they need, without running them."""
+
+import mmap
+import struct
+
+_ELF_MAGIC = b'\x7fELF'
+
+_ELFCLASS32 = 1
+_ELFCLASS64 = 2
+
+_ELFDATA2LSB = 1
+_ELFDATA2MSB = 2
+
+_SHT_DYNAMIC = 6
+
+_DT_NULL = 0
+_DT_NEEDED = 1
+_DT_SONAME = 14
+_DT_RPATH = 15
+_DT_RUNPATH = 29
+
+# Formats of the file header (after e_ident), section header and dynamic
+# entry, by ELF class
+_FORMATS = {
+    _ELFCLASS32: ('HHIIIIIHHHHHH', 'IIIIIIIIII', 'iI'),
+    _ELFCLASS64: ('HHIQQQIHHHHHH', 'IIQQQQIIQQ', 'qQ'),
+}
+
+
+class ELFError(Exception):
+    pass
+
+
+class DynamicInfo(object):
+    """The dependencies of an ELF file, as listed in its dynamic section.
+
+    elf_class and machine tell which libraries can be loaded together with
+    the file, rpath and runpath are lists of directories."""
+
+    def __init__(self, elf_class, machine):
+        self.elf_class = elf_class
+        self.machine = machine
+        self.needed = []
+        self.soname = None
+        self.rpath = []
+        self.runpath = []
+
+
+def read_dynamic_info(filename):
+    """Returns the DynamicInfo of the ELF file @filename.  Raises ELFError
+if it isn't an ELF file or has no dynamic section, as for static
+executables."""
+    try:
+        with open(filename, 'rb') as f:
+            # Only a few parts of a library are looked at
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        raise ELFError('%s: %s' % (filename, e))
+
+    with data:
+        return _read_dynamic_info(filename, data)
+
+
+def _read_dynamic_info(filename, data):
+    if data[:4] != _ELF_MAGIC or len(data) < 16:
+        raise ELFError('%s: not an ELF file' % (filename, ))
+    elf_class = data[4]
+    if elf_class not in _FORMATS:
+        raise ELFError('%s: unknown ELF class %d' % (filename, elf_class))
+    if data[5] == _ELFDATA2LSB:
+        byteorder = '<'
+    elif data[5] == _ELFDATA2MSB:
+        byteorder = '>'
+    else:
+        raise ELFError('%s: unknown ELF data encoding %d' % (filename, data[5]))
+
+    header_format, section_format, dynamic_format = [
+        struct.Struct(byteorder + fmt) for fmt in _FORMATS[elf_class]]
+    try:
+        (e_type, e_machine, e_version, e_entry, e_phoff, e_shoff, e_flags,
+         e_ehsize, e_phentsize, e_phnum, e_shentsize, e_shnum,
+         e_shstrndx) = header_format.unpack_from(data, 16)
+
+        sections = [section_format.unpack_from(data, e_shoff + i * e_shentsize)
+                    for i in range(e_shnum)]
+        dynamic = None
+        for section in sections:
+            if section[1] == _SHT_DYNAMIC:
+                dynamic = section
+                break
+        if dynamic is None:
+            raise ELFError('%s: no dynamic section' % (filename, ))
+
+        # sh_link of the dynamic section is its string table
+        strtab_offset = sections[dynamic[6]][4]
+        entries = []
+        offset = dynamic[4]
+        end = offset + dynamic[5]
+        while offset + dynamic_format.size <= end:
+            tag, value = dynamic_format.unpack_from(data, offset)
+            if tag == _DT_NULL:
+                break
+            entries.append((tag, value))
+            offset += dynamic_format.size
+    except (struct.error, IndexError):
+        raise ELFError('%s: truncated ELF file' % (filename, ))
+
+    def get_string(index):
+        start = strtab_offset + index
+        end = data.find(b'\0', start)
+        if end == -1:
+            raise ELFError('%s: unterminated string' % (filename, ))
+        return data[start:end].decode('utf-8', 'surrogateescape')
+
+    info = DynamicInfo(elf_class, e_machine)
+    for tag, value in entries:
+        if tag == _DT_NEEDED:
+            info.needed.append(get_string(value))
+        elif tag == _DT_SONAME:
+            info.soname = get_string(value)
+        elif tag == _DT_RPATH:
+            info.rpath.extend(get_string(value).split(':'))
+        elif tag == _DT_RUNPATH:
+            info.runpath.extend(get_string(value).split(':'))
+    return info
@@ -0,0 +1,97 @@
+# -*- Mode: Python -*-
+# GObject-Introspection - a framework for introspecting GObject libraries
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+#
+
+import subprocess
+
+
+class FilterCommand(object):
+    """Runs names through an external filter command, as used by
+--identifier-filter-cmd and --symbol-filter-cmd.
+
+By default the command is run once per name, receiving the name on stdin
+and writing the result to stdout.  In persistent mode the command is
+started once and has to answer every line it reads on stdin with one line
+on stdout, flushing it before reading the next one.  Results are memoized
+in both modes."""
+
+    def __init__(self, cmd, persistent=False):
+        self._cmd = cmd
+        self._persistent = persistent
+        self._proc = None
+        self._results = {}
+
+    def filter(self, text):
+        result = self._results.get(text)
+        if result is None:
+            if self._persistent:
+                result = self._filter_persistent(text)
+            else:
+                result = self._filter_once(text)
+            self._results[text] = result
+        return result
+
+    def close(self):
+        """Stops the persistent filter process, if it was started."""
+        if self._proc is None:
+            return
+        proc = self._proc
+        self._proc = None
+        proc.stdin.close()
+        proc.stdout.close()
+        proc.wait()
+
+    def _filter_once(self, text):
+        proc = subprocess.Popen(self._cmd,
+                                stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        output, err = proc.communicate(text.encode())
+        if proc.returncode:
+            raise ValueError('filter: %r exited: %d with error: %s' %
+                             (self._cmd, proc.returncode, err))
+        return output.decode('ascii').strip()
+
+    def _filter_persistent(self, text):
+        if '\n' in text:
+            raise ValueError('filter: cannot send %r to %r, it contains a newline' %
+                             (text, self._cmd))
+        if self._proc is None:
+            # stderr isn't captured, as nothing would read it until the
+            # process exits.
+            self._proc = subprocess.Popen(self._cmd,
+                                          stdin=subprocess.PIPE,
+                                          stdout=subprocess.PIPE)
+        try:
+            self._proc.stdin.write(text.encode() + b'\n')
+            self._proc.stdin.flush()
+            output = self._proc.stdout.readline()
+        except BrokenPipeError:
+            output = b''
+        if not output.endswith(b'\n'):
+            proc = self._proc
+            self._proc = None
+            proc.stdout.close()
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            returncode = proc.wait()
+            raise ValueError('filter: %r exited: %d before answering %r' %
+                             (self._cmd, returncode, text))
+        return output.decode('ascii').strip()
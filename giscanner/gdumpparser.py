@@ -22,7 +22,7 @@ import os
 import sys
 import tempfile
 import subprocess
-from xml.etree.ElementTree import parse
+from xml.etree.ElementTree import fromstring
 
 from . import ast
 from . import message
@@ -67,6 +67,7 @@ class GDumpParser(object):
         self._transformer = transformer
         self._namespace = transformer.namespace
         self._binary = None
+        self._dump_xml = None
         self._get_type_functions = []
         self._error_quark_functions = []
         self._error_domains = {}
@@ -102,13 +103,24 @@ class GDumpParser(object):
     def set_introspection_binary(self, binary):
         self._binary = binary
 
+    def get_dump_xml(self):
+        """Returns the output of the introspection binary read by
+        parse()."""
+        return self._dump_xml
+
+    def set_dump_xml(self, xml):
+        """Makes parse() use @xml, the output of an earlier run of the
+        introspection binary, instead of running it."""
+        self._dump_xml = xml
+
     def parse(self):
         """Do remaining parsing steps requiring introspection binary"""
 
         # Get all the GObject data by passing our list of get_type
         # functions to the compiled binary, returning an XML blob.
-        tree = self._execute_binary_get_tree()
-        root = tree.getroot()
+        if self._dump_xml is None:
+            self._dump_xml = self._execute_binary_get_xml()
+        root = fromstring(self._dump_xml)
         for child in root:
             if child.tag == 'error-quark':
                 self._introspect_error_quark(child)
@@ -143,7 +155,7 @@ class GDumpParser(object):
 
     # Helper functions
 
-    def _execute_binary_get_tree(self):
+    def _execute_binary_get_xml(self):
         """Load the library (or executable), returning an XML
 blob containing data gleaned from GObject's primitive introspection."""
         in_path = os.path.join(self._binary.tmpdir, 'functions.txt')
@@ -175,7 +187,8 @@ blob containing data gleaned from GObject's primitive introspection."""
             except subprocess.CalledProcessError as e:
                 # Clean up temporaries
                 raise SystemExit(e)
-            return parse(out_path)
+            with open(out_path, 'rb') as f:
+                return f.read()
         finally:
             if not utils.have_debug_flag('save-temps'):
                 utils.rmtree(self._binary.tmpdir)
@@ -21,7 +21,7 @@
 import os
 
 from collections import OrderedDict
-from xml.etree.ElementTree import parse
+from xml.etree.ElementTree import parse, XMLPullParser
 
 from . import ast
 from .girwriter import COMPATIBLE_GIR_VERSION
@@ -33,6 +33,10 @@ DOC_NS = "http://www.gtk.org/introspection/doc/1.0"
 GLIB_NS = "http://www.gtk.org/introspection/glib/1.0"
 
 
+# Amount of data read at a time when looking for the namespace element
+_HEADER_READ_SIZE = 8192
+
+
 def _corens(tag):
     return '{%s}%s' % (CORE_NS, tag)
 
@@ -49,6 +53,40 @@ def _docns(tag):
     return '{%s}%s' % (DOC_NS, tag)
 
 
+# Children of toplevel nodes which add entries to the symbols table
+_LAZY_SYMBOL_TAGS = frozenset([_corens('constructor'), _corens('function'),
+                               _corens('member'), _corens('method')])
+
+
+class _LazyNamespace(ast.LazyNamespace):
+    """Namespace returned by GIRParser.parse_lazy(), the load keys are the
+XML elements of the toplevel nodes."""
+
+    def __init__(self, name, version, identifier_prefixes=None, symbol_prefixes=None):
+        ast.LazyNamespace.__init__(self, name, version,
+                                   identifier_prefixes=identifier_prefixes,
+                                   symbol_prefixes=symbol_prefixes)
+        self._index_loaded = False
+        self._parser = None
+        self._filename = None
+        self._parser_methods = None
+
+    def _set_source(self, parser, filename):
+        self._parser = parser
+        self._filename = filename
+
+    def _load_index(self):
+        self._parser_methods = self._parser._index_lazy(self, self._filename)
+
+    def _load(self, node):
+        self._parser._load_lazy(self, self._filename, self._parser_methods, node)
+        if not self._pending_keys:
+            # Everything was created, release the XML tree
+            self._index = {'ctypes': {}, 'type_names': {}, 'symbols': {}}
+            self._parser = None
+            self._parser_methods = None
+
+
 class GIRParser(object):
 
     def __init__(self, types_only=False):
@@ -65,13 +103,20 @@ class GIRParser(object):
         self.parse_tree(tree)
         self._filename_stack.pop()
 
+    def parse_lazy(self, filename):
+        """Like parse(), but only reads the header of @filename upfront.
+The rest of the file is parsed on the first lookup into the namespace,
+and its nodes are only created once they are looked up."""
+        filename = os.path.abspath(filename)
+        self._filename_stack.append(filename)
+        self._reset()
+        root, ns = self._read_header(filename)
+        self._parse_header(root, ns, _LazyNamespace)
+        self._namespace._set_source(self, filename)
+        self._filename_stack.pop()
+
     def parse_tree(self, tree):
-        self._namespace = None
-        self._pkgconfig_packages = set()
-        self._includes = set()
-        self._c_includes = set()
-        self._doc_format = "unknown"
-        self._c_prefix = None
+        self._reset()
         self._parse_api(tree.getroot())
 
     def get_namespace(self):
@@ -79,6 +124,14 @@ class GIRParser(object):
 
     # Private
 
+    def _reset(self):
+        self._namespace = None
+        self._pkgconfig_packages = set()
+        self._includes = set()
+        self._c_includes = set()
+        self._doc_format = "unknown"
+        self._c_prefix = None
+
     def _find_first_child(self, node, name_or_names):
         if isinstance(name_or_names, str):
             for child in node:
@@ -103,6 +156,34 @@ class GIRParser(object):
         return curfile
 
     def _parse_api(self, root):
+        ns = root.find(_corens('namespace'))
+        self._parse_header(root, ns, ast.Namespace)
+        parser_methods = self._get_parser_methods()
+        for node in ns:
+            method = parser_methods.get(node.tag)
+            if method is not None:
+                method(node)
+
+    def _read_header(self, filename):
+        """Reads @filename up to the start of the namespace element, and
+returns the repository and namespace elements.  Only the attributes of the
+namespace element are guaranteed to be complete."""
+        pull_parser = XMLPullParser(events=('start', ))
+        root = None
+        with open(filename, 'rb') as f:
+            while True:
+                data = f.read(_HEADER_READ_SIZE)
+                if not data:
+                    break
+                pull_parser.feed(data)
+                for event, elem in pull_parser.read_events():
+                    if root is None:
+                        root = elem
+                    elif elem.tag == _corens('namespace'):
+                        return root, elem
+        return root, None
+
+    def _parse_header(self, root, ns, namespace_class):
         assert root.tag == _corens('repository')
         version = root.attrib['version']
         if version != COMPATIBLE_GIR_VERSION:
@@ -119,7 +200,6 @@ class GIRParser(object):
             elif node.tag == _docns('format'):
                 self._parse_doc_format(node)
 
-        ns = root.find(_corens('namespace'))
         assert ns is not None
         identifier_prefixes = ns.attrib.get(_cns('identifier-prefixes'))
         if identifier_prefixes:
@@ -127,10 +207,10 @@ class GIRParser(object):
         symbol_prefixes = ns.attrib.get(_cns('symbol-prefixes'))
         if symbol_prefixes:
             symbol_prefixes = symbol_prefixes.split(',')
-        self._namespace = ast.Namespace(ns.attrib['name'],
-                                        ns.attrib['version'],
-                                        identifier_prefixes=identifier_prefixes,
-                                        symbol_prefixes=symbol_prefixes)
+        self._namespace = namespace_class(ns.attrib['name'],
+                                          ns.attrib['version'],
+                                          identifier_prefixes=identifier_prefixes,
+                                          symbol_prefixes=symbol_prefixes)
         if 'shared-library' in ns.attrib:
             self._namespace.shared_libraries = ns.attrib['shared-library'].split(',')
         self._namespace.includes = self._includes
@@ -138,6 +218,7 @@ class GIRParser(object):
         self._namespace.doc_format = self._doc_format
         self._namespace.exported_packages = self._pkgconfig_packages
 
+    def _get_parser_methods(self):
         parser_methods = {
             _corens('alias'): self._parse_alias,
             _corens('bitfield'): self._parse_enumeration_bitfield,
@@ -155,11 +236,49 @@ class GIRParser(object):
             parser_methods[_corens('function-inline')] = self._parse_function_inline
             parser_methods[_corens('function-macro')] = self._parse_function_macro
             parser_methods[_corens('function')] = self._parse_function
+        return parser_methods
 
+    def _index_lazy(self, namespace, filename):
+        """Parses the XML of @filename and registers its toplevel nodes
+with the _LazyNamespace @namespace, without creating them."""
+        tree = parse(filename)
+        ns = tree.getroot().find(_corens('namespace'))
+        parser_methods = self._get_parser_methods()
+        index = namespace._index
         for node in ns:
-            method = parser_methods.get(node.tag)
-            if method is not None:
-                method(node)
+            if node.tag not in parser_methods:
+                continue
+            if node.tag == _glibns('boxed'):
+                name = node.attrib[_glibns('name')]
+                index['type_names'][node.attrib[_glibns('type-name')]] = node
+            else:
+                name = node.attrib['name']
+                gtype_name = node.attrib.get(_glibns('type-name'))
+                if gtype_name is not None:
+                    index['type_names'][gtype_name] = node
+            namespace._add_pending(name, node)
+            ctype = node.attrib.get(_cns('type'))
+            if ctype is not None:
+                index['ctypes'][ctype] = node
+            if self._types_only:
+                continue
+            symbol = node.attrib.get(_cns('identifier'))
+            if symbol is not None:
+                index['symbols'][symbol] = node
+            for child in node:
+                if child.tag in _LAZY_SYMBOL_TAGS:
+                    symbol = child.attrib.get(_cns('identifier'))
+                    if symbol is not None:
+                        index['symbols'][symbol] = node
+        return parser_methods
+
+    def _load_lazy(self, namespace, filename, parser_methods, node):
+        self._namespace = namespace
+        self._filename_stack.append(filename)
+        try:
+            parser_methods[node.tag](node)
+        finally:
+            self._filename_stack.pop()
 
     def _parse_doc_section(self, node):
         docsection = ast.DocSection(node.attrib["name"])
@@ -516,9 +635,8 @@ class GIRParser(object):
     def _parse_type_simple(self, typenode):
         # ast.Fields can contain inline callbacks
         if typenode.tag == _corens('callback'):
-            typeval = self._namespace.type_from_name(typenode.attrib['name'])
-            typeval.ctype = typenode.attrib.get(_cns('type'))
-            return typeval
+            return self._namespace.type_from_name(typenode.attrib['name'],
+                                                  typenode.attrib.get(_cns('type')))
         # ast.Arrays have their own toplevel XML
         elif typenode.tag == _corens('array'):
             array_type = typenode.attrib.get('name')
@@ -0,0 +1,241 @@
+# -*- Mode: Python -*-
+# GObject-Introspection - a framework for introspecting GObject libraries
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+#
+
+"""Serialization of parsed GIR namespaces for the include cache.
+
+The format is a small header followed by the toplevel nodes, pickled in
+chunks of consecutive nodes:
+
+  magic (4 bytes) | format version (u32) | header length (u32)
+  header (marshal)
+  chunks
+
+The header holds the namespace attributes, the names of all the nodes,
+the offset and length of every chunk, and an index mapping the keys of
+the namespace lookup tables (ctypes, type_names, symbols, aliases) to the
+chunk holding the value.  It only uses builtin types so marshal can load
+it very quickly.
+
+A chunk is only unpickled when one of its nodes is first looked up, so a
+scan only pays for the parts of its includes it actually references.
+"""
+
+import io
+import marshal
+import pickle
+import struct
+
+from . import ast
+
+_MAGIC = b'GINS'
+_FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct('<4sII')
+
+_NAMESPACE_ID = 'namespace'
+
+# Namespace lookup tables which are stored along with the nodes, and
+# those which are covered by the index
+_TABLES = ('ctypes', 'type_names', 'symbols', 'aliases')
+_INDEXED_TABLES = ('ctypes', 'type_names', 'symbols')
+
+# Approximate size of the pickled data of a chunk of nodes
+_CHUNK_SIZE = 16 * 1024
+
+
+class SerializerError(Exception):
+    pass
+
+
+class _NodePickler(pickle.Pickler):
+    """Pickles a node, replacing references to its namespace with a
+    persistent id, and records every object it has seen."""
+
+    def __init__(self, f, namespace):
+        pickle.Pickler.__init__(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._namespace = namespace
+        self.seen = set()
+
+    def persistent_id(self, obj):
+        if obj is self._namespace:
+            return _NAMESPACE_ID
+        self.seen.add(id(obj))
+        return None
+
+
+class _NodeUnpickler(pickle.Unpickler):
+
+    def __init__(self, f, namespace):
+        pickle.Unpickler.__init__(self, f)
+        self._namespace = namespace
+
+    def persistent_load(self, pid):
+        if pid != _NAMESPACE_ID:
+            raise pickle.UnpicklingError("unsupported persistent id %r" % (pid, ))
+        return self._namespace
+
+
+def _get_table_entries(namespace):
+    """Returns a dict mapping id() of every object stored in one of
+    the namespace lookup tables to the list of (table, key) pairs
+    pointing to it, and a dict keeping those objects alive."""
+    entries = {}
+    objects = {}
+    for table in _TABLES:
+        for key, obj in getattr(namespace, table).items():
+            entries.setdefault(id(obj), []).append((table, key))
+            objects[id(obj)] = obj
+    return entries, objects
+
+
+def _take_owned_entries(pickler, entries, objects):
+    owned = []
+    for obj_id in pickler.seen:
+        for table, key in entries.pop(obj_id, ()):
+            owned.append((table, key, objects[obj_id]))
+    return owned
+
+
+def dump_namespace(namespace, f, chunk_size=_CHUNK_SIZE):
+    """Write @namespace to the binary file object @f.  Consecutive nodes
+    are grouped in chunks of about @chunk_size bytes."""
+    # Create all the nodes first in case the namespace is lazy
+    items = list(namespace.items())
+    entries, objects = _get_table_entries(namespace)
+    index = {table: {} for table in _INDEXED_TABLES}
+    names = []
+    chunks = []
+    data = io.BytesIO()
+    pickler = None
+
+    def finish_chunk():
+        # Pickle the table entries owned by the nodes of this chunk with
+        # the same pickler, so that they refer to the objects inside the
+        # nodes when loaded.
+        owned = _take_owned_entries(pickler, entries, objects)
+        for table, key, obj in owned:
+            if table in index:
+                index[table][key] = len(chunks)
+        pickler.dump(owned)
+        chunks.append((offset, data.tell() - offset, count))
+
+    for name, node in items:
+        if pickler is None:
+            offset = data.tell()
+            count = 0
+            pickler = _NodePickler(data, namespace)
+        pickler.dump(node)
+        names.append(name)
+        count += 1
+        if data.tell() - offset >= chunk_size:
+            finish_chunk()
+            pickler = None
+    if pickler is not None:
+        finish_chunk()
+
+    # Table entries pointing outside of the toplevel nodes, for example
+    # functions which were floated; these are loaded eagerly.
+    orphans = []
+    for obj_id, table_keys in entries.items():
+        for table, key in table_keys:
+            orphans.append((table, key, objects[obj_id]))
+    if orphans:
+        offset = data.tell()
+        _NodePickler(data, namespace).dump(orphans)
+        orphans_chunk = (offset, data.tell() - offset)
+    else:
+        orphans_chunk = None
+
+    header = marshal.dumps({
+        'name': namespace.name,
+        'version': namespace.version,
+        'identifier_prefixes': list(namespace.identifier_prefixes),
+        'symbol_prefixes': list(namespace.symbol_prefixes),
+        'shared_libraries': list(namespace.shared_libraries),
+        'includes': [(i.name, i.version) for i in namespace.includes],
+        'c_includes': namespace.c_includes,
+        'exported_packages': namespace.exported_packages,
+        'doc_format': namespace.doc_format,
+        'names': names,
+        'chunks': chunks,
+        'index': index,
+        'orphans': orphans_chunk,
+    })
+    f.write(_PREAMBLE.pack(_MAGIC, _FORMAT_VERSION, len(header)))
+    f.write(header)
+    f.write(data.getbuffer())
+
+
+def load_namespace(f):
+    """Read a namespace written by dump_namespace() from the binary file
+    object @f.  The returned namespace unpickles its nodes lazily."""
+    data = f.read()
+    if len(data) < _PREAMBLE.size:
+        raise SerializerError("truncated namespace data")
+    magic, version, header_length = _PREAMBLE.unpack_from(data)
+    if magic != _MAGIC or version != _FORMAT_VERSION:
+        raise SerializerError("unsupported namespace data")
+    start = _PREAMBLE.size
+    header = marshal.loads(data[start:start + header_length])
+    return _CachedNamespace(header, memoryview(data)[start + header_length:])
+
+
+class _CachedNamespace(ast.LazyNamespace):
+    """A Namespace loaded by load_namespace(), whose nodes are unpickled
+    the first time they are looked up."""
+
+    def __init__(self, header, data):
+        ast.LazyNamespace.__init__(self, header['name'], header['version'],
+                                   identifier_prefixes=header['identifier_prefixes'],
+                                   symbol_prefixes=header['symbol_prefixes'])
+        self.shared_libraries = header['shared_libraries']
+        self.includes = set(ast.Include(name, version)
+                            for name, version in header['includes'])
+        self.c_includes = header['c_includes']
+        self.exported_packages = header['exported_packages']
+        self.doc_format = header['doc_format']
+
+        self._data = data
+        self._chunks = header['chunks']
+        names = iter(header['names'])
+        for i, (offset, length, count) in enumerate(self._chunks):
+            for j in range(count):
+                self._add_pending(next(names), i)
+        self._index.update(header['index'])
+
+        if header['orphans'] is not None:
+            offset, length = header['orphans']
+            unpickler = self._get_unpickler(offset, length)
+            self._add_table_entries(unpickler.load())
+
+    def _get_unpickler(self, offset, length):
+        return _NodeUnpickler(io.BytesIO(self._data[offset:offset + length]), self)
+
+    def _add_table_entries(self, entries):
+        for table, key, obj in entries:
+            # Entries added to the namespace after loading take precedence
+            getattr(self, table).setdefault(key, obj)
+
+    def _load(self, chunk):
+        offset, length, count = self._chunks[chunk]
+        unpickler = self._get_unpickler(offset, length)
+        for i in range(count):
+            self.append(unpickler.load())
+        self._add_table_entries(unpickler.load())
+        if not self._pending_keys:
+            self._data = None
@@ -31,14 +31,15 @@ COMPATIBLE_GIR_VERSION = '1.2'
 
 class GIRWriter(XMLWriter):
 
-    def __init__(self, namespace, sources_roots=[]):
-        super(GIRWriter, self).__init__()
+    def __init__(self, namespace, sources_roots=[], output=None):
+        super(GIRWriter, self).__init__(output)
         self.write_comment(
             'This file was automatically generated from C sources - DO NOT EDIT!\n'
             'To affect the contents of this file, edit the original C definitions,\n'
             'and/or use gtk-doc annotations. ')
         self.sources_roots = sources_roots
         self._write_repository(namespace)
+        self.flush()
 
     def _write_repository(self, namespace):
         attrs = [
@@ -82,7 +82,7 @@ typedef struct {
 
 NEW_CLASS (PyGISourceSymbol, "SourceSymbol", GISourceSymbol, 10);
 NEW_CLASS (PyGISourceType, "SourceType", GISourceType, 9);
-NEW_CLASS (PyGISourceScanner, "SourceScanner", GISourceScanner, 9);
+NEW_CLASS (PyGISourceScanner, "SourceScanner", GISourceScanner, 11);
 
 
 /* Symbol */
@@ -354,47 +354,41 @@ static PyObject *
 pygi_source_scanner_parse_macros (PyGISourceScanner *self,
                                   PyObject          *list)
 {
-  GList *filenames;
+  GList *filenames, *contents;
   int i;
 
   if (!PyList_Check (list))
     {
-      PyErr_SetString (PyExc_RuntimeError, "parse macro takes a list of filenames");
+      PyErr_SetString (PyExc_RuntimeError, "parse macro takes a list of (filename, contents) tuples");
       return NULL;
     }
 
   filenames = NULL;
+  contents = NULL;
   for (i = 0; i < PyList_Size (list); ++i)
     {
-      PyObject *obj;
-      char *filename = NULL;
+      const char *filename;
+      const char *data;
+      Py_ssize_t length;
 
-      obj = PyList_GetItem (list, i);
-      if (PyUnicode_Check (obj))
+      if (!PyArg_ParseTuple (PyList_GetItem (list, i), "sy#:SourceScanner.parse_macros",
+                             &filename, &data, &length))
         {
-          PyObject *s = PyUnicode_AsUTF8String (obj);
-          filename = g_strdup (PyBytes_AsString (s));
-          Py_DECREF (s);
-        }
-      else if (PyBytes_Check (obj))
-        {
-          filename = g_strdup (PyBytes_AsString (obj));
-        }
-
-      if (filename == NULL)
-        {
-          PyErr_Format (PyExc_RuntimeError,
-                        "Expected string but got %s",
-                        (Py_TYPE(obj))->tp_name);
           g_list_free_full (filenames, g_free);
+          g_list_free_full (contents, (GDestroyNotify) g_bytes_unref);
           return NULL;
         }
 
-      filenames = g_list_append (filenames, filename);
+      filenames = g_list_prepend (filenames, g_strdup (filename));
+      /* The bytes objects are kept alive by @list meanwhile */
+      contents = g_list_prepend (contents, g_bytes_new_static (data, length));
     }
+  filenames = g_list_reverse (filenames);
+  contents = g_list_reverse (contents);
 
-  gi_source_scanner_parse_macros (self->scanner, filenames);
+  gi_source_scanner_parse_macros (self->scanner, filenames, contents);
   g_list_free_full (filenames, g_free);
+  g_list_free_full (contents, (GDestroyNotify) g_bytes_unref);
 
   Py_RETURN_NONE;
 }
@@ -468,6 +462,165 @@ pygi_source_scanner_get_symbols (PyGISourceScanner *self, G_GNUC_UNUSED PyObject
   return list;
 }
 
+/* Bulk export of the symbols, as nested tuples in the order of the
+ * attributes of _SymbolRecord and _TypeRecord in sourcescanner.py.
+ * Types referenced more than once are exported once, @exported maps
+ * them to their (borrowed) tuples.
+ */
+
+static PyObject * pygi_source_type_export (GISourceType *type,
+                                           GHashTable   *exported);
+
+static PyObject *
+pygi_source_symbol_export (GISourceSymbol *symbol,
+                           GHashTable     *exported)
+{
+  PyObject *base_type;
+  PyObject *const_int;
+  PyObject *const_double;
+  PyObject *const_boolean;
+
+  base_type = pygi_source_type_export (symbol->base_type, exported);
+  if (!base_type)
+    return NULL;
+
+  if (!symbol->const_int_set)
+    {
+      Py_INCREF (Py_None);
+      const_int = Py_None;
+    }
+  else if (symbol->const_int_is_unsigned)
+    const_int = PyLong_FromUnsignedLongLong ((unsigned long long)symbol->const_int);
+  else
+    const_int = PyLong_FromLongLong ((long long)symbol->const_int);
+
+  if (!symbol->const_double_set)
+    {
+      Py_INCREF (Py_None);
+      const_double = Py_None;
+    }
+  else
+    const_double = PyFloat_FromDouble (symbol->const_double);
+
+  if (!symbol->const_boolean_set)
+    {
+      Py_INCREF (Py_None);
+      const_boolean = Py_None;
+    }
+  else
+    const_boolean = PyBool_FromLong (symbol->const_boolean);
+
+  return Py_BuildValue ("(isNNNzNziN)",
+                        symbol->type,
+                        symbol->ident,
+                        base_type,
+                        const_int,
+                        const_double,
+                        symbol->const_string,
+                        const_boolean,
+                        symbol->source_filename,
+                        symbol->line,
+                        PyBool_FromLong (symbol->private));
+}
+
+static PyObject *
+pygi_source_type_export (GISourceType *type,
+                         GHashTable   *exported)
+{
+  PyObject *result;
+  PyObject *base_type;
+  PyObject *child_list;
+  GList *l;
+  Py_ssize_t n_children = 0;
+  Py_ssize_t i = 0;
+
+  if (type == NULL)
+    Py_RETURN_NONE;
+
+  result = g_hash_table_lookup (exported, type);
+  if (result)
+    {
+      Py_INCREF (result);
+      return result;
+    }
+
+  base_type = pygi_source_type_export (type->base_type, exported);
+  if (!base_type)
+    return NULL;
+
+  for (l = type->child_list; l; l = l->next)
+    if (l->data)
+      n_children++;
+
+  child_list = PyTuple_New (n_children);
+  if (!child_list)
+    {
+      Py_DECREF (base_type);
+      return NULL;
+    }
+
+  for (l = type->child_list; l; l = l->next)
+    {
+      PyObject *item;
+
+      if (!l->data)
+        continue;
+
+      item = pygi_source_symbol_export (l->data, exported);
+      if (!item)
+        {
+          Py_DECREF (base_type);
+          Py_DECREF (child_list);
+          return NULL;
+        }
+      PyTuple_SET_ITEM (child_list, i++, item);
+    }
+
+  result = Py_BuildValue ("(iiiizNNi)",
+                          type->type,
+                          type->storage_class_specifier,
+                          type->type_qualifier,
+                          type->function_specifier,
+                          type->name,
+                          base_type,
+                          child_list,
+                          type->is_bitfield);
+  if (result)
+    g_hash_table_insert (exported, type, result);
+
+  return result;
+}
+
+static PyObject *
+pygi_source_scanner_export_symbols (PyGISourceScanner *self, G_GNUC_UNUSED PyObject *unused)
+{
+  GPtrArray *symbols;
+  GHashTable *exported;
+  PyObject *list;
+  guint i = 0;
+
+  symbols = gi_source_scanner_get_symbols (self->scanner);
+  list = PyList_New (symbols->len);
+  if (!list)
+    return NULL;
+
+  exported = g_hash_table_new (NULL, NULL);
+  for (i = 0; i != symbols->len; ++i)
+    {
+      PyObject *item = pygi_source_symbol_export (g_ptr_array_index (symbols, i),
+                                                  exported);
+      if (!item)
+        {
+          Py_CLEAR (list);
+          break;
+        }
+      PyList_SET_ITEM (list, i, item);
+    }
+  g_hash_table_destroy (exported);
+
+  return list;
+}
+
 static PyObject *
 pygi_source_scanner_get_errors (PyGISourceScanner *self, G_GNUC_UNUSED PyObject *unused)
 {
@@ -527,10 +680,95 @@ pygi_source_scanner_get_comments (PyGISourceScanner *self, G_GNUC_UNUSED PyObjec
   return list;
 }
 
+/* Bulk export of the comments, as a (data, filenames, table) tuple.
+ * data holds all the comments one after the other, in UTF-8, and table
+ * four native 64-bit integers for each of them: the start and end of the
+ * comment in data (-1 if it has none), the index of its file in
+ * filenames and its line.  See _CommentBuffer in sourcescanner.py.
+ */
+static PyObject *
+pygi_source_scanner_export_comments (PyGISourceScanner *self, G_GNUC_UNUSED PyObject *unused)
+{
+  GPtrArray *comments;
+  GByteArray *data;
+  GArray *table;
+  GHashTable *filename_indexes;
+  PyObject *filenames;
+  PyObject *result = NULL;
+  guint i = 0;
+
+  filenames = PyList_New (0);
+  if (!filenames)
+    return NULL;
+
+  comments = gi_source_scanner_get_comments (self->scanner);
+  data = g_byte_array_new ();
+  table = g_array_sized_new (FALSE, FALSE, sizeof (gint64), comments->len * 4);
+  filename_indexes = g_hash_table_new (g_str_hash, g_str_equal);
+
+  for (i = 0; i != comments->len; ++i)
+    {
+      GISourceComment *comment = g_ptr_array_index (comments, i);
+      gpointer index;
+      gint64 entry[4];
+
+      if (comment->comment)
+        {
+          entry[0] = data->len;
+          g_byte_array_append (data, (const guint8 *)comment->comment,
+                               strlen (comment->comment));
+          entry[1] = data->len;
+        }
+      else
+        {
+          entry[0] = -1;
+          entry[1] = -1;
+        }
+
+      if (!g_hash_table_lookup_extended (filename_indexes, comment->filename,
+                                         NULL, &index))
+        {
+          PyObject *filename = PyUnicode_FromString (comment->filename);
+
+          if (!filename || PyList_Append (filenames, filename) < 0)
+            {
+              Py_XDECREF (filename);
+              Py_DECREF (filenames);
+              goto out;
+            }
+          Py_DECREF (filename);
+          index = GINT_TO_POINTER (PyList_GET_SIZE (filenames) - 1);
+          g_hash_table_insert (filename_indexes, comment->filename, index);
+        }
+      entry[2] = GPOINTER_TO_INT (index);
+      entry[3] = comment->line;
+
+      g_array_append_vals (table, entry, 4);
+    }
+
+  /* The arrays have no data at all when they are empty, and "y#" would
+   * turn it into None */
+  result = Py_BuildValue ("(y#Ny#)",
+                          data->len ? (const char *)data->data : "",
+                          (Py_ssize_t)data->len,
+                          filenames,
+                          table->len ? table->data : "",
+                          (Py_ssize_t)(table->len * sizeof (gint64)));
+
+out:
+  g_hash_table_destroy (filename_indexes);
+  g_array_free (table, TRUE);
+  g_byte_array_free (data, TRUE);
+
+  return result;
+}
+
 static const PyMethodDef _PyGISourceScanner_methods[] = {
   { "get_errors", (PyCFunction) pygi_source_scanner_get_errors, METH_NOARGS },
   { "get_comments", (PyCFunction) pygi_source_scanner_get_comments, METH_NOARGS },
+  { "export_comments", (PyCFunction) pygi_source_scanner_export_comments, METH_NOARGS },
   { "get_symbols", (PyCFunction) pygi_source_scanner_get_symbols, METH_NOARGS },
+  { "export_symbols", (PyCFunction) pygi_source_scanner_export_symbols, METH_NOARGS },
   { "append_filename", (PyCFunction) pygi_source_scanner_append_filename, METH_VARARGS },
   { "parse_file", (PyCFunction) pygi_source_scanner_parse_file, METH_VARARGS },
   { "parse_macros", (PyCFunction) pygi_source_scanner_parse_macros, METH_O },
@@ -20,6 +20,7 @@
 from . import ast
 from . import message
 from .annotationparser import TAG_RETURNS
+from .passscheduler import PassScheduler
 
 
 class IntrospectablePass(object):
@@ -32,15 +33,25 @@ class IntrospectablePass(object):
     # Public API
 
     def validate(self):
-        self._namespace.walk(self._introspectable_alias_analysis)
-        self._namespace.walk(self._propagate_callable_skips)
-        self._namespace.walk(self._analyze_node)
-        self._namespace.walk(self._introspectable_callable_analysis)
-        self._namespace.walk(self._introspectable_callable_analysis)
-        self._namespace.walk(self._introspectable_property_analysis)
-        self._namespace.walk(self._introspectable_pass3)
-        self._namespace.walk(self._remove_non_reachable_backcompat_copies)
-        self._namespace.walk(self._introspectable_symbol_collisions)
+        # Most passes look at the introspectability of the nodes types
+        # refer to, so they need the previous pass to be complete; see
+        # PassScheduler.
+        scheduler = PassScheduler(self._namespace)
+        scheduler.add_walk('alias-analysis', self._introspectable_alias_analysis)
+        scheduler.add_walk('callable-skips', self._propagate_callable_skips,
+                           after=['alias-analysis'])
+        scheduler.add_walk('analyze-node', self._analyze_node,
+                           after=['callable-skips'])
+        scheduler.add_walk('callable-analysis', self._introspectable_callable_analysis,
+                           after=['analyze-node'])
+        scheduler.add_walk('callable-analysis2', self._introspectable_callable_analysis,
+                           after=['callable-analysis'])
+        scheduler.add_walk('property-analysis', self._introspectable_property_analysis,
+                           after=['callable-analysis2'])
+        scheduler.add_walk('pass3', self._introspectable_pass3)
+        scheduler.add_walk('backcompat-copies', self._remove_non_reachable_backcompat_copies)
+        scheduler.add_walk('symbol-collisions', self._introspectable_symbol_collisions)
+        scheduler.run()
 
     def _parameter_warning(self, parent, param, text, position=None):
         # Suppress VFunctions and Callbacks warnings for now
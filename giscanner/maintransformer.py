@@ -22,6 +22,7 @@ import re
 from . import ast
 from . import message
 from .annotationparser import (TAG_DEPRECATED, TAG_SINCE, TAG_STABILITY, TAG_RETURNS)
+from .annotationparser import GtkDocCommentBlockIndex
 from .annotationparser import (
     ANN_ALLOW_NONE,
     ANN_ARRAY,
@@ -72,6 +73,7 @@ from .annotationparser import (
     OPT_TRANSFER_NONE,
 )
 
+from .passscheduler import PassScheduler
 from .utils import to_underscores_noprefix
 
 
@@ -82,6 +84,12 @@ class MainTransformer(object):
         self._blocks = blocks
         self._namespace = transformer.namespace
         self._uscore_type_names = {}
+        # Nodes with types which failed to resolve, by id() as the hash of
+        # a node changes when it's renamed
+        self._unresolved_nodes = {}
+        # Types created from annotations, which the later type resolution
+        # passes resolve again, like the first one does with the tree
+        self._annotation_types = []
 
     # Public API
 
@@ -91,32 +99,57 @@ class MainTransformer(object):
                           '* Not including .h files to be scanned\n'
                           '* Broken --identifier-prefix')
 
+        # Passes which don't conflict are run in the same traversal of
+        # the namespace; after lists the earlier passes a pass reads the
+        # results of, or changes what they read, on other nodes.
+        scheduler = PassScheduler(self._namespace)
+
         # Some initial namespace surgery
-        self._namespace.walk(self._pass_fixup_hidden_fields)
+        scheduler.add_walk('fixup-hidden-fields', self._pass_fixup_hidden_fields)
 
         # We have a rough tree which should have most of of the types
         # we know about.  Let's attempt closure; walk over all of the
         # Type() types and see if they match up with something.
-        self._namespace.walk(self._pass_type_resolution)
+        scheduler.add_walk('type-resolution', self._pass_type_resolution)
 
         # Read in annotations needed early
-        self._namespace.walk(self._pass_read_annotations_early)
+        scheduler.add_walk('read-annotations-early', self._pass_read_annotations_early)
 
         # Determine some default values for transfer etc.
         # based on the current tree.
-        self._namespace.walk(self._pass_callable_defaults)
+        scheduler.add_walk('callable-defaults', self._pass_callable_defaults,
+                           after=['type-resolution', 'read-annotations-early'])
 
         # Read in most annotations now.
-        self._namespace.walk(self._pass_read_annotations)
+        scheduler.add_walk('read-annotations', self._pass_read_annotations,
+                           after=['callable-defaults'])
 
         # Now that we have associated doc SECTIONs to classes,
         # add the unused section blocks as standalone nodes.
-        self._add_standalone_doc_sections()
+        scheduler.add_step(self._add_standalone_doc_sections)
 
         # Now that we've possibly seen more types from annotations,
         # do another type resolution pass.
-        self._namespace.walk(self._pass_type_resolution)
+        scheduler.add_step(self._resolve_unresolved_types)
+
+        scheduler.add_step(self._pair_nodes)
+
+        # Some annotations need to be post function pairing
+        scheduler.add_walk('read-annotations2', self._pass_read_annotations2)
+
+        # Another type resolution pass after we've parsed virtuals, etc.
+        scheduler.add_step(self._resolve_unresolved_types)
+
+        scheduler.add_walk('pass3', self._pass3)
+
+        scheduler.run()
 
+        # TODO - merge into pass3
+        self._pair_quarks_with_enums()
+
+    # Private
+
+    def _pair_nodes(self):
         # Generate a reverse mapping "bar_baz" -> BarBaz
         for node in self._namespace.values():
             if isinstance(node, ast.Registered) and node.get_type is not None:
@@ -135,22 +168,18 @@ class MainTransformer(object):
             if isinstance(node, (ast.Enum, ast.Bitfield)):
                 self._pass_member_numeric_name(node)
 
-        # Some annotations need to be post function pairing
-        self._namespace.walk(self._pass_read_annotations2)
-
-        # Another type resolution pass after we've parsed virtuals, etc.
-        self._namespace.walk(self._pass_type_resolution)
-
-        self._namespace.walk(self._pass3)
-
-        # TODO - merge into pass3
-        self._pair_quarks_with_enums()
-
-    # Private
-
     def _add_standalone_doc_sections(self):
-        for block_name, block in self._blocks.items():
-            if block_name.startswith("SECTION:") and block.description:
+        # Only look at the sections, the blocks may be a
+        # GtkDocCommentBlockIndex which parses them on demand
+        if isinstance(self._blocks, GtkDocCommentBlockIndex):
+            block_names = self._blocks.names()
+        else:
+            block_names = list(self._blocks)
+        for block_name in block_names:
+            if not block_name.startswith("SECTION:"):
+                continue
+            block = self._blocks.get(block_name)
+            if block is not None and block.description:
                 node = ast.DocSection(block_name[8:])
                 node.doc = block.description
                 node.doc_position = block.position
@@ -377,7 +406,7 @@ class MainTransformer(object):
             return top_combiner(*args), rest
 
         def resolver(ident):
-            res = self._transformer.create_type_from_user_string(ident)
+            res = self._create_type_from_user_string(ident)
             return res
 
         def combiner(base, *rest):
@@ -396,6 +425,7 @@ class MainTransformer(object):
 
         def top_combiner(base, *rest):
             if type_node is not None and isinstance(type_node, ast.Type):
+                base = base.unshared()
                 base.is_const = type_node.is_const
             return combiner(base, *rest)
 
@@ -413,14 +443,22 @@ class MainTransformer(object):
                 text = type_str
             message.warn_node(parent, "%s: Unknown type: '%s'" %
                               (text, type_str), positions=position)
+            if isinstance(parent, ast.Node):
+                self._unresolved_nodes[id(parent)] = parent
         return result
 
+    def _create_type_from_user_string(self, type_str):
+        typeval = self._transformer.create_type_from_user_string(type_str)
+        self._annotation_types.append(typeval)
+        return typeval
+
     def _resolve_toplevel(self, type_str, type_node=None, node=None, parent=None):
         """Like _resolve(), but attempt to preserve more attributes of original type."""
         result = self._resolve(type_str, type_node=type_node, node=node, parent=parent)
         # If we replace a node with a new type (such as an annotated) we
         # might lose the ctype from the original node.
         if type_node is not None:
+            result = result.unshared()
             result.ctype = type_node.ctype
             result.complete_ctype = type_node.complete_ctype
         return result
@@ -1017,7 +1055,7 @@ class MainTransformer(object):
 
         type_annotation = annotations.get(ANN_TYPE)
         if type_annotation:
-            field.type = self._transformer.create_type_from_user_string(type_annotation[0])
+            field.type = self._create_type_from_user_string(type_annotation[0])
         try:
             self._adjust_container_type(parent, field, annotations)
         except AttributeError as ex:
@@ -1156,43 +1194,69 @@ the ones that failed to resolve removed."""
         return new_typelist
 
     def _pass_type_resolution(self, node, chain):
+        if not self._resolve_node_types(node):
+            self._unresolved_nodes[id(node)] = node
+        return True
+
+    def _resolve_unresolved_types(self):
+        """Resolves the types of the nodes which failed to resolve so far,
+and the types created from annotations since the first pass, so that the
+rest of the tree doesn't need to be walked again."""
+        for typeval in self._annotation_types:
+            self._transformer.resolve_type(typeval)
+        for key, node in list(self._unresolved_nodes.items()):
+            if self._resolve_node_types(node):
+                del self._unresolved_nodes[key]
+
+    def _resolve_node_types(self, node):
+        """Resolves the types referenced by @node, not including the ones
+of its children.  Returns False if some of them failed to resolve."""
+        resolved = True
+
+        def resolve(typeval):
+            nonlocal resolved
+            if not self._transformer.resolve_type(typeval):
+                resolved = False
+
         if isinstance(node, ast.Alias):
-            self._transformer.resolve_type(node.target)
+            resolve(node.target)
         if isinstance(node, ast.Callable):
             for parameter in node.parameters:
-                self._transformer.resolve_type(parameter.type)
-            self._transformer.resolve_type(node.retval.type)
+                resolve(parameter.type)
+            resolve(node.retval.type)
         if isinstance(node, ast.Constant):
-            self._transformer.resolve_type(node.value_type)
+            resolve(node.value_type)
         if isinstance(node, (ast.Class, ast.Interface, ast.Record, ast.Union)):
             for field in node.fields:
                 if field.anonymous_node:
                     pass
                 else:
-                    self._transformer.resolve_type(field.type)
+                    resolve(field.type)
         if isinstance(node, (ast.Class, ast.Interface)):
             for parent in node.parent_chain:
                 try:
                     self._transformer.resolve_type(parent)
                 except ValueError:
+                    resolved = False
                     continue
                 target = self._transformer.lookup_typenode(parent)
                 if target:
                     node.parent_type = parent
                     break
+                resolved = False
             else:
                 if isinstance(node, ast.Interface):
                     node.parent_type = ast.Type(target_giname='GObject.Object')
             for prop in node.properties:
-                self._transformer.resolve_type(prop.type)
+                resolve(prop.type)
             for sig in node.signals:
                 for param in sig.parameters:
-                    self._transformer.resolve_type(param.type)
+                    resolve(param.type)
         if isinstance(node, ast.Class):
             node.interfaces = self._resolve_and_filter_type_list(node.interfaces)
         if isinstance(node, ast.Interface):
             node.prerequisites = self._resolve_and_filter_type_list(node.prerequisites)
-        return True
+        return resolved
 
     def _pair_quarks_with_enums(self):
         # self._uscore_type_names is an authoritative mapping of types
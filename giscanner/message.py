@@ -128,6 +128,17 @@ class MessageLogger(object):
     def get_warning_count(self):
         return self._warning_count
 
+    @property
+    def output(self):
+        return self._output
+
+    def redirect(self, output):
+        """Writes the messages to the file @output from now on, and returns
+        the file they were written to so far."""
+        previous = self._output
+        self._output = output
+        return previous
+
     def log(self, log_type, text, positions=None, prefix=None, marker_pos=None, marker_line=None):
         """
         Log a warning, using optional file positioning information.
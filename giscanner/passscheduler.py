@@ -0,0 +1,120 @@
+# -*- Mode: Python -*-
+# GObject-Introspection - a framework for introspecting GObject libraries
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+#
+
+import io
+
+from .message import MessageLogger
+
+
+class _FusedWalk(object):
+    """A Namespace.walk() callback running several passes on every node.
+
+A pass returning False for a node skips its children for that pass only;
+the children are still visited as long as another pass wants them.
+
+The messages of every pass are held back until flush(), which writes
+them pass after pass, in the order the passes would have written them
+one traversal each."""
+
+    def __init__(self, callbacks):
+        self._callbacks = callbacks
+        self._logger = MessageLogger.get()
+        self._outputs = [io.StringIO() for callback in callbacks]
+        # Names the traversal in the phase profile like a plain callback
+        self.__name__ = '+'.join(getattr(callback, '__name__', repr(callback))
+                                 for callback in callbacks)
+        # For every pass, the depth of the node whose children it
+        # skips, or None
+        self._skipped = [None] * len(callbacks)
+
+    def __call__(self, node, chain):
+        depth = len(chain)
+        descend = False
+        for i, callback in enumerate(self._callbacks):
+            skipped = self._skipped[i]
+            if skipped is not None:
+                if depth > skipped:
+                    continue
+                self._skipped[i] = None
+            output = self._logger.redirect(self._outputs[i])
+            try:
+                result = callback(node, chain)
+            finally:
+                self._logger.redirect(output)
+            if result:
+                descend = True
+            else:
+                self._skipped[i] = depth
+        return descend
+
+    def flush(self):
+        for output in self._outputs:
+            self._logger.output.write(output.getvalue())
+            output.seek(0)
+            output.truncate()
+
+
+class PassScheduler(object):
+    """Runs the passes of a transformation over a namespace.
+
+Walk passes are callbacks for Namespace.walk().  Consecutive walk passes
+are fused into a single traversal of the namespace, which hands every
+node to each of them in turn.  This only works if a pass doesn't look at
+what the passes fused with it change on other nodes, so a pass has to
+list the earlier passes it conflicts with in @after, and only starts
+once they have visited the whole namespace.  Steps are run on their own
+between traversals."""
+
+    def __init__(self, namespace):
+        self._namespace = namespace
+        # Lists of (name, callback) walk passes, or step functions
+        self._groups = []
+        self._names = set()
+
+    def add_walk(self, name, callback, after=()):
+        for pass_name in after:
+            assert pass_name in self._names, pass_name
+        group = self._groups[-1] if self._groups else None
+        if (not isinstance(group, list)
+                or any(pass_name in after for pass_name, _ in group)):
+            group = []
+            self._groups.append(group)
+        group.append((name, callback))
+        self._names.add(name)
+
+    def add_step(self, func):
+        self._groups.append(func)
+
+    def get_walk_count(self):
+        """Returns the number of traversals of the namespace run()
+does."""
+        return sum(1 for group in self._groups if isinstance(group, list))
+
+    def run(self):
+        for group in self._groups:
+            if not isinstance(group, list):
+                group()
+            elif len(group) == 1:
+                self._namespace.walk(group[0][1])
+            else:
+                walk = _FusedWalk([callback for _, callback in group])
+                try:
+                    self._namespace.walk(walk)
+                finally:
+                    walk.flush()
@@ -0,0 +1,134 @@
+# -*- Mode: Python -*-
+# GObject-Introspection - a framework for introspecting GObject libraries
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+#
+
+import contextlib
+import gc
+import json
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None  # type: ignore
+
+
+def _get_peak_rss():
+    """Returns the peak resident set size of the process in KiB,
+    or None if it cannot be determined on this platform."""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+    if sys.platform == 'darwin':
+        maxrss //= 1024
+    return maxrss
+
+
+class PhaseProfiler(object):
+    """Records wall time, CPU time, peak RSS and the number of objects
+    tracked by the garbage collector for each phase of a scanner run.
+
+    A disabled profiler (the default) turns all the recording methods
+    into no-ops so callers don't need to check whether profiling was
+    requested."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._phases = []
+        self._current = None
+        self._info = {}
+
+    def _snapshot(self):
+        return (time.perf_counter(), time.process_time())
+
+    def _make_record(self, name, start, end):
+        return {
+            'name': name,
+            'wall_time': round(end[0] - start[0], 6),
+            'cpu_time': round(end[1] - start[1], 6),
+            'peak_rss_kb': _get_peak_rss(),
+            'objects': len(gc.get_objects()),
+        }
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Context manager measuring the code run inside of it as
+        the phase @name."""
+        if not self.enabled:
+            yield
+            return
+
+        parent = self._current
+        walks = []
+        self._current = walks
+        start = self._snapshot()
+        try:
+            yield
+        finally:
+            end = self._snapshot()
+            self._current = parent
+            record = self._make_record(name, start, end)
+            record['walks'] = walks
+            self._phases.append(record)
+
+    def watch_namespace(self, namespace):
+        """Make every Namespace.walk() on @namespace be recorded as
+        a pass of the phase it was called from, named after the
+        walk callback."""
+        if not self.enabled:
+            return
+
+        walk = namespace.walk
+
+        def profiled_walk(callback):
+            start = self._snapshot()
+            try:
+                return walk(callback)
+            finally:
+                end = self._snapshot()
+                if self._current is not None:
+                    name = getattr(callback, '__name__', repr(callback))
+                    self._current.append(self._make_record(name, start, end))
+
+        namespace.walk = profiled_walk
+
+    def get_phases(self):
+        return self._phases
+
+    def add_info(self, name, value):
+        """Add a free-form @value to the report under the key @name."""
+        if self.enabled:
+            self._info[name] = value
+
+    def write(self, filename):
+        if not self.enabled:
+            return
+
+        data = {
+            'phases': self._phases,
+            'total_wall_time': round(sum(p['wall_time'] for p in self._phases), 6),
+            'total_cpu_time': round(sum(p['cpu_time'] for p in self._phases), 6),
+            'peak_rss_kb': _get_peak_rss(),
+        }
+        data.update(self._info)
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+            f.write('\n')
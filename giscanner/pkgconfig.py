@@ -16,21 +16,143 @@
 # Boston, MA 02111-1307, USA.
 #
 
+import hashlib
 import os
 import shlex
 import subprocess
+from typing import Dict  # noqa
+
+from . import utils
 
 
 class PkgConfigError(Exception):
     pass
 
 
+# Outputs of the queries to pkg-config made by this process, by command
+# line and environment.  A scan asks for the flags of the same packages
+# several times.
+_outputs = {}  # type: Dict[tuple, str]
+
+# Digests of the .pc files in the search path, by search path
+_search_path_digests = {}  # type: Dict[tuple, str]
+
+# The CacheStore keeping the outputs across processes, see set_cachestore()
+_cachestore = None
+
+
+def set_cachestore(cachestore):
+    """Keeps the outputs of pkg-config in @cachestore, a CacheStore, for
+later processes.  By default they are only memoized in this process."""
+    global _cachestore
+    _cachestore = cachestore
+
+
+def _get_environment():
+    return tuple(sorted((name, value) for name, value in os.environ.items()
+                        if name.startswith('PKG_CONFIG')))
+
+
+def _get_search_path(program):
+    search_path = []
+    pkg_config_path = os.environ.get('PKG_CONFIG_PATH')
+    if pkg_config_path:
+        search_path.extend(pkg_config_path.split(os.pathsep))
+    if 'PKG_CONFIG_LIBDIR' in os.environ:
+        libdir = os.environ['PKG_CONFIG_LIBDIR']
+    else:
+        # The default search path, which is compiled into pkg-config
+        try:
+            libdir = _get_cached_output([program, '--variable', 'pc_path', 'pkg-config'],
+                                        use_search_path=False).strip()
+        except (subprocess.CalledProcessError, OSError):
+            return None
+    if libdir:
+        search_path.extend(libdir.split(os.pathsep))
+    return search_path
+
+
+def _get_search_path_digest(search_path):
+    key = tuple(search_path)
+    result = _search_path_digests.get(key)
+    if result is not None:
+        return result
+
+    digest = hashlib.sha1()
+    for directory in search_path:
+        digest.update(b'\0dir:' + directory.encode('utf-8'))
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError:
+            continue
+        for name in names:
+            if not name.endswith('.pc'):
+                continue
+            try:
+                st = os.stat(os.path.join(directory, name))
+            except OSError:
+                continue
+            digest.update(('\0%s:%d:%d' % (name, st.st_mtime_ns, st.st_size)).encode('utf-8'))
+    result = digest.hexdigest()
+    _search_path_digests[key] = result
+    return result
+
+
+def _get_cache_key(argv, use_search_path):
+    path = utils.which(argv[0])
+    if path is None:
+        return None
+    st = os.stat(path)
+
+    digest = hashlib.sha1()
+    digest.update(('%s:%d:%d' % (os.path.realpath(path), st.st_mtime_ns, st.st_size)).encode('utf-8'))
+    for item in argv[1:]:
+        digest.update(b'\0' + item.encode('utf-8'))
+    for name, value in _get_environment():
+        digest.update(('\0%s=%s' % (name, value)).encode('utf-8'))
+    if use_search_path:
+        search_path = _get_search_path(argv[0])
+        if search_path is None:
+            return None
+        digest.update(_get_search_path_digest(search_path).encode('ascii'))
+    return 'pkg-config-' + digest.hexdigest()
+
+
+def _get_cached_output(argv, use_search_path=True):
+    """Runs pkg-config with @argv, unless this process or, with a cache
+store set, an earlier one already did.  The outputs are cached on disk
+together with the modification times of the .pc files in the search
+path, so that installing or changing a package invalidates them."""
+    key = (tuple(argv), _get_environment())
+    output = _outputs.get(key)
+    if output is not None:
+        return output
+
+    cache_key = None
+    if _cachestore is not None:
+        cache_key = _get_cache_key(argv, use_search_path)
+    if cache_key is not None:
+        output = _cachestore.load_key(cache_key)
+    if output is None:
+        output = subprocess.check_output(argv, universal_newlines=True, stderr=subprocess.STDOUT)
+        if cache_key is not None:
+            _cachestore.store_key(cache_key, output)
+    _outputs[key] = output
+    return output
+
+
 def check_output(flags, ignore_errors, command=None):
+    """Returns the output of pkg-config run with @flags.  Unless a
+@command is given, the result of running the pkg-config of the
+PKG_CONFIG environment variable is cached."""
+    cached = command is None
     if command is None:
         command = [os.environ.get('PKG_CONFIG', 'pkg-config')]
     argv = command[:]
     argv.extend(flags)
     try:
+        if cached:
+            return _get_cached_output(argv)
         return subprocess.check_output(argv, universal_newlines=True, stderr=subprocess.STDOUT)
     except subprocess.CalledProcessError as e:
         output = e.output or ''
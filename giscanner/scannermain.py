@@ -19,7 +19,9 @@
 # 02110-1301, USA.
 #
 
+import concurrent.futures
 import errno
+import io
 import optparse
 import os
 import shutil
@@ -32,14 +34,16 @@ import shlex
 import giscanner
 from giscanner import message, pkgconfig
 from giscanner.annotationparser import GtkDocCommentBlockParser
+from giscanner.cachestore import CacheStore
 from giscanner.ast import Include, Namespace
-from giscanner.dumper import compile_introspection_binary
+from giscanner.dumper import DumpCache, start_compile_introspection_binary
 from giscanner.gdumpparser import GDumpParser, IntrospectionBinary
 from giscanner.introspectablepass import IntrospectablePass
 from giscanner.girparser import GIRParser
 from giscanner.girwriter import GIRWriter
 from giscanner.maintransformer import MainTransformer
-from giscanner.shlibs import resolve_shlibs
+from giscanner.phaseprofiler import PhaseProfiler
+from giscanner.shlibs import get_dependencies, resolve_shlibs
 from giscanner.sourcescanner import SourceScanner, ALL_EXTS
 from giscanner.transformer import Transformer
 from . import utils
@@ -231,6 +235,12 @@ the latter is not specified.""")
                       help='Filter symbols (function names) through the given '
                            'shell command which will receive the symbol name as input '
                            'to stdin and is expected to output the filtered results to stdout.')
+    parser.add_option("", "--persistent-filter-cmds",
+                      action="store_true", dest="persistent_filter_cmds", default=False,
+                      help='Start the identifier and symbol filter commands only once. '
+                           'They receive one name per line on stdin and are expected to '
+                           'output one filtered line on stdout for each, flushing it '
+                           'before reading the next name.')
     parser.add_option("", "--accept-unprefixed",
                       action="store_true", dest="accept_unprefixed", default=False,
                       help="""If specified, accept symbols and identifiers that do not
@@ -273,6 +283,18 @@ match the namespace prefix.""")
                       help=("name of the documentation format used in the project, "
                             "should be one of gi-docgen, gtk-doc-docbook, "
                             "gtk-doc-markdown or hotdoc"))
+    parser.add_option("", "--profile-phases",
+                      action="store", dest="profile_phases", default=None,
+                      help=("write the wall time, CPU time, peak RSS and object "
+                            "count of each scanner phase as JSON to the given file"))
+    parser.add_option("", "--jobs",
+                      action="store", dest="jobs", type="int", default=1,
+                      help=("number of processes used to lex the source files and "
+                            "parse the comment blocks, the output does not depend on it"))
+    parser.add_option("", "--incremental",
+                      action="store_true", dest="incremental", default=False,
+                      help=("reuse the results of previous scans for the source "
+                            "files and headers which did not change"))
 
     group = get_preprocessor_option_group(parser)
     parser.add_option_group(group)
@@ -327,8 +349,7 @@ def passthrough_gir(path, f):
     parser = GIRParser()
     parser.parse(path)
 
-    writer = GIRWriter(parser.get_namespace())
-    f.write(writer.get_encoded_xml())
+    GIRWriter(parser.get_namespace(), output=f)
 
 
 def test_codegen(optstring,
@@ -446,7 +467,8 @@ def create_transformer(namespace, options):
     transformer = Transformer(namespace,
                               accept_unprefixed=options.accept_unprefixed,
                               identifier_filter_cmd=identifier_filter_cmd,
-                              symbol_filter_cmd=symbol_filter_cmd)
+                              symbol_filter_cmd=symbol_filter_cmd,
+                              persistent_filter_cmds=options.persistent_filter_cmds)
     transformer.set_include_paths(options.include_paths)
     if options.passthrough_gir or options.reparse_validate_gir:
         transformer.disable_cache()
@@ -466,7 +488,11 @@ def create_transformer(namespace, options):
     return transformer
 
 
-def create_binary(transformer, options, args):
+def start_binary(transformer, options):
+    """Starts building the introspection binary, which runs in the
+    background, and returns a (gdump_parser, dump_cache, future) tuple to
+    pass to finish_binary() once the binary is needed.  With --incremental,
+    nothing is built if the output of the binary is in the cache already."""
     # Transform the C AST nodes into higher level
     # GLib/GObject nodes
     gdump_parser = GDumpParser(transformer)
@@ -475,16 +501,39 @@ def create_binary(transformer, options, args):
     # when creating the introspection binary
     gdump_parser.init_parse()
 
-    if options.program:
+    dump_cache = None
+    if hasattr(options, 'incremental') and options.incremental:
+        dump_cache = DumpCache(options,
+                               gdump_parser.get_get_type_functions(),
+                               gdump_parser.get_error_quark_functions())
+    if dump_cache is not None and dump_cache.load() is not None:
+        future = concurrent.futures.Future()
+        future.set_result(None)
+    elif options.program:
         args = [options.program]
         args.extend(options.program_args)
-        binary = IntrospectionBinary(args)
+        future = concurrent.futures.Future()
+        future.set_result(IntrospectionBinary(args))
     else:
-        binary = compile_introspection_binary(options,
-                                              gdump_parser.get_get_type_functions(),
-                                              gdump_parser.get_error_quark_functions())
+        future = start_compile_introspection_binary(options,
+                                                    gdump_parser.get_get_type_functions(),
+                                                    gdump_parser.get_error_quark_functions())
+    return gdump_parser, dump_cache, future
+
+
+def finish_binary(gdump_parser, dump_cache, future, options):
+    binary = future.result()
+
+    if binary is None:
+        shlibs, xml = dump_cache.load()
+        gdump_parser.set_dump_xml(xml)
+        gdump_parser.parse()
+        return shlibs
 
     shlibs = resolve_shlibs(options, binary, options.libraries)
+    dependencies = None
+    if dump_cache is not None:
+        dependencies = get_dependencies(binary.args[0])
     if options.wrapper:
         binary.args = options.wrapper + binary.args
 
@@ -495,6 +544,8 @@ def create_binary(transformer, options, args):
 
     gdump_parser.set_introspection_binary(binary)
     gdump_parser.parse()
+    if dump_cache is not None:
+        dump_cache.store(shlibs, gdump_parser.get_dump_xml(), dependencies)
     return shlibs
 
 
@@ -517,6 +568,10 @@ def create_source_scanner(options, args):
                        options.cpp_defines,
                        options.cpp_undefines,
                        cflags=options.cflags)
+    if hasattr(options, 'incremental') and options.incremental:
+        ss.set_incremental(CacheStore())
+    if hasattr(options, 'jobs'):
+        ss.set_jobs(options.jobs)
     try:
         ss.parse_files(filenames)
         ss.parse_macros(filenames)
@@ -530,12 +585,14 @@ def create_source_scanner(options, args):
     return ss, filenames
 
 
-def write_output(data, options):
-    """Write encoded XML 'data' to the filename specified in 'options'."""
+def write_output(write, options):
+    """Write the output to the filename specified in 'options'.  'write'
+    is called with a binary file object to stream the encoded XML to."""
     if options.output == "-":
         output = sys.stdout.buffer
         try:
-            output.write(data)
+            write(output)
+            output.flush()
         except IOError as e:
             _error("while writing output: %s" % (e.strerror, ))
     elif options.reparse_validate_gir:
@@ -548,15 +605,19 @@ def write_output(data, options):
                      stat.S_IWUSR | stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
 
         with os.fdopen(main_f, 'wb') as main_f:
-            main_f.write(data)
-
-        temp_f, temp_f_name = tempfile.mkstemp(suffix='.gir')
-        with os.fdopen(temp_f, 'wb') as temp_f:
-            passthrough_gir(main_f_name, temp_f)
-        if not utils.files_are_identical(main_f_name, temp_f_name):
+            main_digest = utils.DigestFile(main_f)
+            write(main_digest)
+
+        # Only the digest of the re-parsed output is needed to validate
+        # it; it is written to a file for inspection if they differ.
+        temp_digest = utils.DigestFile()
+        passthrough_gir(main_f_name, temp_digest)
+        if temp_digest.hexdigest() != main_digest.hexdigest():
+            temp_f, temp_f_name = tempfile.mkstemp(suffix='.gir')
+            with os.fdopen(temp_f, 'wb') as temp_f:
+                passthrough_gir(main_f_name, temp_f)
             _error("Failed to re-parse gir file; scanned='%s' passthrough='%s'" % (
                 main_f_name, temp_f_name))
-        os.unlink(temp_f_name)
         try:
             shutil.move(main_f_name, options.output)
         except OSError as e:
@@ -565,11 +626,31 @@ def write_output(data, options):
             raise
         return 0
     else:
+        # Streamed into a temporary file which then replaces the output, so
+        # a failure doesn't leave a truncated output behind.  A symlink is
+        # kept, the file it points to is replaced.
+        target = os.path.realpath(options.output)
+        try:
+            fd, temp_name = tempfile.mkstemp(suffix='.gir', dir=os.path.dirname(target))
+        except IOError as e:
+            _error("opening/writing output: %s" % (e.strerror, ))
         try:
-            with open(options.output, 'wb') as output:
-                output.write(data)
+            with os.fdopen(fd, 'wb') as output:
+                write(output)
+            if os.path.isfile(target):
+                shutil.copymode(target, temp_name)
+            else:
+                # The mode open() would have created the file with
+                umask = os.umask(0)
+                os.umask(umask)
+                os.chmod(temp_name, 0o666 & ~umask)
+            os.replace(temp_name, target)
         except IOError as e:
+            os.unlink(temp_name)
             _error("opening/writing output: %s" % (e.strerror, ))
+        except BaseException:
+            os.unlink(temp_name)
+            raise
 
 
 def get_source_root_dirs(options, filenames):
@@ -650,40 +731,89 @@ def scanner_main(args):
     if options.warn_strict:
         logger.enable_strict(True)
 
-    transformer = create_transformer(namespace, options)
+    profiler = PhaseProfiler(enabled=bool(options.profile_phases))
+    profiler.watch_namespace(namespace)
+
+    with profiler.phase('includes'):
+        transformer = create_transformer(namespace, options)
+
+    if options.incremental:
+        pkgconfig.set_cachestore(CacheStore())
 
     packages = set(options.packages)
     packages.update(transformer.get_pkgconfig_packages())
     if packages:
-        try:
-            process_packages(options, packages)
-        except pkgconfig.PkgConfigError as e:
-            _error(str(e))
-
-    ss, filenames = create_source_scanner(options, args)
+        with profiler.phase('pkg-config'):
+            try:
+                process_packages(options, packages)
+            except pkgconfig.PkgConfigError as e:
+                _error(str(e))
 
-    cbp = GtkDocCommentBlockParser()
-    blocks = cbp.parse_comment_blocks(ss.get_comments())
+    with profiler.phase('source-scanner'):
+        ss, filenames = create_source_scanner(options, args)
 
-    # Transform the C symbols into AST nodes
-    transformer.parse(ss.get_symbols())
+    show_suppression = options.warn_all is False and options.warn_strict is False and options.quiet is False
+    parse_comments = options.warn_all or options.warn_fatal or show_suppression
+
+    # The comment blocks are parsed while the introspection binary is
+    # built, after the C declarations are transformed.  The messages about
+    # the C declarations are held back until the ones about the comment
+    # blocks are written, which came first before.
+    held_back = io.StringIO()
+    output = logger.redirect(held_back)
+    pool = None
+    try:
+        # Transform the C symbols into AST nodes
+        with profiler.phase('transformer-parse'):
+            transformer.parse(ss.get_symbols())
+
+        cbp = GtkDocCommentBlockParser()
+        comments = ss.get_comments()
+        # The workers parsing the comment blocks are forked before the
+        # thread building the introspection binary starts
+        if parse_comments:
+            pool = cbp.create_worker_pool(comments, options.jobs)
+
+        # The introspection binary is compiled and linked while the comment
+        # blocks are parsed, it's only needed once the GTypes are merged in
+        if not options.header_only:
+            with profiler.phase('dumper-start'):
+                gdump_parser, dump_cache, binary_future = start_binary(transformer, options)
+
+        logger.redirect(output)
+        with profiler.phase('comment-blocks'):
+            if parse_comments:
+                blocks = cbp.parse_comment_blocks(comments, jobs=options.jobs, pool=pool)
+            else:
+                # Nothing reports the messages of the comment blocks or their
+                # count, so only the ones which are looked up are parsed
+                blocks = cbp.index_comment_blocks(comments)
+    finally:
+        logger.redirect(output)
+        output.write(held_back.getvalue())
+        if pool is not None:
+            pool.terminate()
 
     if not options.header_only:
-        shlibs = create_binary(transformer, options, args)
+        with profiler.phase('dumper'):
+            shlibs = finish_binary(gdump_parser, dump_cache, binary_future, options)
     else:
         shlibs = []
 
     transformer.namespace.shared_libraries = shlibs
 
-    main = MainTransformer(transformer, blocks)
-    main.transform()
+    with profiler.phase('main-transform'):
+        main = MainTransformer(transformer, blocks)
+        main.transform()
 
     utils.break_on_debug_flag('tree')
 
-    final = IntrospectablePass(transformer, blocks)
-    final.validate()
+    with profiler.phase('introspectable'):
+        final = IntrospectablePass(transformer, blocks)
+        final.validate()
+
+    transformer.close_filters()
 
-    show_suppression = options.warn_all is False and options.warn_strict is False and options.quiet is False
     warning_count = logger.get_warning_count()
     if options.warn_fatal and warning_count > 0:
         message.fatal("warnings configured as fatal")
@@ -704,10 +834,15 @@ def scanner_main(args):
     if options.doc_format:
         transformer.namespace.doc_format = options.doc_format
 
-    sources_top_dirs = get_source_root_dirs(options, filenames)
-    writer = Writer(transformer.namespace, sources_top_dirs)
-    data = writer.get_encoded_xml()
+    with profiler.phase('write'):
+        sources_top_dirs = get_source_root_dirs(options, filenames)
+
+        def write(output):
+            Writer(transformer.namespace, sources_top_dirs, output=output)
+
+        write_output(write, options)
 
-    write_output(data, options)
+    profiler.add_info('include_cache', transformer.get_cache_stats())
+    profiler.write(options.profile_phases)
 
     return 0
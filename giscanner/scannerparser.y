@@ -1668,33 +1668,54 @@ yyerror (GISourceScanner *scanner, const char *s)
     }
 }
 
+/* The content of a file the macro scan reads */
+typedef struct
+{
+  const char *data;
+  gsize length;
+  gsize pos;
+} MacroSource;
+
+static int
+macro_source_getc (MacroSource *f)
+{
+#ifdef G_OS_WIN32
+  /* Like reading the file in text mode */
+  if (f->pos + 1 < f->length && f->data[f->pos] == '\r' && f->data[f->pos + 1] == '\n')
+    f->pos++;
+#endif
+  if (f->pos >= f->length)
+    return EOF;
+  return (unsigned char) f->data[f->pos++];
+}
+
 static int
-eat_hspace (FILE * f)
+eat_hspace (MacroSource *f)
 {
   int c;
   do
     {
-      c = fgetc (f);
+      c = macro_source_getc (f);
     }
   while (c == ' ' || c == '\t');
   return c;
 }
 
 static int
-pass_line (FILE * f, int c,
+pass_line (MacroSource *f, int c,
            FILE *out)
 {
   while (c != EOF && c != '\n')
     {
       if (out)
         fputc (c, out);
-      c = fgetc (f);
+      c = macro_source_getc (f);
     }
   if (c == '\n')
     {
       if (out)
         fputc (c, out);
-      c = fgetc (f);
+      c = macro_source_getc (f);
       if (c == ' ' || c == '\t')
         {
           c = eat_hspace (f);
@@ -1704,19 +1725,19 @@ pass_line (FILE * f, int c,
 }
 
 static int
-eat_line (FILE * f, int c)
+eat_line (MacroSource *f, int c)
 {
   return pass_line (f, c, NULL);
 }
 
 static int
-read_identifier (FILE * f, int c, char **identifier)
+read_identifier (MacroSource *f, int c, char **identifier)
 {
   GString *id = g_string_new ("");
   while (g_ascii_isalnum (c) || c == '_')
     {
       g_string_append_c (id, c);
-      c = fgetc (f);
+      c = macro_source_getc (f);
     }
   *identifier = g_string_free (id, FALSE);
   return c;
@@ -1735,14 +1756,17 @@ parse_file (GISourceScanner *scanner, FILE *file)
   return TRUE;
 }
 
+/* Scans the macro definitions of @filenames, whose content is in the
+ * #GBytes of @contents, so that the files aren't read again */
 void
-gi_source_scanner_parse_macros (GISourceScanner *scanner, GList *filenames)
+gi_source_scanner_parse_macros (GISourceScanner *scanner, GList *filenames,
+                                GList *contents)
 {
   GError *error = NULL;
   char *tmp_name = NULL;
   gint tmp_fd;
   FILE *fmacros;
-  GList *l;
+  GList *l, *m;
 
   tmp_fd = g_file_open_tmp ("gen-introspect-XXXXXX.h", &tmp_name, &error);
 
@@ -1770,16 +1794,20 @@ gi_source_scanner_parse_macros (GISourceScanner *scanner, GList *filenames)
       return;
     }
 
-  for (l = filenames; l != NULL; l = l->next)
+  for (l = filenames, m = contents; l != NULL && m != NULL; l = l->next, m = m->next)
     {
-      FILE *f = fopen (l->data, "r");
+      MacroSource source = { NULL, 0, 0 };
+      MacroSource *f = &source;
       int line = 1;
 
       GString *define_line;
       char *str;
       gboolean error_line = FALSE;
       gboolean end_of_word;
-      int c = eat_hspace (f);
+      int c;
+
+      source.data = g_bytes_get_data (m->data, &source.length);
+      c = eat_hspace (f);
       while (c != EOF)
         {
           if (c != '#')
@@ -1839,7 +1867,7 @@ gi_source_scanner_parse_macros (GISourceScanner *scanner, GList *filenames)
               while (c != ')')
                 {
                   g_string_append_c (define_line, c);
-                  c = fgetc (f);
+                  c = macro_source_getc (f);
                   if (c == EOF || c == '\n')
                     {
                       error_line = TRUE;
@@ -1857,7 +1885,7 @@ gi_source_scanner_parse_macros (GISourceScanner *scanner, GList *filenames)
 
               g_assert (c == ')');
               g_string_append_c (define_line, c);
-              c = fgetc (f);
+              c = macro_source_getc (f);
 
               /* found function-like macro */
               fprintf (fmacros, "%s\n", define_line->str);
@@ -1879,14 +1907,14 @@ gi_source_scanner_parse_macros (GISourceScanner *scanner, GList *filenames)
           while (c != EOF && c != '\n')
             {
               g_string_append_c (define_line, c);
-              c = fgetc (f);
+              c = macro_source_getc (f);
               if (c == '\\')
                 {
-                  c = fgetc (f);
+                  c = macro_source_getc (f);
                   if (c == '\n')
                     {
                       /* fold lines when seeing backslash new-line sequence */
-                      c = fgetc (f);
+                      c = macro_source_getc (f);
                     }
                   else
                     {
@@ -1902,7 +1930,6 @@ gi_source_scanner_parse_macros (GISourceScanner *scanner, GList *filenames)
           line++;
         }
 
-      fclose (f);
     }
 
   rewind (fmacros);
@@ -18,14 +18,17 @@
 # 02110-1301, USA.
 #
 
+import collections
 import os
 import sys
 import platform
 import re
 import subprocess
+import sysconfig
 
 from .utils import get_libtool_command, extract_libtool_shlib, host_os
 from .ccompiler import CCompiler
+from . import elfreader
 
 
 # For .la files, the situation is easy.
@@ -57,6 +60,83 @@ def _ldd_library_pattern(library_name):
     $""" % re.escape(library_name), re.VERBOSE)
 
 
+def _get_default_library_dirs(elf_class):
+    dirs = ['/lib', '/usr/lib']
+    if elf_class == 2:
+        dirs = ['/lib64', '/usr/lib64'] + dirs
+    multiarch = sysconfig.get_config_var('MULTIARCH')
+    if multiarch:
+        dirs = ['/lib/' + multiarch, '/usr/lib/' + multiarch] + dirs
+    return dirs
+
+
+def _find_elf_library(name, info, origin, executable, search_path):
+    if '/' in name:
+        candidates = [name]
+    else:
+        dirs = []
+        # DT_RPATH is ignored if there is a DT_RUNPATH
+        if not info.runpath:
+            dirs.extend(info.rpath)
+            if info is not executable and not executable.runpath:
+                dirs.extend(executable.rpath)
+        dirs.extend(search_path)
+        dirs.extend(info.runpath)
+        dirs.extend(_get_default_library_dirs(info.elf_class))
+        candidates = [os.path.join(d.replace('$ORIGIN', origin).replace('${ORIGIN}', origin), name)
+                      for d in dirs if d]
+
+    for candidate in candidates:
+        try:
+            dependency = elfreader.read_dynamic_info(candidate)
+        except elfreader.ELFError:
+            continue
+        # Skip libraries for another architecture, like ld.so does
+        if (dependency.elf_class, dependency.machine) == (info.elf_class, info.machine):
+            return candidate, dependency
+    return None, None
+
+
+def _get_elf_dependencies(filename):
+    """Lists the shared libraries the ELF executable @filename loads in
+ldd format, by reading them instead of running the dynamic linker.
+Raises ELFError if @filename can't be read."""
+    executable = elfreader.read_dynamic_info(filename)
+    search_path = os.environ.get('LD_LIBRARY_PATH', '').split(os.pathsep)
+    lines = []
+    seen = set()
+    queue = collections.deque([(executable, os.path.dirname(os.path.abspath(filename)))])
+    while queue:
+        info, origin = queue.popleft()
+        for name in info.needed:
+            if name in seen:
+                continue
+            seen.add(name)
+            path, dependency = _find_elf_library(name, info, origin, executable, search_path)
+            if path is None:
+                lines.append('%s => not found' % (name, ))
+                continue
+            lines.append('%s => %s' % (name, path))
+            queue.append((dependency, os.path.dirname(os.path.abspath(path))))
+    return '\n'.join(lines)
+
+
+def get_dependencies(filename):
+    """Returns the paths of the shared libraries the ELF executable
+@filename loads, or None if they can't all be found."""
+    try:
+        output = _get_elf_dependencies(filename)
+    except elfreader.ELFError:
+        return None
+    paths = []
+    for line in output.splitlines():
+        path = line.split(' => ', 1)[1]
+        if path == 'not found':
+            return None
+        paths.append(path)
+    return paths
+
+
 # This is a what we do for non-la files. We assume that we are on an
 # ELF-like system where ldd exists and the soname extracted with ldd is
 # a filename that can be opened with dlopen().
@@ -91,12 +171,24 @@ def _resolve_non_libtool(options, binary, libraries):
         cc = CCompiler()
         return cc.resolve_windows_libs(libraries, options)
     else:
-        args = []
         libtool = get_libtool_command(options)
+        platform_system = platform.system()
+        if not libtool and platform_system != 'Darwin':
+            # Reading the ELF files is much cheaper than running ldd,
+            # which is only needed if that fails
+            try:
+                output = _get_elf_dependencies(binary.args[0])
+            except elfreader.ELFError:
+                pass
+            else:
+                shlibs, unresolved = _match_libraries(libraries, output)
+                if not unresolved:
+                    return list(map(sanitize_shlib_path, shlibs))
+
+        args = []
         if libtool:
             args.extend(libtool)
             args.append('--mode=execute')
-        platform_system = platform.system()
         if options.ldd_wrapper:
             args.extend(options.ldd_wrapper)
             args.append(binary.args[0])
@@ -126,13 +218,13 @@ def sanitize_shlib_path(lib):
         return os.path.basename(lib)
 
 
-def resolve_from_ldd_output(libraries, output):
+def _match_libraries(libraries, output):
     patterns = {}
     for library in libraries:
         if not os.path.isfile(library):
             patterns[library] = _ldd_library_pattern(library)
     if len(patterns) == 0:
-        return []
+        return [], []
 
     shlibs = []
     for line in output.splitlines():
@@ -149,10 +241,15 @@ def resolve_from_ldd_output(libraries, output):
                     shlibs.append(m.group())
                     break
 
-    if len(patterns) > 0:
+    return shlibs, list(patterns.keys())
+
+
+def resolve_from_ldd_output(libraries, output):
+    shlibs, unresolved = _match_libraries(libraries, output)
+    if unresolved:
         raise SystemExit(
             "ERROR: can't resolve libraries to shared libraries: " +
-            ", ".join(patterns.keys()))
+            ", ".join(unresolved))
 
     return shlibs
 
@@ -159,7 +159,8 @@ gboolean            gi_source_scanner_lex_filename     (GISourceScanner  *igener
 gboolean            gi_source_scanner_parse_file       (GISourceScanner  *igenerator,
 						        const gchar      *filename);
 void                gi_source_scanner_parse_macros     (GISourceScanner  *scanner,
-							GList            *filenames);
+							GList            *filenames,
+							GList            *contents);
 void                gi_source_scanner_set_macro_scan   (GISourceScanner  *scanner,
 							gboolean          macro_scan);
 GPtrArray *         gi_source_scanner_get_symbols      (GISourceScanner  *scanner);
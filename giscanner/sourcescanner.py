@@ -18,12 +18,18 @@
 # Boston, MA 02111-1307, USA.
 #
 
+import bisect
+import codecs
+import hashlib
+import io
 import os
+import re
+import struct
 import tempfile
 
 from .message import Position
 from .ccompiler import CCompiler
-from .utils import have_debug_flag, dll_dirs
+from .utils import create_worker_pool, have_debug_flag, dll_dirs
 
 
 dlldirs = dll_dirs()
@@ -226,6 +232,191 @@ class SourceSymbol(object):
                         self._symbol.line)
 
 
+class _SymbolRecord(object):
+    """A copy of a symbol of the C scanner.  SourceSymbol and SourceType
+    wrap it the same way as the C objects.  The records are made from the
+    tuples CSourceScanner.export_symbols() returns, which is much cheaper
+    than reading the attributes of every C object one by one, and they can
+    be stored by the incremental mode of SourceScanner."""
+
+    __slots__ = ('type', 'ident', 'base_type', 'const_int', 'const_double',
+                 'const_string', 'const_boolean', 'source_filename', 'line',
+                 'private')
+
+    def __init__(self, state, types):
+        self.__setstate__(state)
+        self.base_type = _TypeRecord.from_state(self.base_type, types)
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+
+class _TypeRecord(object):
+    """A copy of a type of the C scanner, see _SymbolRecord."""
+
+    __slots__ = ('type', 'storage_class_specifier', 'type_qualifier',
+                 'function_specifier', 'name', 'base_type', 'child_list',
+                 'is_bitfield')
+
+    def __init__(self, state, types):
+        self.__setstate__(state)
+        self.base_type = _TypeRecord.from_state(self.base_type, types)
+        self.child_list = [_SymbolRecord(child, types) for child in self.child_list]
+
+    @classmethod
+    def from_state(cls, state, types):
+        """Returns the record of the exported type @state.  Types
+        shared by several symbols are exported once, @types maps their
+        tuples to their records so that they stay shared."""
+        if state is None:
+            return None
+        record = types.get(id(state))
+        if record is None:
+            record = types[id(state)] = cls(state, types)
+        return record
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+
+def _export_symbols(scanner):
+    """Returns _SymbolRecord copies of the symbols of the CSourceScanner
+    @scanner."""
+    states = scanner.export_symbols()
+    # Keyed by id(), @states keeps the tuples alive meanwhile
+    types = {}
+    return [_SymbolRecord(state, types) for state in states]
+
+
+# An entry of the table of CSourceScanner.export_comments()
+_COMMENT_ENTRY = struct.Struct('=qqqq')
+
+
+class _CommentBuffer(object):
+    """The comments of one or more CSourceScanner.export_comments() calls,
+    as a sequence of (comment, filename, lineno) tuples.  The comments
+    are only decoded when they are looked at, from slices of the buffer
+    of the C scanner.  The ones which aren't valid UTF-8 are reported
+    once, when the sequence is built, and read as None."""
+
+    def __init__(self, exports):
+        self._exports = exports
+        # The index of the first comment of each export, for bisect
+        self._offsets = []
+        self._length = 0
+        for data, filenames, table in exports:
+            self._offsets.append(self._length)
+            self._length += len(table) // _COMMENT_ENTRY.size
+        self._invalid = set()
+        for i, (data, filenames, table) in enumerate(exports):
+            if _is_utf8(data):
+                continue
+            view = memoryview(data)
+            for start, end, index, lineno in _COMMENT_ENTRY.iter_unpack(table):
+                if start >= 0 and not _is_utf8(view[start:end]):
+                    print("Comment is not valid Unicode in %s line %d" % (filenames[index],
+                                                                          lineno))
+                    self._invalid.add((i, start))
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        for i, (data, filenames, table) in enumerate(self._exports):
+            view = memoryview(data)
+            for start, end, index, lineno in _COMMENT_ENTRY.iter_unpack(table):
+                yield (self._decode(i, view, start, end), filenames[index], lineno)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('comment index out of range')
+        i = bisect.bisect_right(self._offsets, index) - 1
+        data, filenames, table = self._exports[i]
+        start, end, findex, lineno = _COMMENT_ENTRY.unpack_from(
+            table, (index - self._offsets[i]) * _COMMENT_ENTRY.size)
+        return (self._decode(i, memoryview(data), start, end), filenames[findex], lineno)
+
+    def __eq__(self, other):
+        if not isinstance(other, (_CommentBuffer, list)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def _decode(self, export, view, start, end):
+        if start < 0 or (export, start) in self._invalid:
+            return None
+        return str(view[start:end], 'utf-8')
+
+
+# Validating the comments decodes them this many bytes at a time
+_UTF8_CHUNK_SIZE = 1 << 20
+
+
+def _is_utf8(data):
+    """Returns whether the bytes-like @data are valid UTF-8, without
+    decoding all of them at once."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    view = memoryview(data)
+    try:
+        for offset in range(0, len(view), _UTF8_CHUNK_SIZE):
+            decoder.decode(view[offset:offset + _UTF8_CHUNK_SIZE])
+        decoder.decode(b'', True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+# Line markers written by the preprocessor, '# 1 "foo.h"' or '#line 1 "foo.h"'
+_LINEMARKER_RE = re.compile(rb'^#(?:line)? \d+ "((?:[^"\\]|\\.)*)"', re.MULTILINE)
+
+# Environment variables changing how CCompiler preprocesses
+_CPP_ENVIRON = ['CC', 'CPP', 'CFLAGS', 'CPPFLAGS']
+
+
+def _get_directive_lines(data):
+    """Returns the preprocessor directives in the content @data of a file,
+    with their line numbers and continuation lines.  This is everything
+    the macro scan looks at in a file."""
+    directives = []
+    continued = False
+    for lineno, line in enumerate(io.BytesIO(data), 1):
+        if continued or line.lstrip(b' \t').startswith(b'#'):
+            directives.append(b'%d:%s' % (lineno, line))
+            continued = line.rstrip(b'\r\n').endswith(b'\\')
+    return b''.join(directives)
+
+
+def _read_file(filename):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+
+# Below this number of source files, starting worker processes to lex them
+# costs more time than it saves
+_PARALLEL_MIN_SOURCES = 32
+
+
+def _lex_source(filename):
+    """Lexes the source file @filename on its own, returning its exported
+    comments and its errors.  Also run in the worker processes of
+    SourceScanner."""
+    scanner = CSourceScanner()
+    scanner.append_filename(filename)
+    scanner.lex_filename(filename)
+    return (scanner.export_comments(), scanner.get_errors())
+
+
 class SourceScanner(object):
 
     def __init__(self):
@@ -233,6 +424,13 @@ class SourceScanner(object):
         self._filenames = []
         self._cpp_options = []
         self._compiler = None
+        self._cachestore = None
+        self._jobs = 1
+        self._macro_filenames = []
+        self._unit = None
+        self._symbols = None
+        self._source_comments = []
+        self._source_errors = []
 
     # Public API
 
@@ -249,37 +447,79 @@ class SourceScanner(object):
     def set_compiler(self, compiler):
         self._compiler = compiler
 
+    def set_incremental(self, cachestore):
+        """Reuse the results of previous scans stored in the CacheStore
+        @cachestore.  Source files are only lexed again when their content
+        changed.  The headers are preprocessed and parsed together, so they
+        are only parsed again when any of them, any file they include, the
+        preprocessor options or the macro definitions of the scanned files
+        changed.  The preprocessor is only run again in the former cases."""
+        self._cachestore = cachestore
+
+    def set_jobs(self, jobs):
+        """Lex the source files in @jobs worker processes, while the
+        headers are parsed.  The result does not depend on it."""
+        self._jobs = jobs
+
     def parse_files(self, filenames):
         for filename in filenames:
             # self._scanner expects file names to be canonicalized and symlinks to be resolved
             filename = os.path.realpath(filename)
             self._scanner.append_filename(filename)
             self._filenames.append(filename)
+        self._symbols = None
 
-        headers = []
-        for filename in self._filenames:
-            if os.path.splitext(filename)[1] in SOURCE_EXTS:
-                self._scanner.lex_filename(filename)
-            else:
-                headers.append(filename)
+        if self._cachestore is not None:
+            # Parsed on first use, together with the macros
+            self._unit = None
+            return
 
+        sources = [f for f in self._filenames
+                   if os.path.splitext(f)[1] in SOURCE_EXTS]
+        headers = [f for f in self._filenames
+                   if os.path.splitext(f)[1] not in SOURCE_EXTS]
+        if self._use_workers(sources):
+            # Lexed by separate scanners, see get_comments()
+            lexed, _ = self._lex_sources(sources, lambda: self._parse(headers))
+            self._source_comments = [comments for comments, errors in lexed]
+            self._source_errors = [e for comments, errors in lexed for e in errors]
+            return
+
+        for filename in sources:
+            self._scanner.lex_filename(filename)
         self._parse(headers)
 
     def parse_macros(self, filenames):
-        self._scanner.set_macro_scan(True)
+        if self._cachestore is not None:
+            self._macro_filenames.extend(os.path.realpath(f) for f in filenames)
+            self._unit = None
+            return
+
+        self._symbols = None
         # self._scanner expects file names to be canonicalized and symlinks to be resolved
-        self._scanner.parse_macros([os.path.realpath(f) for f in filenames])
-        self._scanner.set_macro_scan(False)
+        self._parse_macros([os.path.realpath(f) for f in filenames])
 
     def get_symbols(self):
-        for symbol in self._scanner.get_symbols():
+        if self._cachestore is not None:
+            symbols = self._get_unit()['symbols']
+        else:
+            if self._symbols is None:
+                self._symbols = _export_symbols(self._scanner)
+            symbols = self._symbols
+        for symbol in symbols:
             yield SourceSymbol(self._scanner, symbol)
 
     def get_comments(self):
-        return self._scanner.get_comments()
+        if self._cachestore is not None:
+            unit = self._get_unit()
+            return _CommentBuffer(self._source_comments + [unit['comments']])
+        return _CommentBuffer(self._source_comments + [self._scanner.export_comments()])
 
     def get_errors(self):
-        return self._scanner.get_errors()
+        if self._cachestore is not None:
+            unit = self._get_unit()
+            return self._source_errors + unit['errors']
+        return self._source_errors + self._scanner.get_errors()
 
     def dump(self):
         print('-' * 30)
@@ -288,9 +528,194 @@ class SourceScanner(object):
 
     # Private
 
-    def _parse(self, filenames):
+    def _get_unit(self):
+        if self._unit is None:
+            sources = [f for f in self._filenames
+                       if os.path.splitext(f)[1] in SOURCE_EXTS]
+            # The comments refer to the file by name, so it is part of the key
+            lexed = [self._cachestore.load(f, 'lexed:' + f) for f in sources]
+            missing = [f for f, entry in zip(sources, lexed) if entry is None]
+            missing_lexed, self._unit = self._lex_sources(missing, self._parse_unit)
+            missing_lexed = iter(missing_lexed)
+            self._source_comments = []
+            self._source_errors = []
+            for i, filename in enumerate(sources):
+                if lexed[i] is None:
+                    lexed[i] = next(missing_lexed)
+                    self._cachestore.store(filename, lexed[i], 'lexed:' + filename)
+                comments, errors = lexed[i]
+                self._source_comments.append(comments)
+                self._source_errors.extend(errors)
+        return self._unit
+
+    def _use_workers(self, sources):
+        return self._jobs > 1 and len(sources) >= _PARALLEL_MIN_SOURCES
+
+    def _lex_sources(self, filenames, parse):
+        """Lexes the source @filenames each on its own and calls @parse
+        meanwhile, returning the results of _lex_source() in the order of
+        @filenames and the result of @parse."""
+        pool = None
+        if self._use_workers(filenames):
+            pool = create_worker_pool(self._jobs)
+        if pool is None:
+            return [_lex_source(f) for f in filenames], parse()
+
+        with pool:
+            result = pool.map_async(_lex_source, filenames)
+            parsed = parse()
+            return result.get(), parsed
+
+    def _get_cpp_key(self):
+        """Returns a hash object covering everything the preprocessor
+        output depends on, besides the files it reads."""
+        key = hashlib.sha1()
+
+        def add(value):
+            key.update(value.encode('utf-8'))
+            key.update(b'\0')
+
+        add(os.getcwd())
+        add(self._compiler or '')
+        for name in _CPP_ENVIRON:
+            add(os.environ.get(name, ''))
+        for option in self._cpp_options:
+            add(option)
+        return key
+
+    def _get_preprocessed_key(self, headers):
+        key = self._get_cpp_key()
+        for filename in headers:
+            key.update(filename.encode('utf-8'))
+            key.update(b'\0')
+        return 'preprocessed:' + key.hexdigest()
+
+    def _get_unit_key(self, headers, contents):
+        """@contents maps the headers and the files whose macros are
+        scanned to their content."""
+        key = self._get_cpp_key()
+
+        def add(value):
+            key.update(value.encode('utf-8'))
+            key.update(b'\0')
+
+        for filename in self._filenames:
+            add(filename)
+        for filename in headers:
+            key.update(hashlib.sha1(contents[filename]).digest())
+        for filename in self._macro_filenames:
+            add(filename)
+            key.update(hashlib.sha1(_get_directive_lines(contents[filename])).digest())
+        return 'source-unit:' + key.hexdigest()
+
+    def _check_dependencies(self, dependencies):
+        for filename, mtime, size in dependencies:
+            try:
+                st = os.stat(filename)
+            except OSError:
+                return False
+            if (st.st_mtime_ns, st.st_size) != (mtime, size):
+                return False
+        return True
+
+    def _parse_unit(self):
+        """Parses the headers and macros of the scanned files, or loads
+        them from the cache."""
+        headers = [f for f in self._filenames
+                   if os.path.splitext(f)[1] not in SOURCE_EXTS]
+        # Read once, for the key and the macro scan
+        contents = {}
+        for filename in headers + self._macro_filenames:
+            if filename not in contents:
+                try:
+                    contents[filename] = _read_file(filename)
+                except OSError:
+                    contents = None
+                    break
+        key = None
+        if contents is not None:
+            key = self._get_unit_key(headers, contents)
+            unit = self._cachestore.load_key(key)
+            if unit is not None and self._check_dependencies(unit['dependencies']):
+                return unit
+
+        scanner = CSourceScanner()
+        for filename in self._filenames:
+            scanner.append_filename(filename)
+        dependencies = self._parse(headers, scanner=scanner)
+        if self._macro_filenames:
+            self._parse_macros(self._macro_filenames, scanner=scanner, contents=contents)
+
+        unit = {
+            'symbols': _export_symbols(scanner),
+            'comments': scanner.export_comments(),
+            'errors': scanner.get_errors(),
+            'dependencies': dependencies,
+        }
+        if key is not None and dependencies is not None:
+            self._cachestore.store_key(key, unit)
+        return unit
+
+    def _get_dependencies(self, data):
+        """Returns (filename, mtime, size) tuples of all the files
+        the preprocessed output @data was made of."""
+        filenames = set()
+        for match in _LINEMARKER_RE.finditer(data):
+            filenames.add(match.group(1).decode('utf-8', 'replace').replace('\\\\', '\\'))
+        dependencies = []
+        for filename in sorted(filenames):
+            try:
+                st = os.stat(filename)
+            except OSError:
+                # <built-in>, <command-line> and the like
+                continue
+            dependencies.append((os.path.abspath(filename), st.st_mtime_ns, st.st_size))
+        return dependencies
+
+    def _parse_macros(self, filenames, scanner=None, contents=None):
+        """Scans the macro definitions of @filenames.  The C scanner is
+        handed their content, taken from the dict @contents if they were
+        read already, so that every file is only read once."""
+        if scanner is None:
+            scanner = self._scanner
+        sources = []
+        for filename in filenames:
+            if contents is not None and filename in contents:
+                data = contents[filename]
+            else:
+                data = _read_file(filename)
+            sources.append((filename, data))
+        scanner.set_macro_scan(True)
+        try:
+            scanner.parse_macros(sources)
+        finally:
+            scanner.set_macro_scan(False)
+
+    def _parse(self, filenames, scanner=None):
+        """Preprocesses and parses the header @filenames.  When @scanner is
+        given it is used instead of our own C scanner, and the files the
+        preprocessed output was made of are returned."""
+        if scanner is None:
+            scanner = self._scanner
         if not filenames:
-            return
+            return []
+
+        # The preprocessor output is cached separately from the parsed
+        # unit, which also depends on the source files and the macros
+        key = None
+        if self._cachestore is not None:
+            key = self._get_preprocessed_key(filenames)
+            entry = self._cachestore.load_key(key)
+            if entry is not None and self._check_dependencies(entry['dependencies']):
+                tmp_fd, tmp_name = tempfile.mkstemp(prefix='g-ir-cpp-', suffix='.i',
+                                                    dir=os.getcwd())
+                with os.fdopen(tmp_fd, 'wb') as f:
+                    f.write(entry['data'])
+                try:
+                    scanner.parse_file(tmp_name)
+                finally:
+                    os.unlink(tmp_name)
+                return entry['dependencies']
 
         defines = ['__GI_SCANNER__']
         undefs = []
@@ -315,9 +740,18 @@ class SourceScanner(object):
 
         if not have_debug_flag('save-temps'):
             os.unlink(tmp_name_cpp)
-        self._scanner.parse_file(tmpfile_output)
+        dependencies = None
+        if scanner is not self._scanner or key is not None:
+            with open(tmpfile_output, 'rb') as f:
+                data = f.read()
+            dependencies = self._get_dependencies(data)
+            if key is not None:
+                self._cachestore.store_key(key, {'dependencies': dependencies,
+                                                 'data': data})
+        scanner.parse_file(tmpfile_output)
         if not have_debug_flag('save-temps'):
             os.unlink(tmpfile_output)
+        return dependencies
 
     def _write_preprocess_src(self, fp, defines, undefs, filenames):
         # Write to the temp file for feeding into the preprocessor
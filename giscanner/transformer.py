@@ -20,13 +20,14 @@
 
 import os
 import sys
-import subprocess
 
 from . import ast
 from . import message
 from . import utils
 from .cachestore import CacheStore
+from .filtercmd import FilterCommand
 from .girparser import GIRParser
+from .girserializer import dump_namespace, load_namespace
 from .sourcescanner import (
     SourceSymbol, ctype_name, CTYPE_POINTER,
     CTYPE_BASIC_TYPE, CTYPE_UNION, CTYPE_ARRAY, CTYPE_TYPEDEF,
@@ -41,12 +42,51 @@ class TransformerException(Exception):
     pass
 
 
+def _add_underscore(prefix):
+    if prefix.endswith('_'):
+        return prefix
+    return prefix + '_'
+
+
+class _PrefixTable(object):
+    """Maps the C prefixes of a list of namespaces to the namespaces
+using them.  Finding the namespaces a name may belong to then takes one
+dict lookup per distinct prefix length, instead of comparing the name
+with every prefix of every namespace."""
+
+    def __init__(self, namespaces, get_prefixes):
+        self.namespaces = namespaces
+        self.unprefixed = []    # Namespaces with no prefix
+        self._prefixes = {}     # <prefix -> [(namespace index, prefix index)]>
+        for i, ns in enumerate(namespaces):
+            prefixes = get_prefixes(ns)
+            if not prefixes:
+                self.unprefixed.append(ns)
+            for j, prefix in enumerate(prefixes):
+                self._prefixes.setdefault(prefix, []).append((i, j))
+        self._lengths = sorted(set(len(prefix) for prefix in self._prefixes))
+
+    def match(self, name):
+        """Returns a dict mapping the index of every namespace with a
+prefix of @name to the length of that prefix.  When several prefixes of
+a namespace match, the first one listed wins."""
+        found = {}
+        for length in self._lengths:
+            if length > len(name):
+                break
+            for i, j in self._prefixes.get(name[:length], ()):
+                if i not in found or j < found[i][0]:
+                    found[i] = (j, length)
+        return {i: length for i, (j, length) in found.items()}
+
+
 class Transformer(object):
     namespace = property(lambda self: self._namespace)
 
     def __init__(self, namespace, accept_unprefixed=False,
-                 identifier_filter_cmd=None, symbol_filter_cmd=None):
-        self._cachestore = CacheStore()
+                 identifier_filter_cmd=None, symbol_filter_cmd=None,
+                 persistent_filter_cmds=False):
+        self._cachestore = CacheStore(dump=dump_namespace, load=load_namespace)
         self._accept_unprefixed = accept_unprefixed
         self._namespace = namespace
         self._pkg_config_packages = set()
@@ -54,20 +94,39 @@ class Transformer(object):
         self._parsed_includes = {}  # <string namespace -> Namespace>
         self._includepaths = []
         self._passthrough_mode = False
-        self._identifier_filter_cmd = identifier_filter_cmd
-        self._symbol_filter_cmd = symbol_filter_cmd
+        self._identifier_filter = None
+        if identifier_filter_cmd:
+            self._identifier_filter = FilterCommand(identifier_filter_cmd,
+                                                    persistent=persistent_filter_cmds)
+        self._symbol_filter = None
+        if symbol_filter_cmd:
+            self._symbol_filter = FilterCommand(symbol_filter_cmd,
+                                                persistent=persistent_filter_cmds)
+        self._prefix_tables = None
+        self._split_cache = {}  # <(name, is_identifier) -> matches>
 
         # Cache a list of struct/unions in C's "tag namespace". This helps
         # manage various orderings of typedefs and structs. See:
         # https://bugzilla.gnome.org/show_bug.cgi?id=581525
         self._tag_ns = {}
 
+    def close_filters(self):
+        """Stops the persistent filter commands, if any."""
+        for cmd_filter in (self._identifier_filter, self._symbol_filter):
+            if cmd_filter is not None:
+                cmd_filter.close()
+
     def get_pkgconfig_packages(self):
         return self._pkg_config_packages
 
     def disable_cache(self):
         self._cachestore = None
 
+    def get_cache_stats(self):
+        if self._cachestore is None:
+            return None
+        return self._cachestore.get_stats()
+
     def set_passthrough_mode(self):
         self._passthrough_mode = True
 
@@ -211,32 +270,39 @@ None."""
         if extra_include_dirs is not None:
             self.set_include_paths(extra_include_dirs)
         self.set_passthrough_mode()
-        parser = self._parse_include(filename)
-        self._namespace = parser.get_namespace()
+        self._namespace = self._parse_include(filename)
         del self._parsed_includes[self._namespace.name]
+        self._invalidate_prefix_tables()
         return self
 
     def _parse_include(self, filename, uninstalled=False):
-        parser = None
+        # Types-only and full parses of the same file are cached separately
+        variant = 'full' if self._passthrough_mode else 'types'
+        namespace = None
         if self._cachestore is not None:
-            parser = self._cachestore.load(filename)
-        if parser is None:
+            namespace = self._cachestore.load(filename, variant)
+        if namespace is None:
             parser = GIRParser(types_only=not self._passthrough_mode)
-            parser.parse(filename)
+            if self._passthrough_mode:
+                parser.parse(filename)
+            else:
+                # Only the nodes the scanned namespace refers to are needed
+                parser.parse_lazy(filename)
+            namespace = parser.get_namespace()
             if self._cachestore is not None:
-                self._cachestore.store(filename, parser)
+                self._cachestore.store(filename, namespace, variant)
 
-        for include in parser.get_namespace().includes:
+        for include in namespace.includes:
             if include.name not in self._parsed_includes:
                 dep_filename = self._find_include(include)
                 self._parse_include(dep_filename)
 
         if not uninstalled:
-            for pkg in parser.get_namespace().exported_packages:
+            for pkg in namespace.exported_packages:
                 self._pkg_config_packages.add(pkg)
-        namespace = parser.get_namespace()
         self._parsed_includes[namespace.name] = namespace
-        return parser
+        self._invalidate_prefix_tables()
+        return namespace
 
     def _iter_namespaces(self):
         """Return an iterator over all included namespaces; the
@@ -245,60 +311,60 @@ currently-scanned namespace is first."""
         for ns in self._parsed_includes.values():
             yield ns
 
-    def _sort_matches(self, val):
-        """Key sort which ensures items in self._namespace are last by returning
-        a tuple key starting with 1 for self._namespace entries and 0 for
-        everythin else.
-        """
-        if val[0] == self._namespace:
-            return 1, val[2]
-        else:
-            return 0, val[2]
+    def _get_prefix_table(self, mode):
+        if self._prefix_tables is None:
+            namespaces = list(self._iter_namespaces())
+            self._prefix_tables = {
+                'identifier': _PrefixTable(
+                    namespaces, lambda ns: ns.identifier_prefixes),
+                'symbol': _PrefixTable(
+                    namespaces, lambda ns: [_add_underscore(p) for p in ns.symbol_prefixes]),
+                'ucase-symbol': _PrefixTable(
+                    namespaces, lambda ns: [_add_underscore(p) for p in ns._ucase_symbol_prefixes]),
+            }
+        return self._prefix_tables[mode]
+
+    def _invalidate_prefix_tables(self):
+        self._prefix_tables = None
+        self._split_cache = {}
 
     def _split_c_string_for_namespace_matches(self, name, is_identifier=False):
-        if not is_identifier and self._symbol_filter_cmd:
-            proc = subprocess.Popen(self._symbol_filter_cmd,
-                                    stdin=subprocess.PIPE,
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE)
-            proc_name, err = proc.communicate(name.encode())
-            proc_name = proc_name.strip()
-            if proc.returncode:
-                raise ValueError('filter: %r exited: %d with error: %s' %
-                                 (self._symbol_filter_cmd, proc.returncode, err))
-            name = proc_name.decode('ascii')
-            name = name.strip()
-
-        matches = []  # Namespaces which might contain this name
-        unprefixed_namespaces = []  # Namespaces with no prefix, last resort
-        for ns in self._iter_namespaces():
-            if is_identifier:
-                prefixes = ns.identifier_prefixes
-            elif name[0].isupper():
-                prefixes = ns._ucase_symbol_prefixes
-            else:
-                prefixes = ns.symbol_prefixes
-            if prefixes:
-                for prefix in prefixes:
-                    if (not is_identifier) and (not prefix.endswith('_')):
-                        prefix = prefix + '_'
-                    if name.startswith(prefix):
-                        matches.append((ns, name[len(prefix):], len(prefix)))
-                        break
-            else:
-                unprefixed_namespaces.append(ns)
-        if matches:
-            matches.sort(key=self._sort_matches)
-            return list(map(lambda x: (x[0], x[1]), matches))
+        if not is_identifier and self._symbol_filter is not None:
+            name = self._symbol_filter.filter(name)
+
+        key = (name, is_identifier)
+        matches = self._split_cache.get(key)
+        if matches is not None:
+            return list(matches)
+
+        if is_identifier:
+            mode = 'identifier'
+        elif name[0].isupper():
+            mode = 'ucase-symbol'
+        else:
+            mode = 'symbol'
+        table = self._get_prefix_table(mode)
+
+        # Namespaces which might contain this name; sort the current
+        # namespace last, then by prefix length, then in include order.
+        found = table.match(name)
+        if found:
+            order = sorted(found, key=lambda i: (i == 0, found[i], i))
+            matches = [(table.namespaces[i], name[found[i]:]) for i in order]
         elif self._accept_unprefixed:
-            return [(self._namespace, name)]
-        elif unprefixed_namespaces:
+            matches = [(self._namespace, name)]
+        else:
+            # Namespaces with no prefix, last resort.
             # A bit of a hack; this function ideally shouldn't look through the
             # contents of namespaces; but since we aren't scanning anything
-            # without a prefix, it's not too bad.
-            for ns in unprefixed_namespaces:
+            # without a prefix, it's not too bad.  The contents change as the
+            # scan goes on, so this isn't cached.
+            for ns in table.unprefixed:
                 if name in ns:
                     return [(ns, name)]
+        if matches is not None:
+            self._split_cache[key] = matches
+            return list(matches)
         raise ValueError("Unknown namespace for %s '%s'"
                          % ('identifier' if is_identifier else 'symbol', name, ))
 
@@ -322,16 +388,8 @@ raise ValueError."""
         return matches[-1]
 
     def strip_identifier(self, ident):
-        if self._identifier_filter_cmd:
-            proc = subprocess.Popen(self._identifier_filter_cmd,
-                                    stdin=subprocess.PIPE,
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE)
-            proc_ident, err = proc.communicate(ident.encode())
-            if proc.returncode:
-                raise ValueError('filter: %r exited: %d with error: %s' %
-                                 (self._identifier_filter_cmd, proc.returncode, err))
-            ident = proc_ident.decode('ascii').strip()
+        if self._identifier_filter is not None:
+            ident = self._identifier_filter.filter(ident)
 
         hidden = ident.startswith('_')
         if hidden:
@@ -727,9 +785,8 @@ raise ValueError."""
 
         fundamental = ast.type_names.get(base)
         if fundamental is not None:
-            return ast.Type(target_fundamental=fundamental.target_fundamental,
-                        ctype=ctype,
-                        is_const=is_const, complete_ctype=complete_ctype)
+            return ast.get_shared_type(fundamental.target_fundamental, ctype=ctype,
+                                       is_const=is_const, complete_ctype=complete_ctype)
         container = self._create_bare_container_type(base, ctype=ctype, is_const=is_const,
                                                      complete_ctype=complete_ctype)
         if container:
@@ -954,6 +1011,7 @@ Note that type resolution may not succeed."""
         self.resolve_type(typeval)
         if typeval.resolved:
             # Explicitly clear out the c_type; there isn't one in this case.
+            typeval = typeval.unshared()
             typeval.ctype = None
         return typeval
 
@@ -989,7 +1047,7 @@ Note that type resolution may not succeed."""
     def _resolve_type_from_gtype_name(self, typeval):
         assert typeval.gtype_name is not None
         for ns in self._iter_namespaces():
-            node = ns.type_names.get(typeval.gtype_name, None)
+            node = ns.get_by_gtype_name(typeval.gtype_name)
             if node is not None:
                 typeval.target_giname = '%s.%s' % (ns.name, node.name)
                 return True
@@ -18,6 +18,8 @@
 # Boston, MA 02111-1307, USA.
 #
 
+import hashlib
+import multiprocessing
 import re
 import os
 import subprocess
@@ -164,6 +166,25 @@ def files_are_identical(path1, path2):
         return buf1 == buf2
 
 
+class DigestFile(object):
+    """Write-only binary file object computing the SHA-256 digest of the
+    data written to it, which is passed on to the file object @f if
+    given."""
+
+    def __init__(self, f=None):
+        self._f = f
+        self._hash = hashlib.sha256()
+
+    def write(self, data):
+        self._hash.update(data)
+        if self._f is not None:
+            self._f.write(data)
+        return len(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
 def cflag_real_include_path(cflag):
     if not cflag.startswith("-I"):
         return cflag
@@ -303,6 +324,21 @@ def rmtree(*args, **kwargs):
             return
 
 
+def create_worker_pool(jobs):
+    '''
+    Returns a multiprocessing pool of @jobs forked worker processes, or None
+    if processes can't be forked on this platform.
+
+    The other start methods import the main module again in every worker, and
+    the main modules of the tools have no ``__main__`` guard, so they would
+    start the whole tool again.
+    '''
+
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return None
+    return multiprocessing.get_context('fork').Pool(jobs)
+
+
 class Singleton(type):
     '''
     A helper class to be used as metaclass to implement a singleton.
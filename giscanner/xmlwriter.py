@@ -18,48 +18,34 @@
 # Boston, MA 02111-1307, USA.
 #
 
+import re
 from io import StringIO
 from contextlib import contextmanager
 from xml.sax.saxutils import escape, quoteattr
 
+# Characters which quoteattr() would replace or which affect its choice
+# of quotes; values without any of them can be quoted directly.
+_ATTR_SPECIAL_RE = re.compile('[&<>"\n\r\t]')
 
-def _calc_attrs_length(attributes, indent, self_indent):
-    if indent == -1:
-        return -1
-    attr_length = 0
-    for attr, value in attributes:
-        # FIXME: actually, if we have attributes with None as value this
-        # should be considered a bug and raise an error. We are just
-        # ignoring them here while we fix GIRParser to create the right
-        # ast with the correct attributes.
-        if value is None:
-            continue
-        attr_length += 2 + len(attr) + len(quoteattr(value))
-    return attr_length + indent + self_indent
+
+def _quoteattr(value):
+    if _ATTR_SPECIAL_RE.search(value) is None:
+        return '"' + value + '"'
+    return quoteattr(value)
 
 
 def collect_attributes(tag_name, attributes, self_indent, self_indent_char, indent=-1):
     if not attributes:
         return ''
-    if _calc_attrs_length(attributes, indent, self_indent) > 79:
-        indent_len = self_indent + len(tag_name) + 1
-    else:
-        indent_len = 0
-    first = True
-    attr_value = ''
-    for attr, value in attributes:
-        # FIXME: actually, if we have attributes with None as value this
-        # should be considered a bug and raise an error. We are just
-        # ignoring them here while we fix GIRParser to create the right
-        # ast with the correct attributes.
-        if value is None:
-            continue
-        if indent_len and not first:
-            attr_value += '\n%s' % (self_indent_char * indent_len)
-        attr_value += ' %s=%s' % (attr, quoteattr(value))
-        if first:
-            first = False
-    return attr_value
+    # FIXME: actually, if we have attributes with None as value this
+    # should be considered a bug and raise an error. We are just
+    # ignoring them here while we fix GIRParser to create the right
+    # ast with the correct attributes.
+    attrs = [' ' + attr + '=' + _quoteattr(value)
+             for attr, value in attributes if value is not None]
+    if indent != -1 and sum(map(len, attrs)) + indent + self_indent > 79:
+        return ('\n' + self_indent_char * (self_indent + len(tag_name) + 1)).join(attrs)
+    return ''.join(attrs)
 
 
 def build_xml_tag(tag_name, attributes=None, data=None, self_indent=0,
@@ -81,14 +67,44 @@ def build_xml_tag(tag_name, attributes=None, data=None, self_indent=0,
     return prefix + attrs + suffix
 
 
+class _EncodedOutput(object):
+    """Text stream encoding what is written to it as utf-8 and passing
+    it on to the binary file object @output in blocks of about
+    @block_size characters."""
+
+    def __init__(self, output, block_size=64 * 1024):
+        self._output = output
+        self._block_size = block_size
+        self._pending = []
+        self._pending_size = 0
+
+    def write(self, text):
+        self._pending.append(text)
+        self._pending_size += len(text)
+        if self._pending_size >= self._block_size:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self._output.write(''.join(self._pending).encode('utf-8'))
+            self._pending = []
+            self._pending_size = 0
+
+
 class XMLWriter(object):
 
-    def __init__(self):
+    def __init__(self, output=None):
         # Build up the XML buffer as unicode strings. When writing to disk,
         # we can assume the lack of a Byte Order Mark (BOM) and lack
         # of an "encoding" xml property means utf-8.
         # See: http://www.opentag.com/xfaq_enc.htm#enc_default
-        self._data = StringIO()
+        # If the binary file object @output is given, the XML is written
+        # to it as it is generated instead; flush() must be called once
+        # the document is complete.
+        if output is None:
+            self._data = StringIO()
+        else:
+            self._data = _EncodedOutput(output)
         self._data.write('<?xml version="1.0" encoding="utf-8"?>\n')
         self._tag_stack = []
         self._indent = 0
@@ -97,25 +113,42 @@ class XMLWriter(object):
 
     # Private
 
+    def _get_indent_string(self):
+        # Indentation strings are cached per level
+        try:
+            return self._indent_strings[self._indent]
+        except IndexError:
+            for indent in range(len(self._indent_strings), self._indent + 1):
+                self._indent_strings.append(self._indent_char * indent)
+            return self._indent_strings[self._indent]
+
     def _open_tag(self, tag_name, attributes=None):
         if attributes is None:
             attributes = []
         attrs = collect_attributes(tag_name, attributes,
                                    self._indent, self._indent_char, len(tag_name) + 2)
-        self.write_line('<%s%s>' % (tag_name, attrs))
+        self.write_line('<' + tag_name + attrs + '>')
 
     def _close_tag(self, tag_name):
-        self.write_line('</%s>' % (tag_name, ))
+        self.write_line('</' + tag_name + '>')
 
     # Public API
 
     def enable_whitespace(self):
         self._indent_char = ' '
         self._newline_char = '\n'
+        self._indent_strings = []
 
     def disable_whitespace(self):
         self._indent_char = ''
         self._newline_char = ''
+        self._indent_strings = []
+
+    def flush(self):
+        """Writes out the XML still buffered when streaming to an
+        output file."""
+        if isinstance(self._data, _EncodedOutput):
+            self._data.flush()
 
     def get_xml(self):
         """Returns a unicode string containing the XML."""
@@ -132,11 +165,9 @@ class XMLWriter(object):
         if do_escape:
             line = escape(line)
         if indent:
-            self._data.write('%s%s%s' % (self._indent_char * self._indent,
-                                         line,
-                                         self._newline_char))
+            self._data.write(self._get_indent_string() + line + self._newline_char)
         else:
-            self._data.write('%s%s' % (line, self._newline_char))
+            self._data.write(line + self._newline_char)
 
     def write_comment(self, text):
         self.write_line('<!-- %s -->' % (text, ))
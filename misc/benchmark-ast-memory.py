@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# Measures the memory used by the AST when loading a GIR file together
+# with all the GIR files it includes, as the scanner does for Gtk-4.0.
+#
+# Run from a build directory so that giscanner can be imported, e.g.:
+#   PYTHONPATH=. python3 ../misc/benchmark-ast-memory.py \
+#       /usr/share/gir-1.0/Gtk-4.0.gir
+#
+# Includes are looked up next to the GIR file and in the --includedir
+# directories.  Every file is loaded in a separate process, so that the
+# peak RSS isn't affected by earlier runs.
+
+import argparse
+import collections
+import gc
+import os
+import resource
+import sys
+import tracemalloc
+
+from giscanner.girparser import GIRParser
+
+
+def find_include(include, dirs):
+    for d in dirs:
+        path = os.path.join(d, '%s-%s.gir' % (include.name, include.version))
+        if os.path.exists(path):
+            return path
+    print('warning: could not find GIR file for %s, skipping' % (include, ),
+          file=sys.stderr)
+    return None
+
+
+def load_all(filename, dirs):
+    namespaces = []
+    pending = [filename]
+    seen = set()
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        parser = GIRParser()
+        parser.parse(path)
+        namespace = parser.get_namespace()
+        namespaces.append(namespace)
+        for include in namespace.includes:
+            path = find_include(include, dirs)
+            if path is not None:
+                pending.append(path)
+    return namespaces
+
+
+def count_objects():
+    counts = collections.Counter()
+    for obj in gc.get_objects():
+        module = type(obj).__module__
+        if module == 'giscanner.ast':
+            counts[type(obj).__name__] += 1
+    return counts
+
+
+def benchmark(filename, dirs, top):
+    tracemalloc.start()
+    namespaces = load_all(filename, dirs)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    counts = count_objects()
+    print('%s (%d namespaces, %d AST objects)' % (
+        os.path.basename(filename), len(namespaces), sum(counts.values())))
+    print('  traced:   %8.2f MB (peak %8.2f MB)' % (current / 1e6, peak / 1e6))
+    print('  max RSS:  %8.2f MB' % (maxrss / 1e3, ))
+    for name, count in counts.most_common(top):
+        print('  %-20s %8d' % (name, count))
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Benchmark AST memory usage')
+    parser.add_argument('girs', nargs='+', metavar='GIRFILE')
+    parser.add_argument('--includedir', action='append', default=[],
+                        help='directory to look up included GIR files in')
+    parser.add_argument('--top', type=int, default=10,
+                        help='number of AST classes to list object counts for')
+    options = parser.parse_args(args)
+    for filename in options.girs:
+        pid = os.fork()
+        if pid == 0:
+            dirs = [os.path.dirname(os.path.abspath(filename))] + options.includedir
+            benchmark(filename, dirs, options.top)
+            sys.stdout.flush()
+            os._exit(0)
+        os.waitpid(pid, 0)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# Measures the time needed to write GIR files with GIRWriter, either
+# building the document in memory or streaming it to a file object.
+#
+# Run from a build directory so that giscanner can be imported, e.g.:
+#   PYTHONPATH=. python3 ../misc/benchmark-girwriter.py \
+#       ../tests/scanner/Regress-1.0-expected.gir /usr/share/gir-1.0/Gtk-3.0.gir
+#
+# --scale writes every namespace several times in a row, to approximate
+# namespaces of the size of Gtk when only small GIR files are at hand.
+
+import argparse
+import sys
+import time
+
+from giscanner.girparser import GIRParser
+from giscanner.girwriter import GIRWriter
+from giscanner.utils import DigestFile
+
+
+def best_of(func, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def benchmark(filename, repeat, scale):
+    parser = GIRParser()
+    parser.parse(filename)
+    namespace = parser.get_namespace()
+    size = len(GIRWriter(namespace).get_encoded_xml()) * scale
+
+    def write_memory():
+        for i in range(scale):
+            GIRWriter(namespace).get_encoded_xml()
+
+    def write_stream():
+        output = DigestFile()
+        for i in range(scale):
+            GIRWriter(namespace, output=output)
+
+    print('%s (%d nodes, x%d, %d bytes)' % (namespace.name, len(namespace.names), scale, size))
+    for label, func in [('memory', write_memory), ('stream', write_stream)]:
+        elapsed = best_of(func, repeat)
+        print('  %-8s %8.2f ms  %8.2f MB/s' % (label + ':', elapsed * 1000,
+                                              size / elapsed / 1e6))
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Benchmark GIR writing')
+    parser.add_argument('girs', nargs='+', metavar='GIRFILE')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--scale', type=int, default=1,
+                        help='number of times every namespace is written')
+    options = parser.parse_args(args)
+    for filename in options.girs:
+        benchmark(filename, options.repeat, options.scale)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
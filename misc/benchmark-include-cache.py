@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# Compares the time needed to load included GIR files from the scanner
+# cache using pickle against the lazy namespace serialization.
+#
+# Run from a build directory so that giscanner can be imported, e.g.:
+#   PYTHONPATH=. python3 ../misc/benchmark-include-cache.py \
+#       /usr/share/gir-1.0/Gio-2.0.gir /usr/share/gir-1.0/GObject-2.0.gir
+
+import argparse
+import io
+import pickle
+import sys
+import time
+
+from giscanner.girparser import GIRParser
+from giscanner.girserializer import dump_namespace, load_namespace
+
+
+def best_of(func, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def benchmark(filename, repeat, lookups):
+    parser = GIRParser(types_only=True)
+    parser.parse(filename)
+    namespace = parser.get_namespace()
+    names = list(namespace)[:lookups]
+
+    pickled = pickle.dumps(parser)
+    f = io.BytesIO()
+    dump_namespace(namespace, f)
+    serialized = f.getvalue()
+
+    def load_pickle():
+        ns = pickle.loads(pickled).get_namespace()
+        for name in names:
+            ns.get(name)
+
+    def load_lazy():
+        ns = load_namespace(io.BytesIO(serialized))
+        for name in names:
+            ns.get(name)
+
+    def load_lazy_all():
+        load_namespace(io.BytesIO(serialized)).values()
+
+    print('%s (%d nodes, %d looked up)' % (namespace.name, len(namespace.names), len(names)))
+    print('  pickle:        %8d bytes  %8.2f ms' % (len(pickled), best_of(load_pickle, repeat) * 1000))
+    print('  lazy:          %8d bytes  %8.2f ms' % (len(serialized), best_of(load_lazy, repeat) * 1000))
+    print('  lazy, all:     %8s        %8.2f ms' % ('', best_of(load_lazy_all, repeat) * 1000))
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Benchmark include cache loading')
+    parser.add_argument('girs', nargs='+', metavar='GIRFILE')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--lookups', type=int, default=20,
+                        help='number of nodes looked up after loading')
+    options = parser.parse_args(args)
+    for filename in options.girs:
+        benchmark(filename, options.repeat, options.lookups)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
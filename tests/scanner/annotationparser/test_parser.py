@@ -28,7 +28,11 @@ Tests ensuring annotationparser.py continues to function correctly.
 import difflib
 import os
 import subprocess
+import sys
+import tempfile
+import textwrap
 import unittest
+import unittest.mock
 import xml.etree.ElementTree as etree
 
 from giscanner.annotationparser import GtkDocCommentBlockParser, GtkDocCommentBlockWriter
@@ -379,6 +383,144 @@ class TestCommentBlock(unittest.TestCase):
         return retval
 
 
+def get_test_comments():
+    tests_dir = os.path.dirname(os.path.abspath(__file__))
+    comments = []
+    for dirpath, dirnames, filenames in sorted(os.walk(tests_dir)):
+        for filename in sorted(filenames):
+            if filename.endswith('.xml'):
+                tests_file = os.path.join(dirpath, filename)
+                tests_tree = etree.parse(tests_file).getroot()
+                for lineno, element in enumerate(tests_tree.findall(ns('{}test/{}input'))):
+                    comments.append((element.text, tests_file, lineno + 1))
+    return comments
+
+
+class TestParallelParsing(unittest.TestCase):
+    def test_same_as_serial(self):
+        comments = get_test_comments()
+        # Document every identifier twice, to check the duplicate warnings too
+        comments += comments
+
+        logger = MessageLogger.get()
+        old_output = logger._output
+        results = []
+        try:
+            for jobs in [1, 3]:
+                logger._output = ChunkedIO()
+                blocks = GtkDocCommentBlockParser().parse_comment_blocks(comments, jobs=jobs)
+                writer = GtkDocCommentBlockWriter()
+                results.append((list(blocks.keys()),
+                                [writer.write(block) for block in blocks.values()],
+                                [block.position for block in blocks.values()],
+                                logger._output.getvalue()))
+        finally:
+            logger._output = old_output
+
+        self.assertTrue(results[0][3])
+        self.assertEqual(results[0], results[1])
+
+    def test_unguarded_main_module(self):
+        # Like the tools, the script has no __main__ guard, so worker processes which
+        # are not forked would run it again
+        script = textwrap.dedent('''
+            import multiprocessing
+            from giscanner.annotationparser import GtkDocCommentBlockParser
+
+            multiprocessing.set_start_method('spawn')
+            comments = [('/**\\n * func%d:\\n *\\n * Docs.\\n */' % i, 'func.c', 1)
+                        for i in range(400)]
+            blocks = GtkDocCommentBlockParser().parse_comment_blocks(comments, jobs=3)
+            print(len(blocks))
+            ''')
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'tool.py')
+            with open(filename, 'w') as f:
+                f.write(script)
+            output = subprocess.check_output([sys.executable, filename], env=env,
+                                             stderr=subprocess.STDOUT, timeout=60)
+        self.assertEqual(output.strip(), b'400')
+
+    def test_worker_pool(self):
+        comments = get_test_comments()
+        parser = GtkDocCommentBlockParser()
+        self.assertIsNone(parser.create_worker_pool(comments, 1))
+        self.assertIsNone(parser.create_worker_pool(comments[:10], 3))
+        pool = parser.create_worker_pool(comments, 3)
+        self.assertIsNotNone(pool)
+        blocks = parser.parse_comment_blocks(comments, jobs=3, pool=pool)
+        self.assertEqual(list(blocks.keys()),
+                         list(parser.parse_comment_blocks(comments).keys()))
+
+    def test_no_fork(self):
+        comments = get_test_comments()
+        parser = GtkDocCommentBlockParser()
+        with unittest.mock.patch('giscanner.annotationparser.create_worker_pool',
+                                 return_value=None) as create_worker_pool:
+            blocks = parser.parse_comment_blocks(comments, jobs=3)
+        create_worker_pool.assert_called_once_with(3)
+        self.assertEqual(list(blocks.keys()),
+                         list(parser.parse_comment_blocks(comments).keys()))
+
+
+class TestCommentBlockIndex(unittest.TestCase):
+    def test_same_as_parsed(self):
+        comments = get_test_comments()
+        # The last of the comment blocks documenting an identifier wins
+        comments += comments[::2]
+
+        logger = MessageLogger.get()
+        old_output = logger._output
+        try:
+            logger._output = ChunkedIO()
+            parser = GtkDocCommentBlockParser()
+            blocks = parser.parse_comment_blocks(comments)
+            index = parser.index_comment_blocks(comments)
+        finally:
+            logger._output = old_output
+
+        writer = GtkDocCommentBlockWriter()
+        self.assertLessEqual(set(blocks), set(index))
+        for name in index:
+            if name not in blocks:
+                self.assertNotIn(name, index)
+                continue
+            self.assertEqual(writer.write(index[name]), writer.write(blocks[name]))
+            self.assertEqual(index[name].position, blocks[name].position)
+
+    def test_lazy(self):
+        comments = [('/**\n * foo:\n * @bar: a bar\n */', 'foo.c', 1),
+                    ('/**\n * SECTION:foo\n * @title: Foo\n */', 'foo.c', 10)]
+        parser = GtkDocCommentBlockParser()
+        with unittest.mock.patch.object(parser, 'parse_comment_block',
+                                        wraps=parser.parse_comment_block) as parse:
+            index = parser.index_comment_blocks(comments)
+            self.assertEqual(index.names(), ['foo', 'SECTION:foo'])
+            # Sections are parsed right away
+            self.assertEqual(parse.call_count, 1)
+            self.assertEqual(index['foo'].params['bar'].description, 'a bar')
+            self.assertEqual(index.get('foo').name, 'foo')
+            self.assertEqual(parse.call_count, 2)
+            self.assertEqual(list(index), ['foo', 'SECTION:foo'])
+            self.assertEqual(parse.call_count, 2)
+
+    def test_unparsable(self):
+        comments = [('/**\n * foo:\n */', 'foo.c', 1),
+                    ('/**\n * bar:\n */', 'foo.c', 5),
+                    ('/**\n * SECTION:foo\n */', 'foo.c', 10)]
+        parser = GtkDocCommentBlockParser()
+        with unittest.mock.patch.object(parser, '_report_parse_error'):
+            index = parser.index_comment_blocks(comments)
+            with unittest.mock.patch.object(parser, 'parse_comment_block',
+                                            side_effect=ValueError('broken')):
+                self.assertEqual(index.names(), ['foo', 'bar', 'SECTION:foo'])
+                self.assertNotIn('foo', index)
+                self.assertEqual(index.names(), ['bar', 'SECTION:foo'])
+                self.assertEqual(list(index.items()), [('SECTION:foo', index['SECTION:foo'])])
+                self.assertEqual(len(index), 1)
+
+
 def create_test_case(logger, tests_dir, tests_file):
     tests_tree = etree.parse(tests_file).getroot()
 
@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from giscanner.cachestore import CacheStore
+
+
+class TestCacheStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        env = {'XDG_CACHE_HOME': os.path.join(self.tmpdir, 'cache')}
+        patcher = mock.patch.dict(os.environ, env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        os.environ.pop('GI_SCANNER_DISABLE_CACHE', None)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, content):
+        filename = os.path.join(self.tmpdir, name)
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return filename
+
+    def _entries(self, store):
+        return [f for f in os.listdir(store._directory)
+                if not f.startswith('.')]
+
+    def test_store_load(self):
+        filename = self._write('Foo-1.0.gir', '<repository/>')
+        store = CacheStore()
+        self.assertIsNone(store.load(filename))
+        store.store(filename, {'foo': 42})
+        self.assertEqual(store.load(filename), {'foo': 42})
+
+        # A separate process sees the same entry
+        other = CacheStore()
+        self.assertEqual(other.load(filename), {'foo': 42})
+        self.assertEqual(store.get_stats(),
+                         {'hits': 1, 'misses': 1, 'stores': 1, 'evictions': 0})
+
+    def test_keyed_by_content(self):
+        first = self._write('Foo-1.0.gir', '<repository/>')
+        second = self._write('Bar-1.0.gir', '<repository/>')
+        store = CacheStore()
+        store.store(first, 'parsed')
+        # Identical content shares the entry
+        self.assertEqual(store.load(second), 'parsed')
+
+        with open(first, 'a', encoding='utf-8') as f:
+            f.write('\n')
+        self.assertIsNone(CacheStore().load(first))
+
+    def test_store_load_key(self):
+        first = self._write('foo.h', 'int foo;')
+        second = self._write('bar.h', 'int foo;')
+        store = CacheStore()
+        self.assertEqual(store.get_digest(first), store.get_digest(second))
+        self.assertIsNone(store.get_digest(os.path.join(self.tmpdir, 'missing.h')))
+
+        key = 'unit:' + store.get_digest(first)
+        self.assertIsNone(store.load_key(key))
+        store.store_key(key, ['foo'])
+        self.assertEqual(CacheStore().load_key(key), ['foo'])
+        # Keys don't collide with the entries of files
+        self.assertIsNone(store.load(first))
+
+    def test_existing_entry_is_kept(self):
+        filename = self._write('Foo-1.0.gir', '<repository/>')
+        store = CacheStore()
+        store.store(filename, 'first')
+        store.store(filename, 'second')
+        self.assertEqual(store.load(filename), 'first')
+        self.assertEqual(len(self._entries(store)), 1)
+
+    def test_broken_entry(self):
+        filename = self._write('Foo-1.0.gir', '<repository/>')
+        store = CacheStore()
+        store.store(filename, 'parsed')
+        entry = store._get_filename(filename)
+        with open(entry, 'wb') as f:
+            f.write(b'garbage')
+        self.assertIsNone(store.load(filename))
+        self.assertFalse(os.path.exists(entry))
+
+    def test_lru_eviction(self):
+        store = CacheStore(max_size=300)
+        first = self._write('Foo-1.0.gir', 'foo')
+        second = self._write('Bar-1.0.gir', 'bar')
+        store.store(first, 'x' * 100)
+        os.utime(store._get_filename(first), (0, 0))
+        store.store(second, 'y' * 100)
+        self.assertEqual(len(self._entries(store)), 2)
+
+        # Using the first entry makes the second one the oldest
+        self.assertIsNotNone(store.load(first))
+        os.utime(store._get_filename(second), (0, 0))
+        third = self._write('Baz-1.0.gir', 'baz')
+        store.store(third, 'z' * 150)
+
+        self.assertIsNotNone(store.load(first))
+        self.assertIsNone(store.load(second))
+        self.assertIsNotNone(store.load(third))
+        self.assertEqual(store.evictions, 1)
+
+    def test_eviction_scans(self):
+        store = CacheStore(max_size=300)
+        filenames = [self._write('Foo-%d.gir' % (i, ), str(i)) for i in range(3)]
+        with mock.patch('os.listdir', wraps=os.listdir) as listdir:
+            store.store(filenames[0], 'x' * 100)
+            store.store(filenames[1], 'y' * 10)
+            self.assertEqual(listdir.call_count, 1)
+            # Only scanned again once the stored entries exceed the limit
+            store.store(filenames[2], 'z' * 200)
+            self.assertEqual(listdir.call_count, 2)
+        self.assertEqual(store.evictions, 1)
+
+    def test_disabled(self):
+        filename = self._write('Foo-1.0.gir', '<repository/>')
+        with mock.patch.dict(os.environ, {'GI_SCANNER_DISABLE_CACHE': '1'}):
+            store = CacheStore()
+        store.store(filename, 'parsed')
+        self.assertIsNone(store.load(filename))
+
+
+if __name__ == '__main__':
+    unittest.main()
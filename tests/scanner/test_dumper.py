@@ -0,0 +1,210 @@
+import concurrent.futures
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from distutils.errors import DistutilsExecError
+
+from giscanner.dumper import (DumpCache, DumpCompiler, find_library, _BinaryFuture,
+                              _CapturedOutput)
+
+
+class Options(object):
+
+    def __init__(self, **kwargs):
+        self.packages = []
+        self.libraries = []
+        self.extra_libraries = []
+        self.library_paths = []
+        self.cflags = []
+        self.cpp_includes = []
+        self.init_sections = []
+        self.nolibtool = True
+        self.libtool_path = None
+        self.quiet = True
+        self.program = None
+        self.__dict__.update(kwargs)
+
+
+class CacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        env = {'XDG_CACHE_HOME': os.path.join(self.tmpdir, 'cache')}
+        patcher = mock.patch.dict(os.environ, env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        os.environ.pop('GI_SCANNER_DISABLE_CACHE', None)
+        os.environ.pop('MSYSTEM', None)
+
+        self.libdir = os.path.join(self.tmpdir, 'lib')
+        os.mkdir(self.libdir)
+        self._write_library('first build')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write_library(self, content):
+        with open(os.path.join(self.libdir, 'libfoo.so'), 'w') as f:
+            f.write(content)
+
+
+class TestDumpCache(CacheTestCase):
+
+    def _link_args(self, tmpdir, library='foo'):
+        return ['cc', '-o', os.path.join(tmpdir, 'Foo-1.0'),
+                os.path.join(tmpdir, 'Foo-1.0.o'),
+                '-L' + self.libdir, '-l' + library]
+
+    def _create_compiler(self, **kwargs):
+        kwargs.setdefault('libraries', ['foo'])
+        kwargs.setdefault('incremental', True)
+        options = Options(library_paths=[self.libdir], **kwargs)
+        return DumpCompiler(options, [], [])
+
+    def test_link_key(self):
+        dc = self._create_compiler()
+        key = dc._get_link_key('object', self._link_args('/tmp/a'), '/tmp/a')
+        self.assertIsNotNone(key)
+        # The temporary directory differs between runs
+        self.assertEqual(dc._get_link_key('object', self._link_args('/tmp/b'), '/tmp/b'),
+                         key)
+        self.assertNotEqual(dc._get_link_key('other', self._link_args('/tmp/a'), '/tmp/a'),
+                            key)
+
+    def test_link_key_library_rebuilt(self):
+        dc = self._create_compiler()
+        key = dc._get_link_key('object', self._link_args('/tmp/a'), '/tmp/a')
+        self._write_library('second build, with a different size')
+        self.assertNotEqual(dc._get_link_key('object', self._link_args('/tmp/a'), '/tmp/a'),
+                            key)
+
+    def test_link_key_library_not_found(self):
+        dc = self._create_compiler(libraries=['bar'])
+        self.assertIsNone(dc._get_link_key('object', self._link_args('/tmp/a', 'bar'), '/tmp/a'))
+
+    def test_load_store(self):
+        dc = self._create_compiler()
+        filename = os.path.join(self.tmpdir, 'Foo-1.0')
+        with open(filename, 'wb') as f:
+            f.write(b'\x7fELF')
+        os.chmod(filename, 0o755)
+        self.assertIsNone(dc._load_cached('key', filename))
+        dc._store_cached('key', filename, [])
+
+        os.unlink(filename)
+        self.assertEqual(self._create_compiler()._load_cached('key', filename), [])
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), b'\x7fELF')
+        self.assertTrue(os.access(filename, os.X_OK))
+
+    def test_dependencies(self):
+        dc = self._create_compiler()
+        tmpdir = os.path.join(self.tmpdir, 'tmp-introspect')
+        os.mkdir(tmpdir)
+        header = os.path.join(self.tmpdir, 'foo bar.h')
+        with open(header, 'w') as f:
+            f.write('first build')
+        depfile = os.path.join(tmpdir, 'Foo-1.0.d')
+        with open(depfile, 'w') as f:
+            f.write('%s/Foo-1.0.o: %s/Foo-1.0.c \\\n %s\n' % (
+                tmpdir, tmpdir, header.replace(' ', '\\ ')))
+        dependencies = dc._get_dependencies(depfile, tmpdir)
+        self.assertEqual([filename for filename, digest in dependencies], [header])
+
+        filename = os.path.join(tmpdir, 'Foo-1.0.o')
+        with open(filename, 'wb') as f:
+            f.write(b'object')
+        dc._store_cached('key', filename, dependencies)
+        self.assertEqual(self._create_compiler()._load_cached('key', filename), dependencies)
+        with open(header, 'w') as f:
+            f.write('second build, with a different size')
+        self.assertIsNone(self._create_compiler()._load_cached('key', filename))
+
+    def test_disabled(self):
+        c_path = os.path.join(self.tmpdir, 'Foo-1.0.c')
+        with open(c_path, 'w') as f:
+            f.write('int main (void) { return 0; }\n')
+        dc = self._create_compiler(incremental=False)
+        self.assertIsNone(dc._get_compile_key(c_path))
+        dc = self._create_compiler(init_sections=['foo_init ();'])
+        self.assertIsNone(dc._get_compile_key(c_path))
+        dc = self._create_compiler(nolibtool=False, libtool_path='libtool')
+        self.assertIsNone(dc._get_compile_key(c_path))
+
+
+class TestCapturedOutput(unittest.TestCase):
+
+    @unittest.skipIf(sys.platform == 'win32', 'uses sh')
+    def test_held_back(self):
+        output = _CapturedOutput()
+        dc = DumpCompiler(Options(), [], [], output=output)
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        with mock.patch('sys.stdout', stdout), mock.patch('sys.stderr', stderr):
+            dc._compiler.compiler.spawn(['sh', '-c', 'echo out; echo err >&2'])
+            self.assertRaises(DistutilsExecError, dc._compiler.compiler.spawn,
+                              ['sh', '-c', 'exit 1'])
+            self.assertEqual((stdout.getvalue(), stderr.getvalue()), ('', ''))
+
+            future = concurrent.futures.Future()
+            future.set_exception(ValueError())
+            self.assertRaises(ValueError, _BinaryFuture(future, output).result)
+        self.assertEqual((stdout.getvalue(), stderr.getvalue()), ('out\n', 'err\n'))
+
+
+class TestDumpResultCache(CacheTestCase):
+
+    def _create_cache(self, get_type_functions=['foo_object_get_type'], **kwargs):
+        kwargs.setdefault('libraries', ['foo'])
+        options = Options(library_paths=[self.libdir], **kwargs)
+        return DumpCache(options, get_type_functions, ['foo_error_quark'])
+
+    def test_store_load(self):
+        cache = self._create_cache()
+        self.assertIsNone(cache.load())
+        cache.store(['libfoo.so.0'], b'<dump/>', [])
+        self.assertEqual(self._create_cache().load(), (['libfoo.so.0'], b'<dump/>'))
+
+    def test_invalidation(self):
+        self._create_cache().store(['libfoo.so.0'], b'<dump/>', [])
+        self.assertIsNone(self._create_cache(['foo_other_get_type']).load())
+        self._write_library('second build, with a different size')
+        self.assertIsNone(self._create_cache().load())
+
+    def test_dependency_changed(self):
+        dependency = os.path.join(self.tmpdir, 'libbar.so.0')
+        with open(dependency, 'w') as f:
+            f.write('first build')
+        self._create_cache().store(['libfoo.so.0'], b'<dump/>', [dependency])
+        self.assertEqual(self._create_cache().load(), (['libfoo.so.0'], b'<dump/>'))
+        with open(dependency, 'w') as f:
+            f.write('second build, with a different size')
+        self.assertIsNone(self._create_cache().load())
+
+    def test_not_cached(self):
+        for cache in [self._create_cache(libraries=['bar']),
+                      self._create_cache(program='./foo-dumper')]:
+            cache.store(['libfoo.so.0'], b'<dump/>', [])
+            self.assertIsNone(cache.load())
+        cache = self._create_cache()
+        cache.store(['libfoo.so.0'], b'<dump/>', None)
+        self.assertIsNone(cache.load())
+
+    def test_find_libtool_library(self):
+        la_file = os.path.join(self.libdir, 'libfoo.la')
+        with open(la_file, 'w') as f:
+            f.write("dlname='libfoo.so.0'\n")
+        self.assertIsNone(find_library(la_file, []))
+        os.mkdir(os.path.join(self.libdir, '.libs'))
+        shlib = os.path.join(self.libdir, '.libs', 'libfoo.so.0')
+        with open(shlib, 'w') as f:
+            f.write('')
+        self.assertEqual(find_library(la_file, []), shlib)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import hashlib
+import io
+import os
+import unittest
+
+from giscanner.girparser import GIRParser
+from giscanner.girwriter import GIRWriter
+from giscanner.utils import DigestFile
+
+
+REGRESS_GIR = os.path.join(os.path.dirname(__file__), 'Regress-1.0-expected.gir')
+
+
+def parse(types_only=False, lazy=False):
+    parser = GIRParser(types_only=types_only)
+    if lazy:
+        parser.parse_lazy(REGRESS_GIR)
+    else:
+        parser.parse(REGRESS_GIR)
+    return parser.get_namespace()
+
+
+class TestGIRParserLazy(unittest.TestCase):
+
+    def test_header(self):
+        eager = parse()
+        ns = parse(lazy=True)
+        self.assertEqual(ns.name, 'Regress')
+        self.assertEqual(ns.version, '1.0')
+        self.assertEqual(ns.identifier_prefixes, eager.identifier_prefixes)
+        self.assertEqual(ns.symbol_prefixes, eager.symbol_prefixes)
+        self.assertEqual(ns.shared_libraries, eager.shared_libraries)
+        self.assertEqual(ns.includes, eager.includes)
+        self.assertEqual(ns.c_includes, eager.c_includes)
+        self.assertEqual(ns.exported_packages, eager.exported_packages)
+        # Nothing past the header was needed so far
+        self.assertFalse(ns._index_loaded)
+
+    def test_lazy_lookups(self):
+        ns = parse(types_only=True, lazy=True)
+        self.assertEqual(ns.get_created_count(), 0)
+        self.assertIn('TestObj', ns)
+        self.assertEqual(ns.get_created_count(), 0)
+
+        node = ns.get('TestObj')
+        self.assertEqual(node.gi_name, 'Regress.TestObj')
+        self.assertIs(node.namespace, ns)
+        self.assertEqual(ns.get_created_count(), 1)
+
+        node = ns.get_by_ctype('RegressTestBoxed')
+        self.assertEqual(node.name, 'TestBoxed')
+        self.assertIs(ns.get_by_gtype_name('RegressTestBoxed'), node)
+        self.assertEqual(ns.get_created_count(), 2)
+
+        self.assertIsNone(ns.get('DoesNotExist'))
+        self.assertIsNone(ns.get_by_ctype('DoesNotExist'))
+        self.assertEqual(ns.get_created_count(), 2)
+
+    def test_symbol_lookups(self):
+        ns = parse(lazy=True)
+        func = ns.get_by_symbol('regress_test_boxed_copy')
+        self.assertIn(func, ns.get('TestBoxed').methods)
+        self.assertEqual(ns.get_created_count(), 1)
+        func = ns.get_by_symbol('regress_test_value_return')
+        self.assertIs(ns.get('test_value_return'), func)
+
+    def test_output_identical(self):
+        for types_only in [False, True]:
+            eager = GIRWriter(parse(types_only=types_only)).get_encoded_xml()
+            lazy = parse(types_only=types_only, lazy=True)
+            # Create some of the nodes out of order first
+            lazy.get('TestObj')
+            lazy.get_by_ctype('RegressTestBoxed')
+            self.assertEqual(GIRWriter(lazy).get_encoded_xml(), eager)
+            self.assertEqual(lazy.get_created_count(), len(list(lazy)))
+
+
+class TestGIRWriterOutput(unittest.TestCase):
+
+    def test_streamed_output_identical(self):
+        ns = parse()
+        expected = GIRWriter(ns).get_encoded_xml()
+        output = io.BytesIO()
+        GIRWriter(ns, output=output)
+        self.assertEqual(output.getvalue(), expected)
+
+    def test_digest_output(self):
+        ns = parse()
+        expected = hashlib.sha256(GIRWriter(ns).get_encoded_xml()).hexdigest()
+        output = DigestFile()
+        GIRWriter(ns, output=output)
+        self.assertEqual(output.hexdigest(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import io
+import os
+import unittest
+
+from giscanner.girparser import GIRParser
+from giscanner.girserializer import (dump_namespace, load_namespace,
+                                     SerializerError)
+from giscanner.girwriter import GIRWriter
+
+
+REGRESS_GIR = os.path.join(os.path.dirname(__file__), 'Regress-1.0-expected.gir')
+
+
+def roundtrip(namespace, **kwargs):
+    f = io.BytesIO()
+    dump_namespace(namespace, f, **kwargs)
+    f.seek(0)
+    return load_namespace(f)
+
+
+class TestGIRSerializer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        parser = GIRParser()
+        parser.parse(REGRESS_GIR)
+        cls.namespace = parser.get_namespace()
+
+    def test_attributes(self):
+        ns = roundtrip(self.namespace)
+        self.assertEqual(ns.name, 'Regress')
+        self.assertEqual(ns.version, '1.0')
+        self.assertEqual(ns.identifier_prefixes, self.namespace.identifier_prefixes)
+        self.assertEqual(ns.symbol_prefixes, self.namespace.symbol_prefixes)
+        self.assertEqual(ns.shared_libraries, self.namespace.shared_libraries)
+        self.assertEqual(ns.includes, self.namespace.includes)
+        self.assertEqual(ns.c_includes, self.namespace.c_includes)
+        self.assertEqual(list(ns), list(self.namespace))
+
+    def test_lazy_lookups(self):
+        # One node per chunk
+        ns = roundtrip(self.namespace, chunk_size=1)
+        self.assertEqual(ns.get_created_count(), 0)
+
+        node = ns.get('TestObj')
+        self.assertEqual(node.gi_name, 'Regress.TestObj')
+        self.assertIs(node.namespace, ns)
+        self.assertIs(node.methods[0].namespace, ns)
+        self.assertEqual(ns.get_created_count(), 1)
+
+        node = ns.get_by_ctype('RegressTestBoxed')
+        self.assertEqual(node.name, 'TestBoxed')
+        self.assertIs(ns.get_by_gtype_name('RegressTestBoxed'), node)
+        self.assertEqual(ns.get_created_count(), 2)
+
+        func = ns.get_by_symbol('regress_test_boxed_copy')
+        self.assertIn(func, node.methods)
+        self.assertEqual(ns.get_created_count(), 2)
+
+        self.assertIsNone(ns.get('DoesNotExist'))
+        self.assertIsNone(ns.get_by_ctype('DoesNotExist'))
+
+    def test_output_identical(self):
+        expected = GIRWriter(self.namespace).get_encoded_xml()
+        for chunk_size in (1, 4096, 1024 * 1024):
+            ns = roundtrip(self.namespace, chunk_size=chunk_size)
+            self.assertEqual(GIRWriter(ns).get_encoded_xml(), expected)
+            self.assertEqual(ns.get_created_count(), len(list(ns)))
+
+    def test_chunk_lookups(self):
+        ns = roundtrip(self.namespace, chunk_size=4096)
+        for name in self.namespace:
+            self.assertEqual(ns.get(name).name, name)
+        for ctype, node in self.namespace.ctypes.items():
+            self.assertEqual(ns.get_by_ctype(ctype).name, node.name)
+        for symbol, node in self.namespace.symbols.items():
+            self.assertEqual(ns.get_by_symbol(symbol).name, node.name)
+
+    def test_append_replace(self):
+        ns = roundtrip(self.namespace)
+        node = self.namespace.get('TestObj')
+        with self.assertRaises(ValueError):
+            ns.append(node)
+
+    def test_invalid_data(self):
+        with self.assertRaises(SerializerError):
+            load_namespace(io.BytesIO(b'GIRX'))
+        with self.assertRaises(SerializerError):
+            load_namespace(io.BytesIO(b'XXXX\0\0\0\0\0\0\0\0'))
+
+
+if __name__ == '__main__':
+    unittest.main()
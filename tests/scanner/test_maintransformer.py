@@ -68,5 +68,66 @@ class TestDeprecations(unittest.TestCase):
         self.assertEqual(node.deprecated_doc, "something")
 
 
+class TestTypeResolution(unittest.TestCase):
+
+    def test_resolved_once(self):
+        namespace = ast.Namespace('Test', '1.0')
+        namespace.append(ast.Record('Struct', ctype='TestStruct'))
+        known = ast.Type(ctype='TestStruct*')
+        unknown = ast.Type(ctype='TestUnknown*')
+        namespace.append(ast.Function('foo', ast.Return(ast.TYPE_NONE),
+                                      [ast.Parameter('s', known)],
+                                      False, 'test_foo'))
+        namespace.append(ast.Function('bar', ast.Return(ast.TYPE_NONE),
+                                      [ast.Parameter('u', unknown)],
+                                      False, 'test_bar'))
+        transformer = Transformer(namespace)
+
+        resolved = []
+        resolve_type = transformer.resolve_type
+
+        def counting_resolve_type(typeval):
+            resolved.append(typeval)
+            return resolve_type(typeval)
+
+        transformer.resolve_type = counting_resolve_type
+        MainTransformer(transformer, {}).transform()
+
+        self.assertEqual(known.target_giname, 'Test.Struct')
+        self.assertFalse(unknown.resolved)
+        # Only the function with the type which failed to resolve is retried
+        self.assertEqual(sum(1 for t in resolved if t is known), 1)
+        self.assertEqual(sum(1 for t in resolved if t is unknown), 3)
+
+    def test_field_type_annotation_unresolved(self):
+        namespace = ast.Namespace('Test', '1.0')
+        field_type = ast.TYPE_ANY
+        record = ast.Record('Struct', ctype='TestStruct')
+        record.fields.append(ast.Field('data', field_type, True, False))
+        namespace.append(record)
+        transformer = Transformer(namespace)
+        parser = GtkDocCommentBlockParser()
+        block = parser.parse_comment_block("""/**
+ * TestStruct:
+ * @data: (type TestMissing): some data
+ */""", 'test.h', 1)
+
+        resolved = []
+        resolve_type = transformer.resolve_type
+
+        def counting_resolve_type(typeval):
+            resolved.append(typeval)
+            return resolve_type(typeval)
+
+        transformer.resolve_type = counting_resolve_type
+        MainTransformer(transformer, {'TestStruct': block}).transform()
+
+        field = namespace.get('Struct').fields[0]
+        self.assertIsNot(field.type, field_type)
+        self.assertFalse(field.type.resolved)
+        # Created by the annotation, then retried by both later passes
+        self.assertEqual(sum(1 for t in resolved if t is field.type), 3)
+
+
 if __name__ == '__main__':
     unittest.main()
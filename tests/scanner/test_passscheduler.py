@@ -0,0 +1,102 @@
+import io
+import unittest
+from unittest import mock
+
+from giscanner import ast, message
+from giscanner.message import MessageLogger
+from giscanner.passscheduler import PassScheduler
+
+
+def create_namespace():
+    namespace = ast.Namespace('Test', '1.0')
+    for name in ['A', 'B']:
+        record = ast.Record(name, ctype='Test' + name)
+        record.methods.append(ast.Function(name.lower() + '_method', ast.Return(ast.TYPE_NONE),
+                                           [], False, 'test_' + name.lower() + '_method'))
+        namespace.append(record)
+    return namespace
+
+
+class TestPassScheduler(unittest.TestCase):
+
+    def _recorder(self, visits, label, skip=()):
+        def callback(node, chain):
+            visits.append((label, node.name))
+            return node.name not in skip
+        return callback
+
+    def test_fused(self):
+        namespace = create_namespace()
+        visits = []
+        scheduler = PassScheduler(namespace)
+        scheduler.add_walk('one', self._recorder(visits, 1))
+        scheduler.add_walk('two', self._recorder(visits, 2))
+        self.assertEqual(scheduler.get_walk_count(), 1)
+        scheduler.run()
+        self.assertEqual(visits, [
+            (1, 'A'), (2, 'A'), (1, 'a_method'), (2, 'a_method'),
+            (1, 'B'), (2, 'B'), (1, 'b_method'), (2, 'b_method')])
+
+    def test_fused_name(self):
+        namespace = create_namespace()
+        names = []
+        namespace.walk = lambda callback: names.append(callback.__name__)
+        scheduler = PassScheduler(namespace)
+        scheduler.add_walk('one', self._recorder([], 1))
+        scheduler.add_walk('two', self.test_fused)
+        scheduler.run()
+        self.assertEqual(names, ['callback+test_fused'])
+
+    def test_after(self):
+        namespace = create_namespace()
+        visits = []
+        steps = []
+        scheduler = PassScheduler(namespace)
+        scheduler.add_walk('one', self._recorder(visits, 1))
+        scheduler.add_walk('two', self._recorder(visits, 2), after=['one'])
+        scheduler.add_walk('three', self._recorder(visits, 3))
+        scheduler.add_step(lambda: steps.append(len(visits)))
+        scheduler.add_walk('four', self._recorder(visits, 4))
+        self.assertEqual(scheduler.get_walk_count(), 3)
+        scheduler.run()
+        self.assertEqual([label for label, name in visits],
+                         [1, 1, 1, 1, 2, 3, 2, 3, 2, 3, 2, 3, 4, 4, 4, 4])
+        self.assertEqual(steps, [12])
+
+    def test_skip_children(self):
+        namespace = create_namespace()
+        visits = []
+        scheduler = PassScheduler(namespace)
+        scheduler.add_walk('one', self._recorder(visits, 1, skip=['A']))
+        scheduler.add_walk('two', self._recorder(visits, 2, skip=['B']))
+        scheduler.run()
+        self.assertEqual(visits, [
+            (1, 'A'), (2, 'A'), (2, 'a_method'),
+            (1, 'B'), (2, 'B'), (1, 'b_method')])
+
+    def test_message_order(self):
+        namespace = create_namespace()
+        output = io.StringIO()
+        logger = MessageLogger(output=output)
+        logger.enable_warnings(True)
+
+        def warner(label):
+            def callback(node, chain):
+                message.warn('%s %s' % (label, node.name))
+                return True
+            return callback
+
+        with mock.patch.object(MessageLogger, '_instance', logger):
+            scheduler = PassScheduler(namespace)
+            scheduler.add_walk('one', warner('one'))
+            scheduler.add_walk('two', warner('two'))
+            scheduler.run()
+        # As if each pass had walked the namespace on its own
+        self.assertEqual([line.split(': ')[-1] for line in output.getvalue().splitlines()],
+                         ['one A', 'one a_method', 'one B', 'one b_method',
+                          'two A', 'two a_method', 'two B', 'two b_method'])
+        self.assertIs(logger.output, output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import unittest
+
+from giscanner.phaseprofiler import PhaseProfiler
+
+
+class FakeNamespace(object):
+
+    def __init__(self):
+        self.walked = []
+
+    def walk(self, callback):
+        self.walked.append(callback)
+
+
+class TestPhaseProfiler(unittest.TestCase):
+
+    def test_disabled(self):
+        profiler = PhaseProfiler()
+        namespace = FakeNamespace()
+        profiler.watch_namespace(namespace)
+        with profiler.phase('parse'):
+            pass
+        self.assertEqual(profiler.get_phases(), [])
+        self.assertNotIn('walk', namespace.__dict__)
+
+    def test_phases_and_walks(self):
+        def _pass_one(node, chain):
+            return True
+
+        profiler = PhaseProfiler(enabled=True)
+        namespace = FakeNamespace()
+        profiler.watch_namespace(namespace)
+
+        namespace.walk(_pass_one)
+        with profiler.phase('parse'):
+            pass
+        with profiler.phase('transform'):
+            namespace.walk(_pass_one)
+            namespace.walk(_pass_one)
+
+        self.assertEqual(namespace.walked, [_pass_one] * 3)
+        phases = profiler.get_phases()
+        self.assertEqual([p['name'] for p in phases], ['parse', 'transform'])
+        self.assertEqual(phases[0]['walks'], [])
+        self.assertEqual([w['name'] for w in phases[1]['walks']],
+                         ['_pass_one', '_pass_one'])
+        for key in ('wall_time', 'cpu_time', 'peak_rss_kb', 'objects'):
+            self.assertIn(key, phases[1])
+        self.assertGreaterEqual(phases[1]['wall_time'], 0)
+        self.assertGreater(phases[1]['objects'], 0)
+
+    def test_write(self):
+        profiler = PhaseProfiler(enabled=True)
+        with profiler.phase('parse'):
+            pass
+
+        fd, filename = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            profiler.write(filename)
+            with open(filename, encoding='utf-8') as f:
+                data = json.load(f)
+        finally:
+            os.unlink(filename)
+
+        self.assertEqual([p['name'] for p in data['phases']], ['parse'])
+        self.assertIn('total_wall_time', data)
+        self.assertIn('total_cpu_time', data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,12 +20,15 @@
 
 import contextlib
 import os
+import shutil
 import sys
 import tempfile
 import textwrap
 import unittest
+from unittest import mock
 
 from giscanner import pkgconfig
+from giscanner.cachestore import CacheStore
 
 
 @contextlib.contextmanager
@@ -105,5 +108,76 @@ class PkgConfigTest(unittest.TestCase):
             self.assertEqual(flags, ['-DLOG="HELLO"'])
 
 
+class PkgConfigCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.pcdir = os.path.join(self.tmpdir, 'pkgconfig')
+        os.mkdir(self.pcdir)
+        self.log = os.path.join(self.tmpdir, 'log')
+
+        stack = contextlib.ExitStack()
+        self.addCleanup(stack.close)
+        command = stack.enter_context(pkg_config_script("""
+        import sys
+        with open(%r, 'a') as log:
+            log.write(' '.join(sys.argv[1:]) + '\\n')
+        print('-I/usr/include/foo')
+        """ % (self.log, )))
+
+        env = {'PKG_CONFIG': command[1],
+               'PKG_CONFIG_LIBDIR': self.pcdir,
+               'XDG_CACHE_HOME': os.path.join(self.tmpdir, 'cache')}
+        for patcher in [mock.patch.dict(os.environ, env),
+                        mock.patch.dict(pkgconfig._outputs, clear=True),
+                        mock.patch.dict(pkgconfig._search_path_digests, clear=True),
+                        mock.patch.object(pkgconfig, '_cachestore', None)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        os.environ.pop('GI_SCANNER_DISABLE_CACHE', None)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _get_calls(self):
+        with open(self.log) as f:
+            return f.read().splitlines()
+
+    def _forget(self):
+        pkgconfig._outputs.clear()
+        pkgconfig._search_path_digests.clear()
+
+    @unittest.skipIf(os.name == "nt", "FIXME")
+    def test_memoized(self):
+        os.environ['GI_SCANNER_DISABLE_CACHE'] = '1'
+        self.assertEqual(pkgconfig.cflags(['foo-1.0']), ['-I/usr/include/foo'])
+        self.assertEqual(pkgconfig.cflags(['foo-1.0']), ['-I/usr/include/foo'])
+        pkgconfig.libs(['foo-1.0'])
+        self.assertEqual(self._get_calls(), ['--cflags foo-1.0', '--libs foo-1.0'])
+
+    @unittest.skipIf(os.name == "nt", "FIXME")
+    def test_no_disk_cache_by_default(self):
+        pkgconfig.cflags(['foo-1.0'])
+        self._forget()
+        pkgconfig.cflags(['foo-1.0'])
+        self.assertEqual(self._get_calls(), ['--cflags foo-1.0', '--cflags foo-1.0'])
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, 'cache')))
+
+    @unittest.skipIf(os.name == "nt", "FIXME")
+    def test_disk_cache(self):
+        pkgconfig.set_cachestore(CacheStore())
+        pkgconfig.cflags(['foo-1.0'])
+        self._forget()
+        self.assertEqual(pkgconfig.cflags(['foo-1.0']), ['-I/usr/include/foo'])
+        self.assertEqual(self._get_calls(), ['--cflags foo-1.0'])
+
+        # Installing a package invalidates the cache
+        with open(os.path.join(self.pcdir, 'foo-1.0.pc'), 'w') as f:
+            f.write('Name: foo\n')
+        self._forget()
+        pkgconfig.cflags(['foo-1.0'])
+        self.assertEqual(self._get_calls(), ['--cflags foo-1.0', '--cflags foo-1.0'])
+
+
 if __name__ == '__main__':
     unittest.main()
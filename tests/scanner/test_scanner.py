@@ -1,8 +1,11 @@
 import unittest
 import optparse
 import os
+import shutil
+import stat
+import tempfile
 
-from giscanner.scannermain import get_source_root_dirs
+from giscanner.scannermain import get_source_root_dirs, write_output
 
 
 class TestScanner(unittest.TestCase):
@@ -26,6 +29,50 @@ class TestScanner(unittest.TestCase):
         paths = get_source_root_dirs(options, [])
         self.assertEqual(paths, [])
 
+    def test_write_output(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        output = os.path.join(tmpdir, "Foo-1.0.gir")
+        options = optparse.Values({"output": output,
+                                   "reparse_validate_gir": False})
+
+        write_output(lambda f: f.write(b"<repository/>"), options)
+        with open(output, "rb") as f:
+            self.assertEqual(f.read(), b"<repository/>")
+
+        def fail(f):
+            f.write(b"<repos")
+            raise ValueError("failed")
+
+        self.assertRaises(ValueError, write_output, fail, options)
+        with open(output, "rb") as f:
+            self.assertEqual(f.read(), b"<repository/>")
+        self.assertEqual(os.listdir(tmpdir), ["Foo-1.0.gir"])
+
+    @unittest.skipIf(os.name == "nt", "no symlinks or umask")
+    def test_write_output_mode_and_symlink(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        output = os.path.join(tmpdir, "Foo-1.0.gir")
+        options = optparse.Values({"output": output,
+                                   "reparse_validate_gir": False})
+
+        umask = os.umask(0o027)
+        try:
+            write_output(lambda f: f.write(b"<repository/>"), options)
+        finally:
+            os.umask(umask)
+        self.assertEqual(stat.S_IMODE(os.stat(output).st_mode), 0o640)
+
+        link = os.path.join(tmpdir, "link.gir")
+        os.symlink(output, link)
+        options.output = link
+        write_output(lambda f: f.write(b"<repository></repository>"), options)
+        self.assertTrue(os.path.islink(link))
+        with open(output, "rb") as f:
+            self.assertEqual(f.read(), b"<repository></repository>")
+        self.assertEqual(stat.S_IMODE(os.stat(output).st_mode), 0o640)
+
     @unittest.skipUnless(os.name == "nt", "Windows only")
     def test_get_source_root_dirs_different_drives(self):
         options = optparse.Values({"sources_top_dirs": []})
@@ -1,8 +1,13 @@
 import unittest
+import shutil
+import subprocess
 import sys
 import os
+import tempfile
 
-from giscanner.shlibs import resolve_from_ldd_output, sanitize_shlib_path
+from giscanner import elfreader
+from giscanner.shlibs import (resolve_from_ldd_output, sanitize_shlib_path,
+                              _get_elf_dependencies, _match_libraries)
 
 
 class TestLddParser(unittest.TestCase):
@@ -114,5 +119,45 @@ class TestLddParser(unittest.TestCase):
             resolve_from_ldd_output(['foo'], output))
 
 
+@unittest.skipUnless(sys.platform.startswith('linux') and shutil.which('cc'),
+                     "needs a C compiler producing ELF files")
+class TestELFDependencies(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def _compile(self, name, source, args):
+        c_path = os.path.join(self.tmpdir, name + '.c')
+        with open(c_path, 'w') as f:
+            f.write(source)
+        subprocess.check_call(['cc', '-o', os.path.join(self.tmpdir, name), c_path] + args)
+        return os.path.join(self.tmpdir, name)
+
+    def test_dependencies(self):
+        libdir = os.path.join(self.tmpdir, 'lib')
+        os.mkdir(libdir)
+        self._compile('lib/libfoo.so.1', 'int foo (void) { return 42; }',
+                      ['-shared', '-fPIC', '-Wl,-soname,libfoo.so.1'])
+        os.symlink('libfoo.so.1', os.path.join(libdir, 'libfoo.so'))
+        binary = self._compile('dumper', 'int foo (void);\nint main (void) { return foo (); }',
+                               ['-L' + libdir, '-Wl,-rpath,$ORIGIN/lib', '-Wl,--no-as-needed',
+                                '-lfoo'])
+
+        self.assertEqual(elfreader.read_dynamic_info(os.path.join(libdir, 'libfoo.so')).soname,
+                         'libfoo.so.1')
+        output = _get_elf_dependencies(binary)
+        self.assertIn('libfoo.so.1 => %s' % (os.path.join(self.tmpdir, 'lib', 'libfoo.so.1'), ),
+                      output.splitlines())
+        self.assertEqual(_match_libraries(['foo', 'bar'], output), (['libfoo.so.1'], ['bar']))
+
+    def test_not_elf(self):
+        filename = os.path.join(self.tmpdir, 'dumper')
+        with open(filename, 'w') as f:
+            f.write('#!/bin/sh\n')
+        with self.assertRaises(elfreader.ELFError):
+            _get_elf_dependencies(filename)
+
+
 if __name__ == '__main__':
     unittest.main()
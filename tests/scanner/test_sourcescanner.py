@@ -1,7 +1,12 @@
+import io
 import unittest
 import tempfile
 import os
+import shutil
+from unittest import mock
 
+from giscanner.cachestore import CacheStore
+from giscanner import sourcescanner
 from giscanner.sourcescanner import SourceScanner
 
 
@@ -36,6 +41,170 @@ typedef struct _eggs Eggs;
         self.assertEqual(len(list(scanner.get_comments())), 2)
         self.assertFalse(scanner.get_errors())
 
+    def test_incremental(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        header = os.path.join(tmpdir, 'spam.h')
+        source = os.path.join(tmpdir, 'spam.c')
+        with open(header, 'w') as f:
+            f.write("""
+/**
+ * Spam:
+ */
+typedef struct _spam Spam;
+
+#define SPAM_EGGS 42
+""")
+        with open(source, 'w') as f:
+            f.write("""
+/**
+ * spam_new:
+ */
+Spam *spam_new (void) { return 0; }
+""")
+
+        def scan(cachestore=None):
+            scanner = SourceScanner()
+            if cachestore is not None:
+                scanner.set_incremental(cachestore)
+            scanner.parse_files([header, source])
+            scanner.parse_macros([header, source])
+            return ([(s.ident, s.type, s.line, s.const_int) for s in scanner.get_symbols()],
+                    scanner.get_comments(), scanner.get_errors())
+
+        env = {'XDG_CACHE_HOME': os.path.join(tmpdir, 'cache')}
+        with mock.patch.dict(os.environ, env):
+            os.environ.pop('GI_SCANNER_DISABLE_CACHE', None)
+            expected = scan()
+            store = CacheStore()
+            self.assertEqual(scan(store), expected)
+            self.assertEqual(store.get_stats()['stores'], 3)
+            self.assertEqual(scan(store), expected)
+            self.assertEqual(store.get_stats()['hits'], 2)
+
+            # Only the changed source file is lexed again
+            with open(source, 'a') as f:
+                f.write("""
+/**
+ * spam_free:
+ */
+""")
+            expected = scan()
+            self.assertEqual(scan(store), expected)
+            self.assertEqual(len(expected[1]), 3)
+            self.assertEqual(store.get_stats()['stores'], 4)
+
+            # A new macro in the source file changes the unit, but the
+            # preprocessed headers are reused
+            with open(source, 'a') as f:
+                f.write("#define SPAM_HAM 1\n")
+            hits = store.get_stats()['hits']
+            expected = scan()
+            self.assertEqual(scan(store), expected)
+            self.assertEqual(store.get_stats()['hits'], hits + 1)
+
+    def test_parallel_lexing(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        header = os.path.join(tmpdir, 'spam.h')
+        with open(header, 'w') as f:
+            f.write("""
+/**
+ * Spam:
+ */
+typedef struct _Spam Spam;
+Spam *spam_new (void);
+""")
+        sources = []
+        for i in range(4):
+            sources.append(os.path.join(tmpdir, 'spam%d.c' % (i, )))
+            with open(sources[-1], 'w') as f:
+                f.write("""
+/**
+ * spam_%d:
+ */
+void spam_%d (void) { }
+""" % (i, i))
+
+        def scan(jobs, cachestore=None):
+            scanner = SourceScanner()
+            scanner.set_jobs(jobs)
+            if cachestore is not None:
+                scanner.set_incremental(cachestore)
+            scanner.parse_files([header] + sources)
+            scanner.parse_macros([header] + sources)
+            return ([(s.ident, s.type, s.line) for s in scanner.get_symbols()],
+                    scanner.get_comments(), scanner.get_errors())
+
+        env = {'XDG_CACHE_HOME': os.path.join(tmpdir, 'cache')}
+        with mock.patch.dict(os.environ, env), \
+                mock.patch('giscanner.sourcescanner._PARALLEL_MIN_SOURCES', 2):
+            os.environ.pop('GI_SCANNER_DISABLE_CACHE', None)
+            expected = scan(1)
+            self.assertEqual(len(expected[1]), 5)
+            self.assertEqual(scan(2), expected)
+            self.assertEqual(scan(2, CacheStore()), expected)
+            self.assertEqual(scan(2, CacheStore()), expected)
+            with mock.patch('giscanner.sourcescanner.create_worker_pool',
+                            return_value=None) as create_worker_pool:
+                self.assertEqual(scan(2), expected)
+            create_worker_pool.assert_called_once_with(2)
+
+    def test_parse_macros(self):
+        tmp_fd, tmp_name = tempfile.mkstemp(suffix='.h')
+        self.addCleanup(os.unlink, tmp_name)
+        with os.fdopen(tmp_fd, 'wb') as f:
+            f.write(b"""/* foo */
+#ifndef FOO_H
+  #  define FOO_H
+#define FOO_VALUE (1 << \\
+  2)
+#include <bar.h>
+#define FOO_CALL(a, b) foo (a, b)
+#define FOO_BROKEN(a,
+  b) a
+#define FOO_LATER(a) a
+#endif
+""")
+
+        # Each file is read once, for the macro scan in C
+        read_file = mock.Mock(wraps=sourcescanner._read_file)
+        with mock.patch.object(sourcescanner, '_read_file', read_file):
+            scanner = SourceScanner()
+            scanner.parse_macros([tmp_name])
+        read_file.assert_called_once_with(os.path.realpath(tmp_name))
+
+        symbols = {s.ident: s for s in scanner.get_symbols()}
+        self.assertEqual(symbols['FOO_VALUE'].const_int, 4)
+        self.assertIn('FOO_CALL', symbols)
+        # The arguments of FOO_BROKEN aren't on its line, the scan skips
+        # the function-like macros after it
+        self.assertNotIn('FOO_LATER', symbols)
+
+    def test_comment_buffer(self):
+        def export(*comments):
+            data = b''.join(comment for comment, lineno in comments)
+            table = b''
+            start = 0
+            for comment, lineno in comments:
+                table += sourcescanner._COMMENT_ENTRY.pack(start, start + len(comment), 0, lineno)
+                start += len(comment)
+            return (data, ['foo.h'], table)
+
+        exports = [export((b'/** a */', 1), (b'/** \xff */', 2)),
+                   export(),
+                   export((b'/** c */', 3))]
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            comments = sourcescanner._CommentBuffer(exports)
+            self.assertEqual(len(comments), 3)
+            self.assertEqual(comments[1], (None, 'foo.h', 2))
+            self.assertEqual(comments[2], ('/** c */', 'foo.h', 3))
+            self.assertEqual(comments[-3], ('/** a */', 'foo.h', 1))
+            self.assertEqual(list(comments), [comments[0], comments[1], comments[2]])
+            self.assertRaises(IndexError, comments.__getitem__, 3)
+        # Reported once, when the buffer is built
+        self.assertEqual(stdout.getvalue(), "Comment is not valid Unicode in foo.h line 2\n")
+
     def test_parser_error(self):
         scanner = self._parse_files("""
 void foo() {
@@ -72,6 +241,45 @@ void foo(int bar) {
         self.assertEqual(len(list(scanner.get_comments())), 1)
         self.assertFalse(scanner.get_errors())
 
+    def test_export_symbols(self):
+        scanner = self._parse_files("""
+struct _Foo { int a; char *b; };
+#define FOO_VALUE 42
+void foo_frob (struct _Foo *foo, const char *name);
+""")
+
+        def describe_type(stype):
+            if stype is None:
+                return None
+            return (stype.type, stype.type_qualifier, stype.name,
+                    describe_type(stype.base_type),
+                    [describe_symbol(child) for child in stype.child_list
+                     if child is not None])
+
+        def describe_symbol(symbol):
+            return (symbol.type, symbol.ident, symbol.const_int,
+                    symbol.source_filename, symbol.line,
+                    describe_type(symbol.base_type))
+
+        self.assertEqual(
+            [describe_symbol(s) for s in scanner.get_symbols()],
+            [describe_symbol(s) for s in scanner._scanner.get_symbols()])
+
+    def test_export_comments(self):
+        scanner = self._parse_files("""
+/**
+ * foo_frob:
+ * @name: a name with non-ASCII characters, é
+ */
+void foo_frob (const char *name);
+/* a plain comment */
+""")
+
+        comments = scanner.get_comments()
+        self.assertEqual(list(comments), scanner._scanner.get_comments())
+        self.assertEqual(len(comments), 1)
+        self.assertEqual(comments[0][1:], comments[-1][1:])
+
     def test_empty_decl(self):
         # https://gitlab.gnome.org/GNOME/gobject-introspection/issues/216
         scanner = self._parse_files(";int foo;")
@@ -54,6 +54,21 @@ class TestIdentifierFilter(unittest.TestCase):
         self.assertEqual(xformer.strip_identifier('test_foo_bart'), 'FooBart')
         self.assertEqual(xformer.strip_identifier('test_foo_tart'), 'FooTart')
 
+    def test_persistent_identifier_filter(self):
+        cmd = [sys.executable, '-c', textwrap.dedent("""
+            import sys
+            for line in sys.stdin:
+                sys.stdout.write(line.title().replace("_", ""))
+                sys.stdout.flush()""")]
+
+        namespace = ast.Namespace('Test', '1.0')
+        xformer = Transformer(namespace, identifier_filter_cmd=cmd,
+                              persistent_filter_cmds=True)
+
+        self.assertEqual(xformer.strip_identifier('test_foo'), 'Foo')
+        self.assertEqual(xformer.strip_identifier('test_foo_bar'), 'FooBar')
+        xformer.close_filters()
+
     def test_invalid_command(self):
         cmd = ['this-is-not-a-real-command']
         namespace = ast.Namespace('Test', '1.0')
@@ -79,6 +94,105 @@ class TestSymbolFilter(unittest.TestCase):
         self.assertEqual(
             xformer.split_csymbol('foo_bar_quux')[1], "foo_bar_quux")
 
+    def test_persistent(self):
+        # Answers with the number of names it was sent so far
+        cmd = [sys.executable, '-c', textwrap.dedent("""
+            import sys
+            for i, line in enumerate(sys.stdin):
+                sys.stdout.write("test_%d\\n" % (i + 1, ))
+                sys.stdout.flush()""")]
+        namespace = ast.Namespace('Test', '1.0')
+        xformer = Transformer(namespace, symbol_filter_cmd=cmd,
+                              persistent_filter_cmds=True)
+
+        self.assertEqual(xformer.split_csymbol('foo')[1], "1")
+        self.assertEqual(xformer.split_csymbol('bar')[1], "2")
+        # Memoized
+        self.assertEqual(xformer.split_csymbol('foo')[1], "1")
+        self.assertEqual(xformer.split_csymbol('baz')[1], "3")
+        xformer.close_filters()
+
+    def test_persistent_exited(self):
+        cmd = [sys.executable, '-c', 'import sys; sys.exit(3)']
+        namespace = ast.Namespace('Test', '1.0')
+        xformer = Transformer(namespace, symbol_filter_cmd=cmd,
+                              persistent_filter_cmds=True)
+        self.assertRaises(ValueError, xformer.split_csymbol, 'foo_bar')
+
+
+class TestNamespaceSplitting(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def register_include(self, xformer, name, identifier_prefixes, symbol_prefixes):
+        filename = os.path.join(self.tmpdir.name, '%s-1.0.gir' % (name, ))
+        with open(filename, 'w') as f:
+            f.write(textwrap.dedent('''\
+                <?xml version="1.0"?>
+                <repository version="1.2"
+                            xmlns="http://www.gtk.org/introspection/core/1.0"
+                            xmlns:c="http://www.gtk.org/introspection/c/1.0">
+                  <namespace name="%s" version="1.0"
+                             c:identifier-prefixes="%s"
+                             c:symbol-prefixes="%s">
+                  </namespace>
+                </repository>
+                ''' % (name, identifier_prefixes, symbol_prefixes)))
+        xformer.register_include_uninstalled(filename)
+
+    def test_split_includes(self):
+        namespace = ast.Namespace('Gtk', '4.0')
+        xformer = Transformer(namespace)
+        xformer.disable_cache()
+        self.assertRaises(ValueError, xformer.split_ctype_namespaces, 'GdkDisplay')
+
+        self.register_include(xformer, 'Gdk', 'Gdk', 'gdk')
+        self.register_include(xformer, 'GdkX11', 'GdkX11,GdkX', 'gdk_x11')
+        self.assertEqual(
+            [(ns.name, name) for ns, name in xformer.split_ctype_namespaces('GdkDisplay')],
+            [('Gdk', 'Display')])
+        self.assertEqual(
+            [(ns.name, name) for ns, name in xformer.split_ctype_namespaces('GdkX11Display')],
+            [('Gdk', 'X11Display'), ('GdkX11', 'Display')])
+        self.assertEqual(
+            [(ns.name, name) for ns, name in xformer.split_csymbol_namespaces('gdk_x11_display_open')],
+            [('Gdk', 'x11_display_open'), ('GdkX11', 'display_open')])
+        self.assertEqual(
+            [(ns.name, name) for ns, name in xformer.split_csymbol_namespaces('GDK_X11_MAJOR')],
+            [('Gdk', 'X11_MAJOR'), ('GdkX11', 'MAJOR')])
+
+        # The current namespace always comes last
+        self.assertEqual(
+            [(ns.name, name) for ns, name in xformer.split_ctype_namespaces('GtkWidget')],
+            [('Gtk', 'Widget')])
+        self.register_include(xformer, 'Gtk3', 'Gtk', 'gtk')
+        self.assertEqual(
+            [(ns.name, name) for ns, name in xformer.split_ctype_namespaces('GtkWidget')],
+            [('Gtk3', 'Widget'), ('Gtk', 'Widget')])
+
+
+class TestSharedTypes(unittest.TestCase):
+
+    def test_fundamental_shared(self):
+        xformer = Transformer(ast.Namespace('Test', '1.0'))
+        typeval = xformer.create_type_from_ctype_string('gint')
+        self.assertIs(xformer.create_type_from_ctype_string('gint'), typeval)
+        self.assertIsNot(xformer.create_type_from_ctype_string('gint', is_const=True),
+                         typeval)
+        self.assertEqual(typeval, ast.TYPE_INT)
+        self.assertRaises(AttributeError, setattr, typeval, 'ctype', None)
+
+    def test_user_string(self):
+        xformer = Transformer(ast.Namespace('Test', '1.0'))
+        typeval = xformer.create_type_from_user_string('gchar*')
+        self.assertEqual(typeval, ast.TYPE_STRING)
+        self.assertIsNone(typeval.ctype)
+        self.assertEqual(xformer.create_type_from_ctype_string('gchar*').ctype, 'gchar*')
+
 
 class TestStructTypedefs(unittest.TestCase):
     def setUp(self):
@@ -1,3 +1,4 @@
+import io
 import unittest
 
 from giscanner.xmlwriter import XMLWriter, collect_attributes, build_xml_tag
@@ -24,6 +25,19 @@ class TestXMLWriter(unittest.TestCase):
         lines = x.split('\n')
         self.assertTrue(len(lines[3]) < 80)
 
+    def test_output(self):
+        output = io.BytesIO()
+        w = XMLWriter(output)
+        w.push_tag('repository', [('name', '\xf6\xe4\xfc')])
+        w.write_tag('member', [('name', 'west')])
+        w.pop_tag()
+        w.flush()
+        self.assertEqual(output.getvalue(), (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<repository name="\xf6\xe4\xfc">\n'
+            '  <member name="west"/>\n'
+            '</repository>\n').encode('utf-8'))
+
     def test_collect_attributes(self):
         ca = collect_attributes
         res = ca('parameters', [], 6, ' ', 12)